@@ -0,0 +1,65 @@
+"""Queue worker entry point for CHAT_QUEUE_MODE=on.
+
+Consumes model turns that `/v2/chat/send` queued on the Redis stream (see
+core/turn_queue.py), runs them and stores the replies for
+`/v2/chat/result/{job_id}`. Run as many worker processes as LLM capacity
+needs, independently of the API workers:
+
+  python chat_worker.py --concurrency 8
+
+SIGINT/SIGTERM stop reading new turns, finish the running ones and flush
+buffered writes. Turns a killed worker left unacknowledged are reclaimed by
+the others after CHAT_QUEUE_CLAIM_IDLE_MS.
+"""
+
+import argparse
+import asyncio
+import signal
+
+from dotenv import load_dotenv
+
+try:
+    from loguru import logger
+except Exception:
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("cutter")
+
+
+async def serve(concurrency: int, block_ms: int) -> None:
+    from core import retrieval_intent, turn_queue, write_behind
+    from core.guardrails import load_policy
+    from core.llm import close_async_client
+    from core.redis_store import close_async_client as close_redis
+    from routes.chat import run_queued_turn
+
+    load_policy()
+    retrieval_intent.load_model()
+    write_behind.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # e.g. Windows
+            pass
+    logger.info("Chat worker %s consuming %s (concurrency %s)", turn_queue.consumer_name(), turn_queue.CHAT_QUEUE_STREAM, concurrency)
+    try:
+        await turn_queue.run_worker(run_queued_turn, concurrency=concurrency, block_ms=block_ms, stop=stop)
+    finally:
+        await write_behind.stop()
+        await close_async_client()
+        await close_redis()
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Cutter chat queue worker")
+    parser.add_argument("--concurrency", type=int, default=8, help="Turns processed at once")
+    parser.add_argument("--block-ms", type=int, default=5000, help="XREADGROUP block time")
+    args = parser.parse_args()
+    asyncio.run(serve(args.concurrency, args.block_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Admission control for LLM-bound work.
+
+Each pool ("chat", "captions", "embed") has:
+
+- a per-process concurrency limit, ADMIT_{POOL}_LIMIT
+- a bounded wait queue, ADMIT_{POOL}_QUEUE; a request arriving at a full
+  queue, or still waiting after ADMIT_WAIT_SECONDS, is shed with
+  `Overloaded` (routes answer 503 with Retry-After)
+- an optional cluster-wide limit, ADMIT_{POOL}_CLUSTER (0 = off), kept as
+  leases in the Redis sorted set `admit:{pool}` (member = token, score =
+  lease expiry) so a crashed worker cannot hold slots for longer than
+  ADMIT_LEASE_SECONDS
+
+Crisis-flagged sessions use priority CRISIS: they jump the wait queue, are
+never refused for a full queue and are not held back by the cluster limit.
+The priority of the admitted turn is kept in a context variable, so provider
+calls made inside it (embeddings through `core.llm`) inherit it.
+
+Active slots and queue depth are exported as `admission.{pool}.active` and
+`.queued` gauges, with `.admitted`, `.shed` and `.shed.{reason}` counters and
+a `.wait_ms` timing.
+
+The cluster limit needs a Redis (or fakeredis) connection; the in-process
+MemoryStore has no sorted sets.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from core import metrics
+from core.redis_store import get_client
+
+CRISIS, NORMAL = 0, 1
+
+# pool -> (local limit, queue length)
+_DEFAULTS = {"chat": (32, 64), "captions": (2, 4), "embed": (16, 32)}
+ADMIT_WAIT_SECONDS = float(os.getenv("ADMIT_WAIT_SECONDS", "10"))
+ADMIT_RETRY_AFTER_SECONDS = int(os.getenv("ADMIT_RETRY_AFTER_SECONDS", "2"))
+ADMIT_LEASE_SECONDS = int(os.getenv("ADMIT_LEASE_SECONDS", "120"))
+ADMIT_CLUSTER_POLL_SECONDS = float(os.getenv("ADMIT_CLUSTER_POLL_SECONDS", "0.05"))
+
+_priority: "contextvars.ContextVar[int]" = contextvars.ContextVar("admission_priority", default=NORMAL)
+
+
+class Overloaded(Exception):
+    """The pool is saturated; retry after `retry_after` seconds."""
+
+    def __init__(self, pool: str, reason: str):
+        super().__init__(f"{pool} overloaded ({reason})")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = ADMIT_RETRY_AFTER_SECONDS
+
+
+class Limiter:
+    """Per-process slots with a priority wait queue, plus optional cluster leases.
+
+    Usable from async code (`acquire`) and from threadpool routes
+    (`acquire_sync`); both share the same slots.
+    """
+
+    def __init__(self, pool: str, limit: int, queue_max: int, cluster_limit: int = 0):
+        self.pool = pool
+        self.limit = limit
+        self.queue_max = queue_max
+        self.cluster_limit = cluster_limit
+        self.active = 0
+        self.queued = 0
+        self._lock = threading.Lock()
+        self._waiters: List[list] = []  # heap of [priority, seq, wake]; wake None once granted or withdrawn
+        self._seq = itertools.count()
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"admission.{self.pool}.active", self.active)
+        metrics.set_gauge(f"admission.{self.pool}.queued", self.queued)
+
+    def _shed(self, reason: str) -> Overloaded:
+        metrics.incr(f"admission.{self.pool}.shed")
+        metrics.incr(f"admission.{self.pool}.shed.{reason}")
+        return Overloaded(self.pool, reason)
+
+    def _take_or_queue(self, priority: int, wake) -> Optional[list]:
+        """Take a free slot (returns None) or join the wait queue (returns the waiter)."""
+        with self._lock:
+            if self.active < self.limit and not self.queued:
+                self.active += 1
+                self._publish()
+                return None
+            if priority != CRISIS and self.queued >= self.queue_max:
+                raise self._shed("queue_full")
+            waiter = [priority, next(self._seq), wake]
+            heapq.heappush(self._waiters, waiter)
+            self.queued += 1
+            self._publish()
+            return waiter
+
+    def _withdraw(self, waiter: list) -> bool:
+        """Leave the queue; False when a slot was handed over meanwhile."""
+        with self._lock:
+            if waiter[2] is None:
+                return False
+            waiter[2] = None
+            self.queued -= 1
+            self._publish()
+            return True
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                wake, waiter[2] = waiter[2], None
+                if wake is None:
+                    continue  # withdrawn
+                self.queued -= 1
+                self._publish()
+                wake()  # the slot passes straight to the waiter
+                return
+            self.active -= 1
+            self._publish()
+
+    def _lease(self, token: str) -> bool:
+        r = get_client()
+        key = f"admit:{self.pool}"
+        now = time.time()
+        pipe = r.pipeline(transaction=False)
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zadd(key, {token: now + ADMIT_LEASE_SECONDS})
+        pipe.zcard(key)
+        pipe.expire(key, ADMIT_LEASE_SECONDS)
+        count = pipe.execute()[2]
+        if count <= self.cluster_limit:
+            return True
+        r.zrem(key, token)
+        metrics.incr(f"admission.{self.pool}.cluster_full")
+        return False
+
+    def _admitted(self, start: float) -> None:
+        metrics.incr(f"admission.{self.pool}.admitted")
+        metrics.observe(f"admission.{self.pool}.wait_ms", (time.perf_counter() - start) * 1000)
+
+    def _needs_lease(self, priority: int) -> bool:
+        return bool(self.cluster_limit) and priority != CRISIS
+
+    async def acquire(self, priority: int = NORMAL) -> Optional[str]:
+        """Wait for a slot; returns the cluster lease token to pass to `release`."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        start = time.perf_counter()
+        waiter = self._take_or_queue(priority, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), ADMIT_WAIT_SECONDS)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+                if not self._withdraw(waiter):
+                    self._release_slot()  # granted while we gave up; pass it on
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                raise self._shed("timeout") from None
+        token = None
+        if self._needs_lease(priority):
+            token = uuid.uuid4().hex
+            try:
+                while not await asyncio.to_thread(self._lease, token):
+                    if time.perf_counter() - start >= ADMIT_WAIT_SECONDS:
+                        raise self._shed("cluster_full")
+                    await asyncio.sleep(ADMIT_CLUSTER_POLL_SECONDS)
+            except BaseException:
+                self._release_slot()
+                raise
+        self._admitted(start)
+        return token
+
+    def acquire_sync(self, priority: int = NORMAL) -> Optional[str]:
+        """Blocking `acquire` for sync routes running in the threadpool."""
+        granted = threading.Event()
+        start = time.perf_counter()
+        waiter = self._take_or_queue(priority, granted.set)
+        if waiter is not None and not granted.wait(ADMIT_WAIT_SECONDS):
+            if self._withdraw(waiter):
+                raise self._shed("timeout")
+        token = None
+        if self._needs_lease(priority):
+            token = uuid.uuid4().hex
+            try:
+                while not self._lease(token):
+                    if time.perf_counter() - start >= ADMIT_WAIT_SECONDS:
+                        raise self._shed("cluster_full")
+                    time.sleep(ADMIT_CLUSTER_POLL_SECONDS)
+            except BaseException:
+                self._release_slot()
+                raise
+        self._admitted(start)
+        return token
+
+    def _drop_lease(self, token: str) -> None:
+        try:
+            get_client().zrem(f"admit:{self.pool}", token)
+        except Exception:
+            pass  # the lease expires on its own
+
+    def release(self, token: Optional[str] = None) -> None:
+        """Free the slot now; on an event loop the lease ZREM runs in the executor."""
+        if token:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._drop_lease(token)
+            else:
+                loop.run_in_executor(None, self._drop_lease, token)
+        self._release_slot()
+
+
+_limiters: Dict[str, Limiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(pool: str) -> Limiter:
+    with _limiters_lock:
+        if pool not in _limiters:
+            limit, queue_max = _DEFAULTS.get(pool, (16, 32))
+            name = pool.upper()
+            _limiters[pool] = Limiter(
+                pool,
+                int(os.getenv(f"ADMIT_{name}_LIMIT", str(limit))),
+                int(os.getenv(f"ADMIT_{name}_QUEUE", str(queue_max))),
+                int(os.getenv(f"ADMIT_{name}_CLUSTER", "0")),
+            )
+        return _limiters[pool]
+
+
+def priority_for(session: Optional[Dict[str, object]]) -> int:
+    return CRISIS if session and session.get("crisis") else NORMAL
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextlib.asynccontextmanager
+async def admit(pool: str, priority: Optional[int] = None) -> AsyncIterator[None]:
+    """Hold a slot in `pool` for the body; raises Overloaded when shed."""
+    priority = current_priority() if priority is None else priority
+    lim = limiter(pool)
+    token = await lim.acquire(priority)
+    ctx = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(ctx)
+        lim.release(token)
+
+
+@contextlib.contextmanager
+def admit_sync(pool: str, priority: Optional[int] = None) -> Iterator[None]:
+    priority = current_priority() if priority is None else priority
+    lim = limiter(pool)
+    token = lim.acquire_sync(priority)
+    ctx = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(ctx)
+        lim.release(token)
+
+
+async def hold(pool: str, priority: Optional[int] = None) -> Callable[[], None]:
+    """Take a slot that outlives the caller's frame (a streamed response).
+
+    Returns a release function that is safe to call more than once; the
+    priority stays set for the rest of the current task.
+    """
+    priority = current_priority() if priority is None else priority
+    lim = limiter(pool)
+    token = await lim.acquire(priority)
+    _priority.set(priority)
+    released = threading.Event()
+
+    def release() -> None:
+        if not released.is_set():
+            released.set()
+            lim.release(token)
+
+    return release
+
+
+def reset() -> None:
+    """Forget configured limiters (tests re-read the environment)."""
+    with _limiters_lock:
+        _limiters.clear()
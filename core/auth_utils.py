@@ -1,9 +1,18 @@
 import os
 import re
+import asyncio
 import hashlib
 import hmac
+import json
+import threading
+import time
 import unicodedata
-from typing import Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from core import metrics
+
+T = TypeVar("T")
 
 
 NAME_CLAIM_RE = re.compile(r"\b(?:i[' ]?m|i am|my name is)\s+(.{2,80})$", re.IGNORECASE)
@@ -21,10 +30,24 @@ def extract_claimed_name(text: str) -> str | None:
     return normalize_name(m.group(1))
 
 
-SCRYPT_N = 2 ** 14
-SCRYPT_R = 8
-SCRYPT_P = 1
+# Cost for new hashes; `scripts/calibrate_scrypt.py` picks N for a target
+# verify latency. Each user hash stores the parameters it was made with in
+# `pass_params`, so changing these does not invalidate stored passphrases:
+# old records verify with their own parameters and are rehashed on the next
+# successful login (`needs_rehash`). Records without `pass_params` predate
+# versioning and use LEGACY_PARAMS.
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
 SCRYPT_LEN = 32
+LEGACY_PARAMS: Dict[str, Any] = {"alg": "scrypt", "n": 2 ** 14, "r": 8, "p": 1, "dklen": 32}
+# Each scrypt call holds 128 * N * r bytes (16 MB at N=2**14); this caps how
+# many run at once per process. Calls beyond it wait in the executor queue.
+SCRYPT_MAX_CONCURRENCY = int(os.getenv("SCRYPT_MAX_CONCURRENCY", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_queued = 0
 
 
 def _normalize_passphrase(p: str) -> str:
@@ -39,25 +62,124 @@ def _normalize_passphrase(p: str) -> str:
     return s.lower()
 
 
-def hash_passphrase(passphrase: str, salt: bytes | None = None) -> Tuple[str, str]:
-    salt = salt or os.urandom(16)
+def _scrypt_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SCRYPT_MAX_CONCURRENCY, thread_name_prefix="scrypt")
+        return _executor
+
+
+def _submit(fn: Callable[[], T]) -> "Future[T]":
+    """Run `fn` on the scrypt executor, recording queue time and run time."""
+    global _queued
+    submitted = time.perf_counter()
+
+    def run() -> T:
+        global _queued
+        started = time.perf_counter()
+        with _executor_lock:
+            _queued -= 1
+            metrics.set_gauge("scrypt.queued", _queued)
+        metrics.observe("scrypt.queue_ms", (started - submitted) * 1000)
+        try:
+            return fn()
+        finally:
+            metrics.observe("scrypt.hash_ms", (time.perf_counter() - started) * 1000)
+
+    with _executor_lock:
+        _queued += 1
+        metrics.set_gauge("scrypt.queued", _queued)
+    return _scrypt_executor().submit(run)
+
+
+def current_params() -> Dict[str, Any]:
+    return {"alg": "scrypt", "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P, "dklen": SCRYPT_LEN}
+
+
+def parse_params(raw: Optional[str]) -> Dict[str, Any]:
+    """Parameters from a `pass_params` field; LEGACY_PARAMS when missing or unreadable."""
+    if not raw:
+        return dict(LEGACY_PARAMS)
+    try:
+        params = json.loads(raw)
+        return {**LEGACY_PARAMS, **{k: params[k] for k in LEGACY_PARAMS if k in params}}
+    except Exception:
+        return dict(LEGACY_PARAMS)
+
+
+def needs_rehash(raw: Optional[str]) -> bool:
+    """True when a stored record was made with other than the current parameters."""
+    return parse_params(raw) != current_params()
+
+
+def _derive(passphrase: str, salt: bytes, params: Optional[Dict[str, Any]] = None) -> str:
+    params = params or current_params()
+    if params["alg"] != "scrypt":
+        raise ValueError(f"unsupported passphrase algorithm {params['alg']!r}")
+    n, r, p = int(params["n"]), int(params["r"]), int(params["p"])
     norm = _normalize_passphrase(passphrase)
-    h = hashlib.scrypt(norm.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=SCRYPT_LEN)
-    return salt.hex(), h.hex()
+    # hashlib's default maxmem (32 MB) is below what N >= 2**15 needs.
+    maxmem = 128 * r * (n + p + 2) + (1 << 20)
+    return hashlib.scrypt(norm.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=int(params["dklen"]), maxmem=maxmem).hex()
 
 
-def verify_passphrase(stored_salt_hex: str, stored_hash_hex: str, attempt: str) -> bool:
+def _hash(passphrase: str, salt: bytes | None) -> Tuple[str, str]:
+    salt = salt or os.urandom(16)
+    return salt.hex(), _derive(passphrase, salt)
+
+
+def _verify(stored_salt_hex: str, stored_hash_hex: str, attempt: str, params_raw: Optional[str]) -> bool:
     try:
-        salt = bytes.fromhex(stored_salt_hex)
-        expected_hex = (stored_hash_hex or "").lower()
-        norm = _normalize_passphrase(attempt)
-        calc_hex = hashlib.scrypt(norm.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=SCRYPT_LEN).hex()
+        calc_hex = _derive(attempt, bytes.fromhex(stored_salt_hex), parse_params(params_raw))
         # constant-time compare on hex strings (same length)
-        return hmac.compare_digest(calc_hex, expected_hex)
+        return hmac.compare_digest(calc_hex, (stored_hash_hex or "").lower())
     except Exception:
         return False
 
 
+def hash_passphrase(passphrase: str, salt: bytes | None = None) -> Tuple[str, str]:
+    """Return (salt_hex, hash_hex) under the current parameters.
+
+    Blocks; from async code use `ahash_passphrase`. Prefer `hash_record`,
+    which also returns the `pass_params` to store alongside.
+    """
+    return _submit(lambda: _hash(passphrase, salt)).result()
+
+
+def _record(salt_hex: str, hash_hex: str) -> Dict[str, str]:
+    return {"pass_salt": salt_hex, "pass_hash": hash_hex, "pass_params": json.dumps(current_params(), sort_keys=True)}
+
+
+def hash_record(passphrase: str) -> Dict[str, str]:
+    """`pass_salt`, `pass_hash` and `pass_params` fields for the `user:{id}` hash."""
+    return _record(*hash_passphrase(passphrase))
+
+
+def verify_passphrase(stored_salt_hex: str, stored_hash_hex: str, attempt: str, params: Optional[str] = None) -> bool:
+    """Blocking verify against a record made with `params` (the stored
+    `pass_params`); from async code use `averify_passphrase`."""
+    return _submit(lambda: _verify(stored_salt_hex, stored_hash_hex, attempt, params)).result()
+
+
+async def ahash_passphrase(passphrase: str, salt: bytes | None = None) -> Tuple[str, str]:
+    return await asyncio.wrap_future(_submit(lambda: _hash(passphrase, salt)))
+
+
+async def ahash_record(passphrase: str) -> Dict[str, str]:
+    return _record(*await ahash_passphrase(passphrase))
+
+
+async def averify_passphrase(stored_salt_hex: str, stored_hash_hex: str, attempt: str, params: Optional[str] = None) -> bool:
+    """Verify on the scrypt executor without blocking the event loop."""
+    return await asyncio.wrap_future(_submit(lambda: _verify(stored_salt_hex, stored_hash_hex, attempt, params)))
+
+
+def attempt_hash(stored_salt_hex: str, attempt: str, params: Optional[str] = None) -> str:
+    """Hash of `attempt` under a stored salt and parameters, for admin diagnostics only."""
+    return _submit(lambda: _derive(attempt, bytes.fromhex(stored_salt_hex), parse_params(params))).result()
+
+
 def normalize_pass_for_debug(p: str) -> str:
     """Expose normalized passphrase for admin-side debugging.
 
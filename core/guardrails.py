@@ -1,17 +1,67 @@
 import os
-from typing import Dict, Any
+import re
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
 
 _policy_text = ""
+_policy_version = ""
+_crisis_patterns: Optional[List[Tuple[str, "re.Pattern[str]"]]] = None
+
+# Most urgent first: a message matching several levels gets the first.
+CRISIS_LEVELS = ("imminent", "risk")
+
+
+_GUARDRAILS_DIR = os.path.join(os.path.dirname(__file__), "..", "guardrails")
 
 
 def load_policy() -> None:
-    global _policy_text
-    path = os.path.join(os.path.dirname(__file__), "..", "guardrails", "na_uk_policy.md")
-    with open(path, "r", encoding="utf-8") as f:
+    global _policy_text, _policy_version
+    with open(os.path.join(_GUARDRAILS_DIR, "na_uk_policy.md"), "r", encoding="utf-8") as f:
         _policy_text = f.read().strip()
+    _policy_version = ""
+    load_crisis_patterns()
 
 
-def build_system_prompt(profile: Dict[str, Any], memory: Dict[str, Any]) -> str:
+def load_crisis_patterns(path: str = os.path.join(_GUARDRAILS_DIR, "crisis_patterns.txt")) -> None:
+    """Compile the crisis phrase file into one alternation regex per level.
+
+    Patterns are matched against lowercased text; lowercasing once is about
+    twice as fast as `re.IGNORECASE` on every alternative.
+    """
+    global _crisis_patterns
+    groups: Dict[str, List[str]] = {}
+    level = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                level = line[1:-1].strip()
+                continue
+            if level:
+                groups.setdefault(level, []).append(line)
+    ordered = [lv for lv in CRISIS_LEVELS if lv in groups] + [lv for lv in groups if lv not in CRISIS_LEVELS]
+    _crisis_patterns = [
+        (lv, re.compile(r"\b(?:" + "|".join(f"(?:{p})" for p in groups[lv]) + r")\b"))
+        for lv in ordered
+    ]
+
+
+def policy_version() -> str:
+    """Short hash of the caller-independent system prompt (policy + persona)."""
+    global _policy_version
+    if not _policy_version:
+        _policy_version = hashlib.sha256(build_static_prompt().encode("utf-8")).hexdigest()[:12]
+    return _policy_version
+
+
+def build_static_prompt() -> str:
+    """Policy, persona and reply contract: identical bytes for every caller.
+
+    Sent as the first message so the provider's prompt cache can reuse the
+    prefix across callers; anything caller- or turn-specific goes after it.
+    """
     parts = [_policy_text]
     # Persona and reply contract layered on top of the policy.
     parts.append(
@@ -23,6 +73,13 @@ def build_system_prompt(profile: Dict[str, Any], memory: Dict[str, Any]) -> str:
     parts.append(
         "When giving stepwork or NA-specific guidance, use only the NA literature context provided to you and include citations like [SWG p.23] or [BT p.15]. If there is no relevant context, say you can’t cite a passage and stick to NA principles."
     )
+    parts.append("Keep replies under 120 words and within NA guidelines.")
+    return "\n".join(parts)
+
+
+def build_caller_context(profile: Dict[str, Any], memory: Dict[str, Any], summary: str = "") -> str:
+    """Per-caller facts (name, recent topics, conversation summary); may be empty."""
+    parts = []
     if profile:
         name = profile.get("name", "Caller")
         parts.append(f"The caller is {name}.")
@@ -30,9 +87,54 @@ def build_system_prompt(profile: Dict[str, Any], memory: Dict[str, Any]) -> str:
         topics = memory.get("last_topics")
         if topics:
             parts.append(f"Recent topics: {topics}.")
-    parts.append("Keep replies under 120 words and within NA guidelines.")
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}")
     return "\n".join(parts)
 
 
+def build_system_prompt(profile: Dict[str, Any], memory: Dict[str, Any], summary: str = "") -> str:
+    caller = build_caller_context(profile, memory, summary)
+    return build_static_prompt() + ("\n" + caller if caller else "")
+
+
+def crisis_level(text: str) -> Optional[str]:
+    """Most urgent crisis level whose patterns match `text`, else None."""
+    if not text:
+        return None
+    if _crisis_patterns is None:
+        load_crisis_patterns()
+    lower = text.lower().replace("\u2019", "'")
+    for level, pattern in _crisis_patterns:
+        if pattern.search(lower):
+            return level
+    return None
+
+
+def mentions_crisis(text: str) -> bool:
+    return crisis_level(text) is not None
+
+
+def crisis_reply(level: str) -> str:
+    """Templated safety reply for the fast path, following "Safety Escalation"."""
+    emergency = os.getenv("EMERGENCY_UK") or "999"
+    helpline = os.getenv("NA_HELPLINE_UK")
+    helpline_line = f"The NA helpline is {helpline} if you want to talk to another addict." if helpline else (
+        "The NA helpline can also put you in touch with another addict."
+    )
+    if level == "imminent":
+        return (
+            "I’m really glad you told me. Your safety matters most right now. "
+            f"If you might act on this or have taken something, please call **{emergency}** now. "
+            "If you can, let someone you trust know and stay near them. "
+            f"{helpline_line} I’m still here, and we can keep talking."
+        )
+    return (
+        "Thank you for telling me; that sounds really hard. "
+        "Please think about speaking to someone today: **NHS 111**, your GP, or A&E if it gets worse. "
+        f"If you are in immediate danger, call **{emergency}**. "
+        f"{helpline_line} I’m still here, and we can keep talking."
+    )
+
+
 def get_excerpt() -> str:
     return _policy_text.splitlines()[0]
@@ -0,0 +1,132 @@
+"""Idempotency keys for chat turns.
+
+A client that retries `/v2/chat/send` with the same `Idempotency-Key` gets
+the first attempt's reply back instead of a second completion and a
+duplicate history entry. Records live at `idem:{session_id}:{key hash}`:
+
+- `{"state": "pending", "fp": ...}` while the first request runs, claimed
+  with SET NX so exactly one request does the work
+- `{"state": "done", "fp": ..., "response": {...}}` once it finishes, kept
+  for IDEMPOTENCY_TTL_SECONDS
+
+Duplicates that arrive while the first request is still running wait for
+its result: on the same worker via an in-process future, elsewhere by
+polling the record. A failed first request releases its claim so a retry
+can try again.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from core import metrics
+from core.redis_store import get_async_client
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.1"))
+MAX_KEY_LENGTH = 255
+
+# Requests this worker is running, so local duplicates need not poll Redis.
+_inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+
+class InFlight(Exception):
+    """The original request is still running after the wait budget."""
+
+
+class Mismatch(Exception):
+    """The key was already used for a different request body."""
+
+
+def record_key(session_id: str, key: str) -> str:
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return f"idem:{session_id}:{digest}"
+
+
+def fingerprint(message: str) -> str:
+    return hashlib.sha256((message or "").encode("utf-8")).hexdigest()[:16]
+
+
+async def _load(rkey: str) -> Optional[Dict[str, Any]]:
+    raw = await get_async_client().get(rkey)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+def _replay(record: Dict[str, Any], fp: str) -> Dict[str, Any]:
+    if record.get("fp") != fp:
+        raise Mismatch()
+    metrics.incr("idempotency.replayed")
+    return record["response"]
+
+
+async def _wait(rkey: str, fp: str) -> Dict[str, Any]:
+    metrics.incr("idempotency.waited")
+    local = _inflight.get(rkey)
+    if local is not None:
+        await asyncio.wait({local}, timeout=IDEMPOTENCY_WAIT_SECONDS)
+        if not local.done():
+            raise InFlight()
+        if not local.cancelled():
+            metrics.incr("idempotency.replayed")
+            return local.result()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = await _load(rkey)
+        if record is None:
+            raise InFlight()  # released by a failed original; the client may retry
+        if record.get("fp") != fp:
+            raise Mismatch()
+        if record.get("state") == "done":
+            return _replay(record, fp)
+        if loop.time() >= deadline:
+            raise InFlight()
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+async def run_once(session_id: str, key: str, message: str, work) -> Dict[str, Any]:
+    """Run `work()` at most once per (session, key) within the TTL.
+
+    Returns the stored response for repeats. Raises `Mismatch` when the key
+    was used with a different message and `InFlight` when the original is
+    still running after IDEMPOTENCY_WAIT_SECONDS.
+    """
+    rkey = record_key(session_id, key)
+    fp = fingerprint(message)
+    r = get_async_client()
+    pending = json.dumps({"state": "pending", "fp": fp})
+    if not await r.set(rkey, pending, ex=IDEMPOTENCY_TTL_SECONDS, nx=True):
+        record = await _load(rkey)
+        if record is None:
+            raise InFlight()  # the original just failed and released the key
+        if record.get("state") == "done":
+            return _replay(record, fp)
+        if record.get("fp") != fp:
+            raise Mismatch()
+        return await _wait(rkey, fp)
+
+    future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+    _inflight[rkey] = future
+    try:
+        response = await work()
+    except BaseException:
+        try:
+            await r.delete(rkey)
+        finally:
+            future.cancel()  # waiters fall back to the (now released) record
+        raise
+    else:
+        done = {"state": "done", "fp": fp, "response": response}
+        await r.set(rkey, json.dumps(done), ex=IDEMPOTENCY_TTL_SECONDS)
+        future.set_result(response)
+        return response
+    finally:
+        _inflight.pop(rkey, None)
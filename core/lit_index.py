@@ -1,19 +1,15 @@
 import os
 import re
 import json
+import asyncio
 import hashlib
 from typing import List, Dict, Any, Optional, Tuple
 
-from core.redis_store import get_client
+from core.redis_store import get_client, get_read_client
+from core.llm import call as llm_call, call_sync as llm_call_sync, get_async_client, get_sync_client
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:
-    OpenAI = None
-
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+PHRASE_INDEX_BATCH = int(os.getenv("PHRASE_INDEX_BATCH", "500"))
 
 
 def _slug(s: str) -> str:
@@ -36,18 +32,28 @@ def _abbrev_from_filename(name: str) -> str:
     return abbr[:6]
 
 
-def _embed_client():
-    if OpenAI and OPENAI_API_KEY:
-        return OpenAI(api_key=OPENAI_API_KEY)
-    return None
+def _embed_texts(texts: List[str]) -> Optional[List[List[float]]]:
+    client = get_sync_client()
+    if not client:
+        return None
+    try:
+        resp = llm_call_sync(
+            "embed",
+            lambda timeout: client.with_options(timeout=timeout).embeddings.create(model=EMBED_MODEL, input=texts),
+            # whole-document batches at index time need more than a query's budget
+            deadline=None if len(texts) == 1 else 120.0,
+        )
+        return [d.embedding for d in resp.data]
+    except Exception:
+        return None
 
 
-def _embed_texts(texts: List[str]) -> Optional[List[List[float]]]:
-    client = _embed_client()
+async def _aembed_texts(texts: List[str]) -> Optional[List[List[float]]]:
+    client = get_async_client()
     if not client:
         return None
     try:
-        resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
+        resp = await llm_call("embed", lambda: client.embeddings.create(model=EMBED_MODEL, input=texts))
         return [d.embedding for d in resp.data]
     except Exception:
         return None
@@ -72,6 +78,15 @@ def _keyword_score(q: str, text: str) -> float:
     return count / max(5, len(ts))
 
 
+_PHRASE_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+
+def _phrase_tokens(text: str) -> List[str]:
+    """Lowercased word tokens used by the positional index (curly quotes folded)."""
+    s = (text or "").lower().replace("\u2019", "'").replace("\u2018", "'")
+    return _PHRASE_TOKEN_RE.findall(s)
+
+
 def extract_pdf(path: str) -> List[Tuple[int, str]]:
     """Return list of (page_number starting at 1, text)."""
     from PyPDF2 import PdfReader  # lazy import
@@ -181,11 +196,73 @@ def index_dir(content_dir: str = "content/na", overwrite: bool = False) -> Dict[
             added += 1
 
     r.set("lit:index:all", json.dumps(all_chunk_ids))
-    return {"added": added, "updated": updated, "skipped": skipped, "total_chunks": len(all_chunk_ids), "errors": errors}
+    phrase_terms = build_phrase_index(all_chunk_ids)
+    return {
+        "added": added,
+        "updated": updated,
+        "skipped": skipped,
+        "total_chunks": len(all_chunk_ids),
+        "phrase_terms": phrase_terms,
+        "errors": errors,
+    }
+
+
+def build_phrase_index(chunk_ids: List[str]) -> int:
+    """Rebuild the positional inverted index over the given chunks.
+
+    Each term gets a hash ``lit:pos:{term}`` mapping chunk id -> comma-separated
+    word positions, so a phrase lookup only touches the postings of its own
+    terms. The term list is kept in ``lit:pos:terms`` so a rebuild can drop
+    postings for terms that no longer occur. Returns the number of terms.
+
+    Reads and writes go in non-transactional pipelines of PHRASE_INDEX_BATCH
+    commands so a large corpus never becomes one long blocking transaction.
+    Each term is written to a temporary key and RENAMEd over the live one,
+    so lookups during a rebuild see either the old or the new postings.
+    """
+    r = get_client()
+    postings: Dict[str, Dict[str, List[int]]] = {}
+    for start in range(0, len(chunk_ids), PHRASE_INDEX_BATCH):
+        batch = chunk_ids[start : start + PHRASE_INDEX_BATCH]
+        pipe = r.pipeline(transaction=False)
+        for cid in batch:
+            pipe.get(f"lit:chunk:{cid}")
+        for cid, raw in zip(batch, pipe.execute()):
+            if not raw:
+                continue
+            try:
+                text = json.loads(raw).get("text", "")
+            except Exception:
+                continue
+            for pos, tok in enumerate(_phrase_tokens(text)):
+                postings.setdefault(tok, {}).setdefault(cid, []).append(pos)
+
+    terms = sorted(postings)
+    for start in range(0, len(terms), PHRASE_INDEX_BATCH):
+        pipe = r.pipeline(transaction=False)
+        for term in terms[start : start + PHRASE_INDEX_BATCH]:
+            tmp = f"lit:pos:tmp:{term}"
+            pipe.delete(tmp)
+            pipe.hset(tmp, mapping={cid: ",".join(map(str, ps)) for cid, ps in postings[term].items()})
+            pipe.rename(tmp, f"lit:pos:{term}")
+        pipe.execute()
+
+    old_raw = r.get("lit:pos:terms")
+    r.set("lit:pos:terms", json.dumps(terms))
+    try:
+        stale = sorted(set(json.loads(old_raw)) - set(postings)) if old_raw else []
+    except Exception:
+        stale = []
+    for start in range(0, len(stale), PHRASE_INDEX_BATCH):
+        pipe = r.pipeline(transaction=False)
+        for term in stale[start : start + PHRASE_INDEX_BATCH]:
+            pipe.delete(f"lit:pos:{term}")
+        pipe.execute()
+    return len(postings)
 
 
 def list_docs() -> List[Dict[str, Any]]:
-    r = get_client()
+    r = get_read_client("lit.docs")
     docs: List[Dict[str, Any]] = []
     # naive: scan keys by known prefix
     # Assuming small corpus
@@ -221,7 +298,7 @@ def list_docs() -> List[Dict[str, Any]]:
 
 
 def _iter_chunks() -> List[Dict[str, Any]]:
-    r = get_client()
+    r = get_read_client("lit.chunks")
     ids_raw = r.get("lit:index:all")
     chunks: List[Dict[str, Any]] = []
     if ids_raw:
@@ -245,6 +322,23 @@ def search(query: str, k: int = 4) -> List[Dict[str, Any]]:
         return []
     # try embeddings
     emb = _embed_texts([query])
+    return _rank(query, chunks, emb, k)
+
+
+async def asearch(query: str, k: int = 4) -> List[Dict[str, Any]]:
+    """Non-blocking `search` for async handlers.
+
+    The query embedding uses the shared async client; chunk loading and
+    scoring are synchronous Redis/CPU work and run in a worker thread.
+    """
+    chunks = await asyncio.to_thread(_iter_chunks)
+    if not chunks:
+        return []
+    emb = await _aembed_texts([query]) if "emb" in chunks[0] else None
+    return await asyncio.to_thread(_rank, query, chunks, emb, k)
+
+
+def _rank(query: str, chunks: List[Dict[str, Any]], emb: Optional[List[List[float]]], k: int) -> List[Dict[str, Any]]:
     scored: List[Tuple[float, Dict[str, Any]]] = []
     if emb and chunks and "emb" in chunks[0]:
         qv = emb[0]
@@ -262,6 +356,83 @@ def search(query: str, k: int = 4) -> List[Dict[str, Any]]:
     return results
 
 
+def phrase_search(phrase: str, k: int = 4) -> List[Dict[str, Any]]:
+    """Exact phrase lookup over the positional index.
+
+    Reads each term's posting count (HLEN), loads the full postings of the
+    rarest term only, then HMGETs just those candidate chunk ids from the
+    other terms' postings and keeps chunks where the terms occur at
+    consecutive positions. Work is bounded by the rarest term's postings,
+    not by corpus size or by common words in the phrase. Score is the
+    number of occurrences.
+    """
+    terms = _phrase_tokens(phrase)
+    if not terms:
+        return []
+    r = get_read_client("lit.phrase")
+    distinct = list(dict.fromkeys(terms))
+    pipe = r.pipeline()
+    for term in distinct:
+        pipe.hlen(f"lit:pos:{term}")
+    sizes = dict(zip(distinct, pipe.execute()))
+    if not all(sizes.values()):
+        return []
+
+    rarest = min(distinct, key=lambda t: sizes[t])
+    rare_postings = r.hgetall(f"lit:pos:{rarest}")
+    cids = list(rare_postings)
+    others = [t for t in distinct if t != rarest]
+    pipe = r.pipeline()
+    for term in others:
+        pipe.hmget(f"lit:pos:{term}", cids)
+    raw_by_term = {rarest: list(rare_postings.values())}
+    raw_by_term.update(zip(others, pipe.execute()))
+
+    candidates = [i for i in range(len(cids)) if all(raw_by_term[t][i] for t in others)]
+    if not candidates:
+        return []
+    postings: Dict[str, Dict[str, set]] = {
+        t: {cids[i]: {int(p) for p in raw_by_term[t][i].split(",") if p} for i in candidates} for t in distinct
+    }
+    positions = [postings[t] for t in terms]
+
+    hits: List[Tuple[int, str, int]] = []
+    for cid in (cids[i] for i in candidates):
+        starts = [
+            p for p in positions[0][cid]
+            if all((p + i) in positions[i][cid] for i in range(1, len(terms)))
+        ]
+        if starts:
+            hits.append((len(starts), cid, min(starts)))
+    hits.sort(key=lambda h: (-h[0], h[1]))
+    hits = hits[:k]
+    if not hits:
+        return []
+
+    pipe = r.pipeline()
+    for _, cid, _ in hits:
+        pipe.get(f"lit:chunk:{cid}")
+    results: List[Dict[str, Any]] = []
+    for (count, cid, first), raw in zip(hits, pipe.execute()):
+        if not raw:
+            continue
+        try:
+            c = json.loads(raw)
+        except Exception:
+            continue
+        c.pop("emb", None)
+        results.append(
+            {
+                "score": float(count),
+                "chunk_id": cid,
+                "position": first,
+                "cite": f"[{c.get('abbrev', 'DOC')} p.{c.get('page', 0)}]",
+                **c,
+            }
+        )
+    return results
+
+
 def build_context(snippets: List[Dict[str, Any]]) -> str:
     lines = [
         "Use only NA-approved literature below for step guidance. If insufficient, say so and stick to NA principles.",
@@ -0,0 +1,370 @@
+"""Shared OpenAI access: pooled clients plus a guarded call layer.
+
+`call` (async) and `call_sync` wrap every provider request with a
+per-request deadline and a per-endpoint circuit breaker; `call` can also
+hedge, starting a second identical request once the first has run longer
+than the recent p95 latency and taking whichever finishes first. Callers
+keep their existing fallback replies: any failure, timeout or open breaker
+surfaces as an exception.
+
+Calls named in ADMITTED_CALLS also take a slot in the matching
+`core.admission` pool first; a shed call raises `admission.Overloaded`.
+Responses carrying a usage block are recorded by `core.usage`; streamed
+completions report usage on their last chunk, so callers record those.
+
+`stream` guards a streamed completion: the deadline covers the whole
+iteration, each chunk must arrive within LLM_STREAM_CHUNK_TIMEOUT_SECONDS,
+and errors mid-stream count against the breaker.
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from core import admission, metrics, usage
+from core.usage import usage_tokens
+
+try:
+    from openai import AsyncOpenAI, OpenAI  # type: ignore
+except Exception:
+    AsyncOpenAI = None
+    OpenAI = None
+
+T = TypeVar("T")
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+# Retries are left to hedging and the caller's fallback, not the SDK's backoff.
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+DEFAULT_DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
+DEADLINES: Dict[str, float] = {
+    "chat": float(os.getenv("LLM_CHAT_DEADLINE_SECONDS", str(DEFAULT_DEADLINE))),
+    "embed": float(os.getenv("LLM_EMBED_DEADLINE_SECONDS", "5")),
+    "captions": float(os.getenv("LLM_CAPTIONS_DEADLINE_SECONDS", "30")),
+    "summary": float(os.getenv("LLM_SUMMARY_DEADLINE_SECONDS", "30")),
+}
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") == "1"
+HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "800"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+STREAM_CHUNK_TIMEOUT = float(os.getenv("LLM_STREAM_CHUNK_TIMEOUT_SECONDS", "10"))
+# Chat turns are admitted per turn by the routes; these are admitted per call.
+ADMITTED_CALLS = ("captions", "embed")
+
+_async_client: Any = None
+_sync_client: Any = None
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the provider while an endpoint's breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open probe -> closed."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set(self, state: int) -> None:
+        self.state = state
+        metrics.set_gauge(f"llm.{self.name}.breaker", state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self._set(self.HALF_OPEN)
+                return True
+            if self.state == self.HALF_OPEN:
+                return False  # one probe at a time
+            return True
+
+    def probing(self) -> bool:
+        """True right after `allow()` admitted the half-open probe."""
+        return self.state == self.HALF_OPEN
+
+    def abandon(self, probe: bool) -> None:
+        """A call ended without an outcome (cancelled); free the probe slot.
+
+        The breaker returns to OPEN with its original open time, so the next
+        call after the cooldown becomes the probe instead of waiting forever.
+        """
+        with self._lock:
+            if probe and self.state == self.HALF_OPEN:
+                self._set(self.OPEN)
+
+    def success(self) -> None:
+        with self._lock:
+            self.consecutive = 0
+            if self.state != self.CLOSED:
+                self._set(self.CLOSED)
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            if self.state == self.HALF_OPEN or self.consecutive >= self.failures:
+                if self.state != self.OPEN:
+                    metrics.incr(f"llm.{self.name}.breaker_opened")
+                self.opened_at = time.monotonic()
+                self._set(self.OPEN)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def hedge_delay(name: str) -> Optional[float]:
+    """Seconds to wait before hedging: recent p95 latency, floored at HEDGE_MIN_MS."""
+    if not HEDGE_ENABLED or metrics.timing_count(f"llm.{name}.latency_ms") < HEDGE_MIN_SAMPLES:
+        return None
+    p95 = metrics.percentile(f"llm.{name}.latency_ms", 0.95) or 0.0
+    return max(p95, HEDGE_MIN_MS) / 1000
+
+
+async def _hedged(name: str, make_call: Callable[[], Awaitable[T]], hedge: bool) -> T:
+    delay = hedge_delay(name) if hedge else None
+    first = asyncio.ensure_future(make_call())
+    tasks = [first]
+    try:
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        metrics.incr(f"llm.{name}.hedged")
+        second = asyncio.ensure_future(make_call())
+        tasks.append(second)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        metrics.incr(f"llm.{name}.hedge_wins")
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        # Losers and requests abandoned by the deadline are cancelled.
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call(
+    name: str,
+    make_call: Callable[[], Awaitable[T]],
+    deadline: Optional[float] = None,
+    hedge: bool = True,
+) -> T:
+    """Run an async provider request under deadline, hedging and breaker.
+
+    `make_call` must start a fresh request each time it is invoked (hedging
+    may invoke it twice). Raises CircuitOpen, admission.Overloaded,
+    asyncio.TimeoutError or the provider's error.
+    """
+    async with admission.admit(name) if name in ADMITTED_CALLS else contextlib.nullcontext():
+        guard = breaker(name)
+        if not guard.allow():
+            metrics.incr(f"llm.{name}.short_circuited")
+            raise CircuitOpen(name)
+        probe = guard.probing()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(_hedged(name, make_call, hedge), timeout=deadline or DEADLINES.get(name, DEFAULT_DEADLINE))
+        except asyncio.TimeoutError:
+            metrics.incr(f"llm.{name}.timeouts")
+            guard.failure()
+            raise
+        except Exception:
+            metrics.incr(f"llm.{name}.errors")
+            guard.failure()
+            raise
+        except BaseException:  # cancelled: no outcome, but release a probe
+            guard.abandon(probe)
+            raise
+        guard.success()
+        latency_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"llm.{name}.latency_ms", latency_ms)
+        await usage.arecord(name, getattr(result, "usage", None), getattr(result, "model", ""), latency_ms)
+        return result
+
+
+def call_sync(name: str, make_call: Callable[[float], T], deadline: Optional[float] = None) -> T:
+    """Blocking counterpart of `call` (no hedging) for sync code paths.
+
+    `make_call` receives the deadline in seconds and must pass it to the
+    client as the request timeout.
+    """
+    with admission.admit_sync(name) if name in ADMITTED_CALLS else contextlib.nullcontext():
+        guard = breaker(name)
+        if not guard.allow():
+            metrics.incr(f"llm.{name}.short_circuited")
+            raise CircuitOpen(name)
+        probe = guard.probing()
+        start = time.perf_counter()
+        try:
+            result = make_call(deadline or DEADLINES.get(name, DEFAULT_DEADLINE))
+        except Exception:
+            metrics.incr(f"llm.{name}.errors")
+            guard.failure()
+            raise
+        except BaseException:
+            guard.abandon(probe)
+            raise
+        guard.success()
+        latency_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"llm.{name}.latency_ms", latency_ms)
+        usage.record(name, getattr(result, "usage", None), getattr(result, "model", ""), latency_ms)
+        return result
+
+
+async def stream(
+    name: str,
+    make_call: Callable[[], Awaitable[Any]],
+    deadline: Optional[float] = None,
+    chunk_timeout: Optional[float] = None,
+) -> AsyncIterator[Any]:
+    """Yield the chunks of a streamed provider request under deadline and breaker.
+
+    The deadline covers opening the stream and reading every chunk; a gap
+    longer than `chunk_timeout` (LLM_STREAM_CHUNK_TIMEOUT_SECONDS) between
+    chunks is a timeout. Timeouts and errors, including mid-stream ones,
+    count as breaker failures; a consumer that stops early after chunks
+    arrived counts as a success. No hedging: a stream cannot be swapped
+    once chunks are forwarded. Usage arrives on the last chunk, so callers
+    record it.
+    """
+    guard = breaker(name)
+    if not guard.allow():
+        metrics.incr(f"llm.{name}.short_circuited")
+        raise CircuitOpen(name)
+    probe = guard.probing()
+    start = time.perf_counter()
+    ends_at = start + (deadline or DEADLINES.get(name, DEFAULT_DEADLINE))
+    gap = chunk_timeout or STREAM_CHUNK_TIMEOUT
+    resp: Any = None
+    received = 0
+    outcome = None
+    try:
+        resp = await asyncio.wait_for(make_call(), timeout=max(0.0, ends_at - time.perf_counter()))
+        chunks = resp.__aiter__()
+        while True:
+            remaining = min(gap, ends_at - time.perf_counter())
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+            except StopAsyncIteration:
+                break
+            received += 1
+            yield chunk
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "failed"
+        metrics.incr(f"llm.{name}.timeouts")
+        guard.failure()
+        raise
+    except Exception:
+        outcome = "failed"
+        metrics.incr(f"llm.{name}.errors")
+        guard.failure()
+        raise
+    finally:
+        if outcome == "ok" or (outcome is None and received):
+            guard.success()
+            metrics.observe(f"llm.{name}.latency_ms", (time.perf_counter() - start) * 1000)
+        elif outcome is None:  # cancelled or closed before any chunk
+            guard.abandon(probe)
+        close = getattr(resp, "close", None)
+        if outcome != "ok" and close is not None:
+            with contextlib.suppress(Exception):
+                res = close()
+                if asyncio.iscoroutine(res):
+                    await res
+
+
+def get_async_client() -> Optional[Any]:
+    """Shared AsyncOpenAI client for the process, or None without an API key.
+
+    One long-lived client means one httpx connection pool, so TLS connections
+    to the provider are reused across requests instead of per call.
+    """
+    global _async_client
+    if _async_client is None and AsyncOpenAI and OPENAI_API_KEY:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            )
+        )
+        _async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+    return _async_client
+
+
+def get_sync_client() -> Optional[Any]:
+    """Shared blocking OpenAI client for sync code paths (indexing, sync routes)."""
+    global _sync_client
+    if _sync_client is None and OpenAI and OPENAI_API_KEY:
+        _sync_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=OPENAI_MAX_RETRIES)
+    return _sync_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        try:
+            await _async_client.close()
+        finally:
+            _async_client = None
+
+
+def message_content(resp: Any) -> str:
+    """Extract the first choice's text from a chat completion response."""
+    choice = resp.choices[0]
+    # Support both dict-like and object-like message
+    msg = getattr(choice, "message", None)
+    if msg is None and isinstance(choice, dict):
+        msg = choice.get("message")
+    content = None
+    if msg is not None:
+        content = getattr(msg, "content", None)
+        if content is None and isinstance(msg, dict):
+            content = msg.get("content")
+    return str(content or "")
+
+
+def record_prompt_usage(name: str, usage: Any) -> None:
+    """Count prompt/cached tokens so prefix-cache reuse shows in /v2/admin/metrics."""
+    tokens = usage_tokens(usage)
+    if not tokens["prompt"]:
+        return
+    metrics.incr(f"{name}.prompt_tokens", tokens["prompt"])
+    metrics.incr(f"{name}.cached_tokens", tokens["cached"])
+    metrics.incr(f"{name}.completion_tokens", tokens["completion"])
+    prompt_total = metrics.counter(f"{name}.prompt_tokens")
+    metrics.set_gauge(f"{name}.cached_ratio", round(metrics.counter(f"{name}.cached_tokens") / prompt_total, 4))
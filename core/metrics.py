@@ -0,0 +1,93 @@
+"""In-process metrics: counters, gauges and latency samples.
+
+Values are per worker process and reset on restart. `snapshot()` is served
+by `/v2/admin/metrics`; timings report count, mean, p50, p95 and max over the
+most recent samples.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator
+
+TIMING_SAMPLES = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Deque[float]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def counter(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, ms: float) -> None:
+    with _lock:
+        samples = _timings.get(name)
+        if samples is None:
+            samples = _timings[name] = deque(maxlen=TIMING_SAMPLES)
+        samples.append(float(ms))
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+
+def timing_count(name: str) -> int:
+    with _lock:
+        return len(_timings.get(name, ()))
+
+
+def percentile(name: str, q: float) -> float | None:
+    with _lock:
+        samples = sorted(_timings.get(name, ()))
+    if not samples:
+        return None
+    idx = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+    return samples[idx]
+
+
+def _summarise(samples: Deque[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "count": n,
+        "mean_ms": round(sum(ordered) / n, 3),
+        "p50_ms": round(ordered[n // 2], 3),
+        "p95_ms": round(ordered[min(n - 1, int(round(0.95 * (n - 1))))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {k: _summarise(v) for k, v in _timings.items() if v},
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -0,0 +1,52 @@
+"""Pick a chat model tier per turn from cheap local features.
+
+Two tiers: "fast" for light turns and "strong" for turns that need more
+care. A turn goes to the strong tier when any of these hold:
+
+- the session was flagged by the crisis fast path (`routes.chat._crisis_turn`
+  answers crisis messages themselves before any routing)
+- literature retrieval fired, so the reply must cite passages
+- the message is longer than ROUTER_LONG_MESSAGE_CHARS
+- the conversation is deeper than ROUTER_DEEP_MESSAGES messages
+
+Both tiers default to OPENAI_CHAT_MODEL, so routing changes nothing until
+OPENAI_CHAT_MODEL_FAST / OPENAI_CHAT_MODEL_STRONG are set. Each routed turn
+is counted per tier and reason in the usage hashes (`usage.queue_route`,
+committed with the turn) so decisions can be audited per day, user and
+session.
+"""
+
+import os
+from typing import Tuple
+
+from core import metrics
+
+OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+FAST_MODEL = os.getenv("OPENAI_CHAT_MODEL_FAST") or OPENAI_CHAT_MODEL
+STRONG_MODEL = os.getenv("OPENAI_CHAT_MODEL_STRONG") or OPENAI_CHAT_MODEL
+ROUTER_LONG_MESSAGE_CHARS = int(os.getenv("ROUTER_LONG_MESSAGE_CHARS", "280"))
+ROUTER_DEEP_MESSAGES = int(os.getenv("ROUTER_DEEP_MESSAGES", "24"))
+
+TIERS = {"fast": FAST_MODEL, "strong": STRONG_MODEL}
+
+
+def choose(message: str, retrieval: bool, depth: int, flagged: bool = False) -> Tuple[str, str, str]:
+    """Return (tier, model, reason) for a turn and count the decision."""
+    if flagged:
+        tier, reason = "strong", "crisis_session"
+    elif retrieval:
+        tier, reason = "strong", "retrieval"
+    elif len(message or "") > ROUTER_LONG_MESSAGE_CHARS:
+        tier, reason = "strong", "long_message"
+    elif depth > ROUTER_DEEP_MESSAGES:
+        tier, reason = "strong", "deep_conversation"
+    else:
+        tier, reason = "fast", "default"
+    metrics.incr(f"router.{tier}")
+    metrics.incr(f"router.reason.{reason}")
+    return tier, TIERS[tier], reason
+
+
+def cache_model_key() -> str:
+    """Model identity for caches whose entries may come from either tier."""
+    return FAST_MODEL if FAST_MODEL == STRONG_MODEL else f"{FAST_MODEL}+{STRONG_MODEL}"
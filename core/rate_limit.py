@@ -1,6 +1,6 @@
 import os
 from fastapi import HTTPException, Request
-from .redis_store import get_client
+from .redis_store import get_async_client, get_client
 
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
 
@@ -12,12 +12,33 @@ def get_ip(request: Request) -> str:
     return request.client.host if request.client else "0.0.0.0"
 
 
+def rate_key(request: Request) -> str:
+    return f"rate:{get_ip(request)}"
+
+
+def enforce(count: int) -> None:
+    """Raise 429 when a window's request count is over the limit.
+
+    Lets callers fold the INCR into a larger pipeline (see core.turn_store).
+    """
+    if count > RATE_LIMIT_PER_MINUTE:
+        raise HTTPException(status_code=429, detail={"error": {"code": "RATE_LIMIT", "message": "Too many requests"}})
+
+
 def rate_limit(request: Request) -> None:
-    ip = get_ip(request)
-    key = f"rate:{ip}"
+    key = rate_key(request)
     client = get_client()
     count = client.incr(key)
     if count == 1:
         client.expire(key, 60)
-    if count > RATE_LIMIT_PER_MINUTE:
-        raise HTTPException(status_code=429, detail={"error": {"code": "RATE_LIMIT", "message": "Too many requests"}})
+    enforce(count)
+
+
+async def arate_limit(request: Request) -> None:
+    """`rate_limit` for async routes, on the async client."""
+    key = rate_key(request)
+    client = get_async_client()
+    count = await client.incr(key)
+    if count == 1:
+        await client.expire(key, 60)
+    enforce(count)
@@ -0,0 +1,194 @@
+"""Per-user long-term recall memory.
+
+`memory:{user_id}` only holds the last topic and a few notes. Recall keeps a
+bounded set of embedded items per user in one hash, `recall:{user_id}`:
+
+- `s:{session_id}`: the latest rolling summary of a past conversation
+  (written by `core.summarizer.fold_session`)
+- `n:{hash}`: a note added through `/v2/memory/notes`
+
+Each field is JSON `{"kind", "text", "ts", "last_used", "vec"}` where `vec` is
+the unit-normalised embedding packed as base64 float32. The hash is read in
+the same pipeline as the caller's profile (`turn_store.load_caller`), so a
+turn pays no extra round trip; scoring the message against every item is one
+matrix-vector product (numpy when installed, a plain loop otherwise).
+
+Prompt cost is fixed: at most RECALL_TOP_K items above RECALL_MIN_SCORE, each
+cut to RECALL_ITEM_CHARS. Past RECALL_MAX_ITEMS the least recently used item
+(by creation or last recall) is evicted.
+"""
+
+import array
+import base64
+import datetime as dt
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # optional; pure-Python scoring is fine at these sizes
+    np = None
+
+from core import metrics
+from core.llm import call as llm_call, get_async_client
+from core.redis_store import WatchError, get_async_client as get_redis
+
+RECALL_ENABLED = os.getenv("RECALL_ENABLED", "1") == "1"
+RECALL_MAX_ITEMS = int(os.getenv("RECALL_MAX_ITEMS", "50"))
+RECALL_TOP_K = int(os.getenv("RECALL_TOP_K", "3"))
+RECALL_MIN_SCORE = float(os.getenv("RECALL_MIN_SCORE", "0.3"))
+RECALL_ITEM_CHARS = int(os.getenv("RECALL_ITEM_CHARS", "200"))
+EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(os.getenv("RECALL_EMBED_DIMS", "256"))
+
+
+def recall_key(user_id: str) -> str:
+    return f"recall:{user_id}"
+
+
+def decode_items(raw: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    items: Dict[str, Dict[str, Any]] = {}
+    for item_id, value in (raw or {}).items():
+        try:
+            items[item_id] = json.loads(value)
+        except Exception:
+            continue
+    return items
+
+
+def _pack(vec: List[float]) -> str:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return base64.b64encode(array.array("f", [x / norm for x in vec]).tobytes()).decode("ascii")
+
+
+def _unpack(packed: str) -> array.array:
+    vec = array.array("f")
+    vec.frombytes(base64.b64decode(packed))
+    return vec
+
+
+async def _embed(text: str) -> Optional[List[float]]:
+    client = get_async_client()
+    if not client:
+        return None
+    try:
+        resp = await llm_call(
+            "embed", lambda: client.embeddings.create(model=EMBED_MODEL, input=[text], dimensions=EMBED_DIMS)
+        )
+        return resp.data[0].embedding
+    except Exception:
+        return None
+
+
+def score(items: Dict[str, Dict[str, Any]], query: List[float]) -> List[tuple]:
+    """Cosine score of `query` against every item: [(score, item_id), ...]."""
+    ids = [i for i, item in items.items() if item.get("vec")]
+    if not ids:
+        return []
+    norm = math.sqrt(sum(x * x for x in query)) or 1.0
+    if np is not None:
+        matrix = np.vstack([np.frombuffer(base64.b64decode(items[i]["vec"]), dtype=np.float32) for i in ids])
+        scores = matrix @ (np.asarray(query, dtype=np.float32) / norm)
+        return list(zip(scores.tolist(), ids))
+    q = [x / norm for x in query]
+    return [(sum(a * b for a, b in zip(_unpack(items[i]["vec"]), q)), i) for i in ids]
+
+
+async def recall(items: Dict[str, Dict[str, Any]], message: str, exclude: str = "") -> List[Dict[str, Any]]:
+    """Top RECALL_TOP_K items relevant to `message` (skipping id `exclude`)."""
+    candidates = {i: item for i, item in items.items() if i != exclude}
+    if not RECALL_ENABLED or not candidates:
+        return []
+    query = await _embed(message)
+    if not query:
+        return []
+    start = time.perf_counter()
+    ranked = sorted(score(candidates, query), reverse=True)
+    hits = [
+        dict(candidates[i], id=i, score=round(s, 3))
+        for s, i in ranked[:RECALL_TOP_K]
+        if s >= RECALL_MIN_SCORE
+    ]
+    metrics.observe("recall.score_ms", (time.perf_counter() - start) * 1000)
+    metrics.incr("recall.lookups")
+    metrics.incr("recall.hits", len(hits))
+    return hits
+
+
+def context(hits: List[Dict[str, Any]]) -> str:
+    """Prompt block for recalled items; bounded by RECALL_TOP_K * RECALL_ITEM_CHARS."""
+    lines = []
+    for hit in hits:
+        label = "Earlier conversation" if hit.get("kind") == "summary" else "Note"
+        day = (hit.get("ts") or "")[:10]
+        lines.append(f"- {label}{f' ({day})' if day else ''}: {hit['text']}")
+    return "From past conversations with this caller:\n" + "\n".join(lines)
+
+
+async def touch(user_id: str, hits: List[Dict[str, Any]]) -> None:
+    """Refresh last_used on recalled items so eviction keeps them.
+
+    Only items still stored are updated, from their current value under
+    WATCH: an item evicted or replaced since the turn read it is not written
+    back.
+    """
+    if not hits:
+        return
+    key = recall_key(user_id)
+    ids = [hit["id"] for hit in hits]
+    now = dt.datetime.utcnow().isoformat()
+    for _ in range(3):
+        async with get_redis().pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                mapping = {}
+                for item_id, raw in zip(ids, await pipe.hmget(key, ids)):
+                    if raw is None:
+                        continue
+                    try:
+                        item = json.loads(raw)
+                    except Exception:
+                        continue
+                    item["last_used"] = now
+                    mapping[item_id] = json.dumps(item)
+                if not mapping:
+                    return
+                pipe.multi()
+                pipe.hset(key, mapping=mapping)
+                await pipe.execute()
+                return
+            except WatchError:
+                metrics.incr("recall.touch_conflicts")
+
+
+async def remember(user_id: str, kind: str, text: str, item_id: Optional[str] = None) -> Optional[str]:
+    """Embed and store `text` for `user_id`, evicting past RECALL_MAX_ITEMS.
+
+    `item_id` replaces an existing item (one summary per session); notes get
+    a content hash so the same note is stored once.
+    """
+    text = (text or "").strip()
+    if not RECALL_ENABLED or not text:
+        return None
+    vec = await _embed(text)
+    if not vec:
+        return None
+    item_id = item_id or f"n:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
+    now = dt.datetime.utcnow().isoformat()
+    item = {"kind": kind, "text": text[:RECALL_ITEM_CHARS], "ts": now, "last_used": now, "vec": _pack(vec)}
+    r = get_redis()
+    key = recall_key(user_id)
+    await r.hset(key, mapping={item_id: json.dumps(item)})
+    metrics.incr("recall.stored")
+    if await r.hlen(key) > RECALL_MAX_ITEMS:
+        items = decode_items(await r.hgetall(key))
+        by_age = sorted(items, key=lambda i: items[i].get("last_used") or items[i].get("ts") or "")
+        evict = [i for i in by_age if i != item_id][: max(0, len(items) - RECALL_MAX_ITEMS)]
+        if evict:
+            await r.hdel(key, *evict)
+            metrics.incr("recall.evicted", len(evict))
+    return item_id
@@ -1,28 +1,110 @@
+import asyncio
+import itertools
 import json
 import os
+import time
 import datetime as dt
-from typing import Any, Dict, Optional
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 try:
     import redis  # type: ignore
+    import redis.asyncio as aioredis  # type: ignore
 except Exception:  # library may be missing in test env
     redis = None
+    aioredis = None
 
 try:  # used in tests
     import fakeredis  # type: ignore
 except Exception:
     fakeredis = None
 
+from core import metrics
+
 _client: Any = None
 _client_scheme: str = "unknown"  # one of: rediss, redis, fakeredis, memory, unknown
+_client_url: str = ""  # URL the sync client connected with (after any TLS fallback)
+_fake_server: Any = None  # shared by the sync and async fakeredis clients
+# One async client (and connection pool) per event loop: pooled connections
+# cannot move between loops. A server worker runs one loop, so one pool.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_REPLICA_URLS = [u.strip() for u in os.getenv("REDIS_REPLICA_URLS", "").split(",") if u.strip()]
+REDIS_REPLICA_TIMEOUT_SECONDS = float(os.getenv("REDIS_REPLICA_TIMEOUT_SECONDS", "0.5"))
+REDIS_REPLICA_RETRY_SECONDS = float(os.getenv("REDIS_REPLICA_RETRY_SECONDS", "30"))
+
+_replicas: Optional[List[Any]] = None
+_replica_down_until: Dict[int, float] = {}
+_replica_turn = itertools.count()
+_read_clients: Dict[str, "ReadClient"] = {}
+
+
+if redis is not None:
+    from redis.exceptions import WatchError  # type: ignore
+else:
+    class WatchError(Exception):
+        pass
+
+
+class _MemoryPipeline:
+    """Queues commands against a MemoryStore and replays them on execute().
+
+    Mirrors redis-py's WATCH flow: after watch() commands run immediately
+    until multi(). A single-process store has no other writers, so a watched
+    transaction never conflicts.
+    """
+
+    def __init__(self, store: "MemoryStore"):
+        self._store = store
+        self._calls: list = []
+        self._immediate = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def __getattr__(self, name: str):
+        fn = getattr(self._store, name)
+        if self._immediate:
+            return fn
+
+        def queue(*args, **kwargs):
+            self._calls.append((fn, args, kwargs))
+            return self
+
+        return queue
+
+    def watch(self, *keys: str) -> None:
+        self._immediate = True
+
+    def multi(self) -> None:
+        self._immediate = False
+
+    def unwatch(self) -> None:
+        self._immediate = False
+
+    def reset(self) -> None:
+        self._calls = []
+        self._immediate = False
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        calls, self._calls = self._calls, []
+        self._immediate = False
+        return [fn(*args, **kwargs) for fn, args, kwargs in calls]
 
 
 class MemoryStore:
     def __init__(self):
         self.store: Dict[str, Any] = {}
 
-    def set(self, key: str, value: Any, ex: Optional[int] = None):
+    def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False):
+        if nx and key in self.store:
+            return None
         self.store[key] = value
+        return True
 
     def get(self, key: str):
         return self.store.get(key)
@@ -31,6 +113,67 @@ class MemoryStore:
         self.store.setdefault(key, {})
         self.store[key].update(mapping)
 
+    def hdel(self, key: str, *fields: str) -> int:
+        h = self.store.get(key, {})
+        return sum(1 for f in fields if h.pop(f, None) is not None)
+
+    def hlen(self, key: str) -> int:
+        return len(self.store.get(key, {}))
+
+    def hmget(self, key: str, *fields: Any) -> list:
+        if len(fields) == 1 and isinstance(fields[0], (list, tuple)):
+            fields = tuple(fields[0])
+        h = self.store.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        self.store.setdefault(key, {})
+        self.store[key][field] = str(int(self.store[key].get(field, 0)) + amount)
+        return int(self.store[key][field])
+
+    def delete(self, *keys: str) -> int:
+        return sum(1 for k in keys if self.store.pop(k, None) is not None)
+
+    def rename(self, src: str, dst: str):
+        self.store[dst] = self.store.pop(src)
+        return True
+
+    def exists(self, *keys: str) -> int:
+        return sum(1 for k in keys if k in self.store)
+
+    def type(self, key: str) -> str:
+        value = self.store.get(key)
+        if value is None:
+            return "none"
+        if isinstance(value, dict):
+            return "hash"
+        if isinstance(value, list):
+            return "list"
+        return "string"
+
+    def rpush(self, key: str, *values: Any) -> int:
+        self.store.setdefault(key, [])
+        self.store[key].extend(values)
+        return len(self.store[key])
+
+    def lrange(self, key: str, start: int, end: int) -> list:
+        items = self.store.get(key, [])
+        n = len(items)
+        start = max(n + start, 0) if start < 0 else start
+        end = n + end if end < 0 else end
+        return items[start : end + 1]
+
+    def ltrim(self, key: str, start: int, end: int):
+        if key in self.store:
+            self.store[key] = self.lrange(key, start, end)
+        return True
+
+    def llen(self, key: str) -> int:
+        return len(self.store.get(key, []))
+
+    def ttl(self, key: str) -> int:
+        return -1 if key in self.store else -2
+
     def hgetall(self, key: str) -> Dict[str, Any]:
         return self.store.get(key, {})
 
@@ -38,7 +181,7 @@ class MemoryStore:
         self.store[key] = int(self.store.get(key, 0)) + 1
         return self.store[key]
 
-    def expire(self, key: str, ttl: int):
+    def expire(self, key: str, ttl: int, nx: bool = False):
         return
 
     def ping(self):
@@ -47,14 +190,20 @@ class MemoryStore:
     def flushdb(self):
         self.store.clear()
 
+    def pipeline(self, transaction: bool = True) -> _MemoryPipeline:
+        return _MemoryPipeline(self)
+
 
 def get_client():
     global _client
     global _client_scheme
+    global _client_url
+    global _fake_server
     if _client is None:
         url = os.getenv("REDIS_URL", "memory://")
         if url.startswith("fakeredis://") and fakeredis:
-            _client = fakeredis.FakeRedis(decode_responses=True)
+            _fake_server = fakeredis.FakeServer()
+            _client = fakeredis.FakeRedis(server=_fake_server, decode_responses=True)
             _client_scheme = "fakeredis"
             return _client
         if redis and not url.startswith("memory://"):
@@ -65,6 +214,7 @@ def get_client():
                 client.ping()
                 _client = client
                 _client_scheme = "rediss" if url.startswith("rediss://") else "redis"
+                _client_url = url
                 return _client
             except Exception as e:
                 # Common managed Redis setups expose non-TLS ports. If TLS handshake fails,
@@ -76,6 +226,7 @@ def get_client():
                         client.ping()
                         _client = client
                         _client_scheme = "redis"
+                        _client_url = plain_url
                         return _client
                     except Exception:
                         pass
@@ -86,6 +237,231 @@ def get_client():
     return _client
 
 
+class _AsyncMemoryPipeline:
+    """Async face of a _MemoryPipeline: queueing stays sync, execute is awaited."""
+
+    def __init__(self, pipe: _MemoryPipeline):
+        self._pipe = pipe
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._pipe.reset()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._pipe, name)
+        if not self._pipe._immediate:
+            return attr
+
+        async def run(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return run
+
+    async def watch(self, *keys: str) -> None:
+        self._pipe.watch(*keys)
+
+    def multi(self) -> None:
+        self._pipe.multi()
+
+    async def unwatch(self) -> None:
+        self._pipe.unwatch()
+
+    async def reset(self) -> None:
+        self._pipe.reset()
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        return self._pipe.execute(raise_on_error)
+
+
+class AsyncMemoryStore:
+    """`redis.asyncio`-shaped wrapper over the process's MemoryStore (same data)."""
+
+    def __init__(self, store: MemoryStore):
+        self._store = store
+
+    def __getattr__(self, name: str):
+        fn = getattr(self._store, name)
+
+        async def run(*args, **kwargs):
+            return fn(*args, **kwargs)
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> _AsyncMemoryPipeline:
+        return _AsyncMemoryPipeline(self._store.pipeline(transaction))
+
+    async def aclose(self) -> None:
+        return
+
+
+def get_async_client():
+    """Async Redis client for the running event loop, sharing the sync client's target.
+
+    Backed by a `redis.asyncio` connection pool (REDIS_MAX_CONNECTIONS) for
+    redis/rediss, by `FakeAsyncRedis` on the sync client's FakeServer for
+    fakeredis://, and by the sync MemoryStore for memory://, so data written
+    through either client is visible to the other.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is not None:
+        return client
+    sync = get_client()
+    if _client_scheme == "fakeredis":
+        client = fakeredis.FakeAsyncRedis(server=_fake_server, decode_responses=True)
+    elif _client_scheme in ("redis", "rediss") and aioredis is not None:
+        client = aioredis.from_url(_client_url, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS)
+    else:
+        client = AsyncMemoryStore(sync)
+    _async_clients[loop] = client
+    return client
+
+
+async def close_async_client() -> None:
+    """Close the running loop's async client and its connection pool."""
+    try:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    except RuntimeError:
+        return
+    if client is not None:
+        await client.aclose()
+
+
+def _replica_clients() -> List[Any]:
+    """Clients for REDIS_REPLICA_URLS, built on first use.
+
+    Only used with a Redis primary; `fakeredis://` replicas share the
+    primary's FakeServer (tests). memory:// never has replicas.
+    """
+    global _replicas
+    if _replicas is None:
+        get_client()
+        replicas: List[Any] = []
+        for url in REDIS_REPLICA_URLS:
+            if _client_scheme == "fakeredis" and url.startswith("fakeredis://"):
+                replicas.append(fakeredis.FakeRedis(server=_fake_server, decode_responses=True))
+            elif _client_scheme in ("redis", "rediss") and redis is not None:
+                replicas.append(
+                    redis.from_url(
+                        url,
+                        decode_responses=True,
+                        socket_timeout=REDIS_REPLICA_TIMEOUT_SECONDS,
+                        socket_connect_timeout=REDIS_REPLICA_TIMEOUT_SECONDS,
+                    )
+                )
+        _replicas = replicas
+    return _replicas
+
+
+def _pick_replica() -> Optional[Tuple[int, Any]]:
+    """Next healthy replica, round-robin; None when there is none."""
+    replicas = _replica_clients()
+    if not replicas:
+        return None
+    now = time.monotonic()
+    start = next(_replica_turn)
+    for i in range(len(replicas)):
+        idx = (start + i) % len(replicas)
+        if _replica_down_until.get(idx, 0.0) <= now:
+            return idx, replicas[idx]
+    return None
+
+
+class _ReadPipeline:
+    """Queues read commands and runs them as one pipeline through a ReadClient."""
+
+    def __init__(self, reader: "ReadClient"):
+        self._reader = reader
+        self._calls: List[Tuple[str, tuple, dict]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._calls = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        calls, self._calls = self._calls, []
+
+        def run(client: Any) -> list:
+            pipe = client.pipeline(transaction=False)
+            for name, args, kwargs in calls:
+                getattr(pipe, name)(*args, **kwargs)
+            return pipe.execute(raise_on_error)
+
+        return self._reader._run(run)
+
+
+class ReadClient:
+    """Read-only, staleness-tolerant view of the store for one endpoint.
+
+    Commands go to the next healthy replica from REDIS_REPLICA_URLS and fall
+    back to the primary when none is configured or the replica errors; a
+    failed replica is skipped for REDIS_REPLICA_RETRY_SECONDS. Replicas lag
+    the primary, so never use this for read-modify-write (sessions, CAS).
+
+    Metrics: `redis.read.{endpoint}.replica` / `.primary` (which served the
+    read), `.fallback` (replica errors), `redis.replica.errors` and the
+    `redis.read.{endpoint}_ms` timing.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def _run(self, op: Callable[[Any], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            picked = _pick_replica()
+            if picked is not None:
+                idx, replica = picked
+                try:
+                    result = op(replica)
+                    metrics.incr(f"redis.read.{self.endpoint}.replica")
+                    return result
+                except Exception:
+                    _replica_down_until[idx] = time.monotonic() + REDIS_REPLICA_RETRY_SECONDS
+                    metrics.incr("redis.replica.errors")
+                    metrics.incr(f"redis.read.{self.endpoint}.fallback")
+            result = op(get_client())
+            metrics.incr(f"redis.read.{self.endpoint}.primary")
+            return result
+        finally:
+            metrics.observe(f"redis.read.{self.endpoint}_ms", (time.perf_counter() - started) * 1000)
+
+    def __getattr__(self, name: str):
+        attr = getattr(get_client(), name)  # AttributeError (hasattr probes) follow the primary
+        if not callable(attr):
+            return attr
+        if name == "scan_iter":
+            # Materialised so a replica failing mid-scan falls back cleanly.
+            return lambda *args, **kwargs: iter(self._run(lambda client: list(client.scan_iter(*args, **kwargs))))
+
+        def run(*args, **kwargs):
+            return self._run(lambda client: getattr(client, name)(*args, **kwargs))
+
+        return run
+
+    def pipeline(self, transaction: bool = False) -> _ReadPipeline:
+        return _ReadPipeline(self)
+
+
+def get_read_client(endpoint: str) -> ReadClient:
+    """Client for staleness-tolerant reads, labelled `endpoint` in metrics."""
+    reader = _read_clients.get(endpoint)
+    if reader is None:
+        reader = _read_clients[endpoint] = ReadClient(endpoint)
+    return reader
+
+
 def get_json(key: str) -> Optional[Dict[str, Any]]:
     raw = get_client().get(key)
     return json.loads(raw) if raw else None
@@ -110,6 +486,28 @@ def touch_last_seen(user_id: str) -> None:
     get_client().hset(f"user:{user_id}", mapping={"last_seen": now})
 
 
+async def aget_json(key: str) -> Optional[Dict[str, Any]]:
+    raw = await get_async_client().get(key)
+    return json.loads(raw) if raw else None
+
+
+async def aset_json(key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    await get_async_client().set(key, json.dumps(value), ex=ttl)
+
+
+async def ahgetall(key: str) -> Dict[str, Any]:
+    return await get_async_client().hgetall(key)
+
+
+async def ahset(key: str, mapping: Dict[str, Any]) -> None:
+    await get_async_client().hset(key, mapping=mapping)
+
+
+async def atouch_last_seen(user_id: str) -> None:
+    now = dt.datetime.utcnow().isoformat()
+    await get_async_client().hset(f"user:{user_id}", mapping={"last_seen": now})
+
+
 def ensure_indexes() -> None:
     return
 
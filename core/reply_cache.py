@@ -0,0 +1,199 @@
+"""Opt-in reply cache for first-turn chat messages.
+
+Openers like "hi" or "what is step one" get the same answer for every caller
+apart from the name in the system prompt. Replies are stored with the
+caller's name replaced by placeholders under
+``replycache:{policy_version}:{model}:{sha}`` (sha of the normalised message),
+so a policy or model change never serves stale replies. Lookups try the exact
+normalised message first, then cosine similarity against recent entries'
+embeddings above REPLY_CACHE_THRESHOLD.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import metrics
+from core.guardrails import build_caller_context, policy_version
+from core.llm import call as llm_call, get_async_client
+from core.redis_store import get_async_client as get_redis
+
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "0") == "1"
+REPLY_CACHE_TTL = int(os.getenv("REPLY_CACHE_TTL_SECONDS", "86400"))
+REPLY_CACHE_THRESHOLD = float(os.getenv("REPLY_CACHE_THRESHOLD", "0.93"))
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "500"))
+REPLY_CACHE_MAX_CHARS = 160
+EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(os.getenv("REPLY_CACHE_EMBED_DIMS", "256"))
+
+_NAME = "{{name}}"
+_FIRST = "{{first_name}}"
+
+
+def normalize_message(text: str) -> str:
+    s = re.sub(r"[^a-z0-9' ]+", " ", (text or "").lower().replace("’", "'"))
+    return " ".join(s.split())
+
+
+def eligible(
+    session: Dict[str, Any],
+    message: str,
+    profile: Optional[Dict[str, Any]] = None,
+    memory: Optional[Dict[str, Any]] = None,
+    recall_items: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """Only short opening messages whose prompt holds nothing private are cacheable.
+
+    The key is just policy version, model and message, so a reply may only be
+    cached or served when the caller context carries nothing beyond the name
+    (no memory topics, no summary) and the caller has no recall items;
+    otherwise one caller's memory could reach another caller's reply.
+    """
+    return (
+        REPLY_CACHE_ENABLED
+        and not session.get("history")
+        and not session.get("summary")
+        and not recall_items
+        and build_caller_context(profile or {}, memory or {}) == build_caller_context(profile or {}, {})
+        and 0 < len(message or "") <= REPLY_CACHE_MAX_CHARS
+    )
+
+
+def _prefix(model: str) -> str:
+    return f"replycache:{policy_version()}:{model}"
+
+
+def _names(profile: Dict[str, Any]) -> Tuple[str, str]:
+    name = (profile or {}).get("name", "").strip()
+    if name.lower() in ("", "guest", "caller"):
+        return "", ""
+    return name, name.split()[0]
+
+
+def _template(reply: str, profile: Dict[str, Any]) -> Optional[str]:
+    """Reply with the caller's name replaced by placeholders, or None if unsafe.
+
+    Only the full name and the first name in a vocative position ("Hi Will,",
+    ", Will.") are replaced: first names such as Will, Hope or May are also
+    common words. A reply that still contains the first name elsewhere is
+    not cached.
+    """
+    name, first = _names(profile)
+    if name and name != first:
+        reply = reply.replace(name, _NAME)
+    if first and len(first) > 1:
+        vocative = rf"(^|, |\b(?i:hi|hello|hey|thanks|thank you),? ){re.escape(first)}(?=[,.!?])"
+        reply = re.sub(vocative, lambda m: m.group(1) + _FIRST, reply)
+        if re.search(rf"\b{re.escape(first)}\b", reply):
+            return None
+    return reply
+
+
+def _personalise(template: str, profile: Dict[str, Any]) -> str:
+    name, first = _names(profile)
+    if not name and (_NAME in template or _FIRST in template):
+        # Drop the vocative rather than address an anonymous caller by a placeholder
+        template = re.sub(rf",?\s*(?:{re.escape(_NAME)}|{re.escape(_FIRST)})", "", template)
+    return template.replace(_NAME, name).replace(_FIRST, first)
+
+
+def _unit(vec: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+async def _embed(text: str) -> Optional[List[float]]:
+    client = get_async_client()
+    if not client:
+        return None
+    try:
+        resp = await llm_call(
+            "embed", lambda: client.embeddings.create(model=EMBED_MODEL, input=[text], dimensions=EMBED_DIMS)
+        )
+        return _unit(resp.data[0].embedding)
+    except Exception:
+        return None
+
+
+def _record(hit: bool, saved_ms: float = 0.0) -> None:
+    metrics.incr("reply_cache.hits" if hit else "reply_cache.misses")
+    if saved_ms:
+        metrics.incr("reply_cache.latency_saved_ms", saved_ms)
+    hits = metrics.counter("reply_cache.hits")
+    total = hits + metrics.counter("reply_cache.misses")
+    metrics.set_gauge("reply_cache.hit_rate", round(hits / total, 4) if total else 0.0)
+
+
+def _best_match(emb: List[float], index: Dict[str, str]) -> Optional[str]:
+    """sha of the indexed vector most similar to `emb`, if above the threshold."""
+    best_sha, best = None, REPLY_CACHE_THRESHOLD
+    for cand_sha, cand_raw in index.items():
+        try:
+            vec = json.loads(cand_raw)
+        except Exception:
+            continue
+        score = sum(a * b for a, b in zip(emb, vec))
+        if score >= best:
+            best_sha, best = cand_sha, score
+    return best_sha
+
+
+async def lookup(message: str, model: str, profile: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Return (personalised reply or None, probe); pass the probe to `store` on a miss.
+
+    Up to REPLY_CACHE_MAX_ENTRIES vectors are scored in a worker thread.
+    """
+    start = time.perf_counter()
+    norm = normalize_message(message)
+    prefix = _prefix(model)
+    sha = hashlib.sha256(norm.encode("utf-8")).hexdigest()[:24]
+    probe: Dict[str, Any] = {"prefix": prefix, "sha": sha, "norm": norm, "emb": None}
+    r = get_redis()
+
+    raw = await r.get(f"{prefix}:{sha}")
+    kind = "exact"
+    if not raw:
+        kind = "semantic"
+        probe["emb"] = await _embed(norm)
+        if probe["emb"]:
+            index = await r.hgetall(f"{prefix}:index") or {}
+            best_sha = await asyncio.to_thread(_best_match, probe["emb"], index) if index else None
+            if best_sha:
+                raw = await r.get(f"{prefix}:{best_sha}")
+                if not raw:  # entry expired; drop its vector
+                    await r.hdel(f"{prefix}:index", best_sha)
+    metrics.observe("reply_cache.lookup_ms", (time.perf_counter() - start) * 1000)
+    if not raw:
+        _record(False)
+        return None, probe
+    try:
+        entry = json.loads(raw)
+    except Exception:
+        _record(False)
+        return None, probe
+    metrics.incr(f"reply_cache.{kind}_hits")
+    _record(True, float(entry.get("latency_ms") or 0))
+    return _personalise(entry["reply"], profile), probe
+
+
+async def store(probe: Dict[str, Any], reply: str, profile: Dict[str, Any], latency_ms: float) -> None:
+    """Cache a freshly generated reply for the probed message."""
+    prefix, sha = probe["prefix"], probe["sha"]
+    template = _template(reply, profile)
+    if template is None:
+        metrics.incr("reply_cache.skipped_name")
+        return
+    entry = {"reply": template, "norm": probe["norm"], "latency_ms": round(latency_ms, 1)}
+    r = get_redis()
+    index_full = not probe.get("emb") or await r.hlen(f"{prefix}:index") >= REPLY_CACHE_MAX_ENTRIES
+    async with r.pipeline() as pipe:
+        pipe.set(f"{prefix}:{sha}", json.dumps(entry), ex=REPLY_CACHE_TTL)
+        if not index_full:
+            pipe.hset(f"{prefix}:index", mapping={sha: json.dumps([round(x, 5) for x in probe["emb"]])})
+            pipe.expire(f"{prefix}:index", REPLY_CACHE_TTL)
+        await pipe.execute()
@@ -0,0 +1,137 @@
+"""Local classifier deciding whether a chat message needs literature retrieval.
+
+Replaces the old substring trigger list (LEGACY_TRIGGERS), where entries such
+as "step" matched "stepped", "stepdad" or "10000 steps" and sent the turn
+through an embedding call and a literature search it did not need.
+
+The model is logistic regression over hashed sparse features (word
+unigrams, word bigrams and 5-letter word prefixes, crc32 into 2**18 buckets).
+It is trained at startup from the labelled sample file
+`guardrails/retrieval_intent.tsv` in a few milliseconds and scores a message
+in a few microseconds, with no dependencies. Messages scoring at or above
+RETRIEVAL_INTENT_THRESHOLD are retrieved for.
+
+Metrics: `retrieval.intent.retrieve` / `.skip` counters, the
+`retrieval.intent_ms` timing, and `retrieval.avoided`: skipped messages the
+trigger list would have retrieved for. `scripts/eval_retrieval_intent.py`
+reports cross-validated precision and recall against the trigger list.
+"""
+
+import math
+import os
+import random
+import re
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from core import metrics
+
+RETRIEVAL_INTENT_THRESHOLD = float(os.getenv("RETRIEVAL_INTENT_THRESHOLD", "0.5"))
+SAMPLES_PATH = os.path.join(os.path.dirname(__file__), "..", "guardrails", "retrieval_intent.tsv")
+LEGACY_TRIGGERS = ["step ", "step", "sponsor", "literature", "na text", "basic text", "just for today", "swg", "step one", "step 1", "step two", "step 2", "powerless", "higher power", "inventory"]
+
+BUCKETS = 1 << 18
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+_model: Optional["Model"] = None
+
+
+def features(text: str) -> List[int]:
+    """Hashed feature ids for `text` (deduplicated)."""
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    grams = [f"w:{t}" for t in tokens]
+    grams += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    grams += [f"p:{t[:5]}" for t in tokens if len(t) > 5]
+    return list({zlib.crc32(g.encode("utf-8")) % BUCKETS for g in grams})
+
+
+class Model:
+    """Sparse logistic regression; features are binary, scaled by 1/sqrt(count)."""
+
+    def __init__(self, weights: Optional[Dict[int, float]] = None, bias: float = 0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+    def _margin(self, feats: List[int]) -> float:
+        if not feats:
+            return self.bias
+        scale = 1.0 / math.sqrt(len(feats))
+        get = self.weights.get
+        return self.bias + scale * sum(get(f, 0.0) for f in feats)
+
+    def score(self, text: str) -> float:
+        """Probability that `text` needs literature retrieval."""
+        z = self._margin(features(text))
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+
+def load_samples(path: str = SAMPLES_PATH) -> List[Tuple[int, str]]:
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, _, text = line.partition("\t")
+            if label.strip() in ("0", "1") and text.strip():
+                samples.append((int(label), text.strip()))
+    return samples
+
+
+def train(samples: List[Tuple[int, str]], epochs: int = 40, rate: float = 0.5, l2: float = 1e-4, seed: int = 0) -> Model:
+    """Fit by plain SGD on the log loss; deterministic for a given `seed`."""
+    model = Model()
+    data = [(label, features(text)) for label, text in samples]
+    rng = random.Random(seed)
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for label, feats in data:
+            z = model._margin(feats)
+            p = 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+            grad = p - label
+            if feats:
+                step = rate * grad / math.sqrt(len(feats))
+                for f in feats:
+                    w = model.weights.get(f, 0.0)
+                    model.weights[f] = w - step - rate * l2 * w
+            model.bias -= rate * grad
+    return model
+
+
+def evaluate(model: Model, samples: List[Tuple[int, str]], threshold: float = RETRIEVAL_INTENT_THRESHOLD) -> Dict[str, float]:
+    """Precision, recall and F1 of `model` on labelled `samples`."""
+    return _scores([(label, model.score(text) >= threshold) for label, text in samples])
+
+
+def legacy_decision(text: str) -> bool:
+    lower = (text or "").lower()
+    return any(t in lower for t in LEGACY_TRIGGERS)
+
+
+def _scores(pairs: List[Tuple[int, bool]]) -> Dict[str, float]:
+    tp = sum(1 for label, hit in pairs if label and hit)
+    fp = sum(1 for label, hit in pairs if not label and hit)
+    fn = sum(1 for label, hit in pairs if label and not hit)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "tp": tp, "fp": fp, "fn": fn, "tn": len(pairs) - tp - fp - fn}
+
+
+def load_model(path: str = SAMPLES_PATH) -> Model:
+    """Train the process-wide model from the sample file."""
+    global _model
+    _model = train(load_samples(path))
+    return _model
+
+
+def should_retrieve(message: str) -> bool:
+    model = _model or load_model()
+    start = time.perf_counter()
+    hit = model.score(message) >= RETRIEVAL_INTENT_THRESHOLD
+    metrics.observe("retrieval.intent_ms", (time.perf_counter() - start) * 1000)
+    metrics.incr("retrieval.intent.retrieve" if hit else "retrieval.intent.skip")
+    if not hit and legacy_decision(message):
+        metrics.incr("retrieval.avoided")
+    return hit
@@ -0,0 +1,277 @@
+"""Chat session storage in native Redis structures.
+
+A session is a hash at ``session:{id}`` (user_id, mode, timestamps, a small
+JSON ``state`` field for the identity handshake, the running ``msg_count`` and
+any rolling ``summary``) plus a capped list of JSON messages at
+``session:{id}:history``. A turn appends with RPUSH + LTRIM and
+refreshes TTLs with EXPIRE, so its write cost does not grow with history.
+
+Read-modify-write of the session hash (the identity handshake) goes through
+`mutate_session`, which uses WATCH/MULTI on that one session key and
+retries a bounded number of times on conflict. Every write bumps the hash's
+``version`` field so concurrent writers are visible to each other.
+
+Sessions written by older releases are a single JSON blob at
+``session:{id}``; `load_session` migrates those in place on first read.
+
+Functions prefixed with `a` are the same operations on the async client
+(`core.redis_store.get_async_client`) for use from async routes.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core import metrics
+from core.redis_store import WatchError, get_async_client, get_client
+
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+HISTORY_MAX = 50
+CAS_RETRIES = int(os.getenv("SESSION_CAS_RETRIES", "5"))
+
+
+class SessionConflict(Exception):
+    """Raised when a session update keeps losing the race after CAS_RETRIES."""
+
+
+def session_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def history_key(session_id: str) -> str:
+    return f"session:{session_id}:history"
+
+
+def decode_session(data: Dict[str, Any]) -> Dict[str, Any]:
+    session = dict(data)
+    try:
+        session["state"] = json.loads(session.get("state") or "{}")
+    except Exception:
+        session["state"] = {}
+    return session
+
+
+def _queue_create(pipe: Any, session_id: str, fields: Dict[str, Any], ttl: int) -> None:
+    mapping = {k: v for k, v in fields.items() if k != "state"}
+    mapping["state"] = json.dumps(fields.get("state") or {})
+    pipe.delete(session_key(session_id), history_key(session_id))
+    pipe.hset(session_key(session_id), mapping=mapping)
+    pipe.expire(session_key(session_id), ttl)
+
+
+def create_session(session_id: str, fields: Dict[str, Any], ttl: int = SESSION_TTL) -> None:
+    pipe = get_client().pipeline()
+    _queue_create(pipe, session_id, fields, ttl)
+    pipe.execute()
+
+
+async def acreate_session(session_id: str, fields: Dict[str, Any], ttl: int = SESSION_TTL) -> None:
+    pipe = get_async_client().pipeline()
+    _queue_create(pipe, session_id, fields, ttl)
+    await pipe.execute()
+
+
+def load_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Return the session fields with `state` decoded (history not included)."""
+    r = get_client()
+    try:
+        data = r.hgetall(session_key(session_id))
+    except Exception:  # WRONGTYPE: legacy JSON blob
+        data = None
+    if data is None or isinstance(data, str):
+        data = migrate_legacy(session_id)
+    if not data:
+        return None
+    return decode_session(data)
+
+
+async def aload_session(session_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = await get_async_client().hgetall(session_key(session_id))
+    except Exception:  # WRONGTYPE: legacy JSON blob; migrate on the sync path
+        return load_session(session_id)
+    return decode_session(data) if data else None
+
+
+def decode_history(raw: Optional[List[str]]) -> List[Dict[str, Any]]:
+    history: List[Dict[str, Any]] = []
+    for item in raw or []:
+        try:
+            history.append(json.loads(item))
+        except Exception:
+            continue
+    return history
+
+
+def load_history(session_id: str, limit: int = HISTORY_MAX) -> List[Dict[str, Any]]:
+    return decode_history(get_client().lrange(history_key(session_id), -limit, -1))
+
+
+async def aload_history(session_id: str, limit: int = HISTORY_MAX) -> List[Dict[str, Any]]:
+    return decode_history(await get_async_client().lrange(history_key(session_id), -limit, -1))
+
+
+def queue_append(
+    pipe: Any,
+    session_id: str,
+    messages: List[Dict[str, Any]],
+    state: Optional[Dict[str, Any]] = None,
+    ttl: int = SESSION_TTL,
+) -> None:
+    """Queue a history append on `pipe`: RPUSH, LTRIM, msg_count and TTLs.
+
+    Pass `state` to also replace the session's state field. `msg_count`
+    counts every message ever appended, so list entries keep a stable
+    sequence number after older ones are trimmed.
+    """
+    hk = history_key(session_id)
+    pipe.rpush(hk, *[json.dumps(m) for m in messages])
+    pipe.ltrim(hk, -HISTORY_MAX, -1)
+    pipe.hincrby(session_key(session_id), "msg_count", len(messages))
+    pipe.hincrby(session_key(session_id), "version", 1)
+    if state is not None:
+        pipe.hset(session_key(session_id), mapping={"state": json.dumps(state)})
+    pipe.expire(hk, ttl)
+    pipe.expire(session_key(session_id), ttl)
+
+
+def append_history(
+    session_id: str,
+    messages: List[Dict[str, Any]],
+    state: Optional[Dict[str, Any]] = None,
+    ttl: int = SESSION_TTL,
+) -> None:
+    """Append messages, trim to HISTORY_MAX and refresh TTLs in one transaction."""
+    pipe = get_client().pipeline()
+    queue_append(pipe, session_id, messages, state=state, ttl=ttl)
+    pipe.execute()
+
+
+def _queue_update(pipe: Any, session_id: str, fields: Dict[str, Any], ttl: int) -> None:
+    mapping = dict(fields)
+    if "state" in mapping:
+        mapping["state"] = json.dumps(mapping["state"] or {})
+    pipe.hset(session_key(session_id), mapping=mapping)
+    pipe.expire(session_key(session_id), ttl)
+    pipe.expire(history_key(session_id), ttl)
+
+
+def update_session(session_id: str, fields: Dict[str, Any], ttl: int = SESSION_TTL) -> None:
+    """Set session hash fields (`state` is JSON-encoded) and refresh TTLs."""
+    pipe = get_client().pipeline()
+    _queue_update(pipe, session_id, fields, ttl)
+    pipe.execute()
+
+
+async def aupdate_session(session_id: str, fields: Dict[str, Any], ttl: int = SESSION_TTL) -> None:
+    pipe = get_async_client().pipeline()
+    _queue_update(pipe, session_id, fields, ttl)
+    await pipe.execute()
+
+
+def mutate_session(
+    session_id: str,
+    mutate: Callable[[Optional[Dict[str, Any]]], Tuple[Optional[Dict[str, Any]], Any]],
+    ttl: int = SESSION_TTL,
+) -> Any:
+    """Optimistic read-modify-write of one session's hash.
+
+    `mutate` receives the current session (decoded, without history; None if
+    it is gone) and returns `(fields, result)`: fields to write (None for no
+    write) and a value handed back to the caller. If another writer touches
+    the session between the read and the write, `mutate` runs again on fresh
+    data, up to CAS_RETRIES times.
+    """
+    r = get_client()
+    key = session_key(session_id)
+    for _ in range(CAS_RETRIES):
+        with r.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                data = pipe.hgetall(key)
+                fields, result = mutate(decode_session(data) if data else None)
+                if not fields:
+                    pipe.unwatch()
+                    return result
+                _queue_mutation(pipe, session_id, fields, ttl)
+                pipe.execute()
+                return result
+            except WatchError:
+                metrics.incr("session.cas_conflicts")
+                continue
+    metrics.incr("session.cas_exhausted")
+    raise SessionConflict(session_id)
+
+
+def _queue_mutation(pipe: Any, session_id: str, fields: Dict[str, Any], ttl: int) -> None:
+    key = session_key(session_id)
+    mapping = dict(fields)
+    if "state" in mapping:
+        mapping["state"] = json.dumps(mapping["state"] or {})
+    pipe.multi()
+    pipe.hset(key, mapping=mapping)
+    pipe.hincrby(key, "version", 1)
+    pipe.expire(key, ttl)
+    pipe.expire(history_key(session_id), ttl)
+
+
+async def amutate_session(
+    session_id: str,
+    mutate: Callable[[Optional[Dict[str, Any]]], Tuple[Optional[Dict[str, Any]], Any]],
+    ttl: int = SESSION_TTL,
+) -> Any:
+    """`mutate_session` on the async client."""
+    key = session_key(session_id)
+    for _ in range(CAS_RETRIES):
+        async with get_async_client().pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                data = await pipe.hgetall(key)
+                fields, result = mutate(decode_session(data) if data else None)
+                if not fields:
+                    await pipe.unwatch()
+                    return result
+                _queue_mutation(pipe, session_id, fields, ttl)
+                await pipe.execute()
+                return result
+            except WatchError:
+                metrics.incr("session.cas_conflicts")
+                continue
+    metrics.incr("session.cas_exhausted")
+    raise SessionConflict(session_id)
+
+
+def migrate_legacy(session_id: str) -> Optional[Dict[str, Any]]:
+    """Convert a legacy `session:{id}` JSON blob into hash + history list.
+
+    Keeps the remaining TTL of the old key. Returns the raw hash mapping, or
+    None if there is no legacy blob to migrate.
+    """
+    r = get_client()
+    key = session_key(session_id)
+    if r.type(key) != "string":
+        return None
+    raw = r.get(key)
+    try:
+        blob = json.loads(raw) if raw else None
+    except Exception:
+        blob = None
+    if not isinstance(blob, dict):
+        return None
+    ttl = r.ttl(key)
+    ttl = ttl if ttl and ttl > 0 else SESSION_TTL
+    state = dict(blob.get("state") or {})
+    history = state.pop("history", []) or []
+    mapping = {k: str(v) for k, v in blob.items() if k != "state" and v is not None}
+    mapping["state"] = json.dumps(state)
+    mapping["msg_count"] = str(len(history))
+
+    pipe = r.pipeline()
+    pipe.delete(key, history_key(session_id))
+    pipe.hset(key, mapping=mapping)
+    if history:
+        pipe.rpush(history_key(session_id), *[json.dumps(m) for m in history[-HISTORY_MAX:]])
+        pipe.expire(history_key(session_id), ttl)
+    pipe.expire(key, ttl)
+    pipe.execute()
+    return mapping
@@ -0,0 +1,128 @@
+"""Rolling conversation summary that bounds per-turn prompt size.
+
+While a session's history fits in SUMMARY_TOKEN_BUDGET the model sees it
+verbatim. Beyond that, turns older than the last SUMMARY_KEEP_MESSAGES are
+folded into a running summary kept on the session hash (`summary` plus
+`summary_upto`, the sequence number of the first message not yet folded).
+Folding runs as a background task after the response; until it catches up,
+`prompt_window` drops the oldest unfolded messages so the prompt stays
+within budget.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from core import metrics, recall
+from core.llm import call as llm_call, get_async_client, message_content
+from core.redis_store import ahset
+from core.session_store import aload_history, aload_session, session_key
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))
+SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "8"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "1200"))
+OPENAI_SUMMARY_MODEL = os.getenv("OPENAI_SUMMARY_MODEL", os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"))
+
+_folding: set = set()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting.
+    return len(text or "") // 4 + 1
+
+
+def history_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_tokens(m.get("content", "")) + 4 for m in messages)
+
+
+def _unfolded(session: Dict[str, Any], history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Messages in `history` not yet covered by the session's summary."""
+    msg_count = max(int(session.get("msg_count") or 0), len(history))
+    first_seq = msg_count - len(history)
+    upto = int(session.get("summary_upto") or 0)
+    return history[max(0, upto - first_seq):]
+
+
+def prompt_window(session: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+    """Return (verbatim history, summary) to send with this turn."""
+    history = session.get("history", [])
+    summary = session.get("summary") or ""
+    if not summary and history_tokens(history) <= SUMMARY_TOKEN_BUDGET:
+        return history, ""
+    verbatim = _unfolded(session, history)
+    while len(verbatim) > SUMMARY_KEEP_MESSAGES and history_tokens(verbatim) > SUMMARY_TOKEN_BUDGET:
+        verbatim = verbatim[2:]
+    saved = history_tokens(history) - history_tokens(verbatim) - (estimate_tokens(summary) if summary else 0)
+    if saved > 0:
+        metrics.incr("summary.prompt_tokens_saved", saved)
+    return verbatim, summary
+
+
+def fold_due(session: Dict[str, Any], turn: List[Dict[str, Any]]) -> bool:
+    """True when the unfolded history (including `turn`) exceeds the budget."""
+    pending = _unfolded(session, session.get("history", [])) + turn
+    return len(pending) > SUMMARY_KEEP_MESSAGES and history_tokens(pending) > SUMMARY_TOKEN_BUDGET
+
+
+def _fallback_summary(previous: str, messages: List[Dict[str, Any]]) -> str:
+    lines = [previous] if previous else []
+    lines += [f"Caller said: {m.get('content', '')[:80]}" for m in messages if m.get("role") == "user"]
+    return "\n".join(lines)[-SUMMARY_MAX_CHARS:]
+
+
+async def _summarise(previous: str, messages: List[Dict[str, Any]]) -> str:
+    client = get_async_client()
+    if not client:
+        return _fallback_summary(previous, messages)
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content', '')}" for m in messages)
+    prompt = (
+        "Update the running summary of an NA sponsor conversation. Keep facts the sponsor "
+        "needs later: what the caller is working on, feelings, commitments and step progress. "
+        "Use British English, third person, under 150 words. No names beyond the first name.\n\n"
+        f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    try:
+        resp = await llm_call(
+            "summary",
+            lambda: client.chat.completions.create(
+                model=OPENAI_SUMMARY_MODEL, messages=[{"role": "user", "content": prompt}]
+            ),
+            hedge=False,  # background work; no one is waiting on the tail
+        )
+        return (message_content(resp).strip() or previous)[:SUMMARY_MAX_CHARS]
+    except Exception:
+        return _fallback_summary(previous, messages)
+
+
+async def fold_session(session_id: str) -> None:
+    """Fold older unfolded turns of a session into its running summary."""
+    if session_id in _folding:
+        return
+    _folding.add(session_id)
+    start = time.perf_counter()
+    try:
+        session = await aload_session(session_id)
+        if not session:
+            return
+        session["history"] = history = await aload_history(session_id)
+        pending = _unfolded(session, history)
+        if len(pending) <= SUMMARY_KEEP_MESSAGES or history_tokens(pending) <= SUMMARY_TOKEN_BUDGET:
+            return
+        to_fold = pending[:-SUMMARY_KEEP_MESSAGES]
+        msg_count = max(int(session.get("msg_count") or 0), len(history))
+        new_upto = msg_count - SUMMARY_KEEP_MESSAGES
+        summary = await _summarise(session.get("summary") or "", to_fold)
+
+        current = await aload_session(session_id) or {}
+        if int(current.get("summary_upto") or 0) >= new_upto:
+            return  # another worker already folded further
+        await ahset(session_key(session_id), {"summary": summary, "summary_upto": str(new_upto)})
+        if session.get("user_id"):
+            await recall.remember(session["user_id"], "summary", summary, item_id=f"s:{session_id}")
+        metrics.incr("summary.folds")
+        metrics.incr("summary.messages_folded", len(to_fold))
+        metrics.observe("summary.fold_ms", (time.perf_counter() - start) * 1000)
+    except Exception:
+        metrics.incr("summary.errors")
+    finally:
+        _folding.discard(session_id)
@@ -0,0 +1,180 @@
+"""Optional Redis Streams queue for model turns.
+
+With CHAT_QUEUE_MODE=on, `/v2/chat/send` validates and rate-limits the turn,
+answers crisis and handshake messages inline, and queues model turns on the
+`chatq:turns` stream instead of holding the request open for the completion.
+`chat_worker.py` processes consume the stream through the `chat-workers`
+consumer group, so API and LLM capacity scale separately.
+
+Each job has a status hash `chatq:job:{job_id}` (session_id, state,
+result) kept for CHAT_QUEUE_RESULT_TTL_SECONDS. States are queued, running,
+done and failed. Clients long-poll `/v2/chat/result/{job_id}`.
+
+Stream entries are acknowledged only after the result is stored. Entries a
+dead worker left pending longer than CHAT_QUEUE_CLAIM_IDLE_MS are taken over
+with XAUTOCLAIM. An entry delivered CHAT_QUEUE_MAX_DELIVERIES times is marked
+failed rather than retried forever. A redelivered job whose result was
+already stored is only acknowledged.
+
+The API side (`enqueue`, `status`, `wait`) and `process` use the async
+client; only the blocking `read_batch` and `ensure_group` are sync. Needs a
+Redis (or fakeredis) connection; the in-process MemoryStore has no streams.
+"""
+
+import asyncio
+import datetime as dt
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core import metrics
+from core.redis_store import get_async_client, get_client
+
+CHAT_QUEUE_MODE = os.getenv("CHAT_QUEUE_MODE", "off").strip().lower()
+CHAT_QUEUE_STREAM = os.getenv("CHAT_QUEUE_STREAM", "chatq:turns")
+CHAT_QUEUE_GROUP = os.getenv("CHAT_QUEUE_GROUP", "chat-workers")
+CHAT_QUEUE_MAXLEN = int(os.getenv("CHAT_QUEUE_MAXLEN", "10000"))
+CHAT_QUEUE_RESULT_TTL_SECONDS = int(os.getenv("CHAT_QUEUE_RESULT_TTL_SECONDS", "600"))
+CHAT_QUEUE_CLAIM_IDLE_MS = int(os.getenv("CHAT_QUEUE_CLAIM_IDLE_MS", "60000"))
+CHAT_QUEUE_MAX_DELIVERIES = int(os.getenv("CHAT_QUEUE_MAX_DELIVERIES", "3"))
+CHAT_QUEUE_POLL_SECONDS = float(os.getenv("CHAT_QUEUE_POLL_SECONDS", "0.2"))
+
+JobHandler = Callable[[str, str], Awaitable[Dict[str, Any]]]
+
+
+def enabled() -> bool:
+    return CHAT_QUEUE_MODE == "on"
+
+
+def job_key(job_id: str) -> str:
+    return f"chatq:job:{job_id}"
+
+
+async def enqueue(session_id: str, message: str) -> str:
+    """Queue a model turn; returns the job id."""
+    job_id = uuid.uuid4().hex
+    now = dt.datetime.utcnow().isoformat()
+    async with get_async_client().pipeline() as pipe:
+        pipe.hset(job_key(job_id), mapping={"session_id": session_id, "state": "queued", "enqueued_at": now})
+        pipe.expire(job_key(job_id), CHAT_QUEUE_RESULT_TTL_SECONDS)
+        pipe.xadd(
+            CHAT_QUEUE_STREAM,
+            {"job_id": job_id, "session_id": session_id, "message": message, "enqueued_at": str(time.time())},
+            maxlen=CHAT_QUEUE_MAXLEN,
+            approximate=True,
+        )
+        await pipe.execute()
+    metrics.incr("chat_queue.enqueued")
+    return job_id
+
+
+async def status(job_id: str) -> Dict[str, Any]:
+    """Job status hash with `result` decoded; {} when unknown or expired."""
+    job = await get_async_client().hgetall(job_key(job_id)) or {}
+    if job.get("result"):
+        try:
+            job["result"] = json.loads(job["result"])
+        except Exception:
+            job["result"] = None
+    return job
+
+
+async def wait(job_id: str, timeout: float) -> Dict[str, Any]:
+    """Long-poll a job until it is done or failed, or `timeout` passes."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        job = await status(job_id)
+        if not job or job.get("state") in ("done", "failed") or loop.time() >= deadline:
+            return job
+        await asyncio.sleep(CHAT_QUEUE_POLL_SECONDS)
+
+
+def ensure_group() -> None:
+    try:
+        get_client().xgroup_create(CHAT_QUEUE_STREAM, CHAT_QUEUE_GROUP, id="0", mkstream=True)
+    except Exception as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def _finish(entry_id: str, job_id: str, state: str, result: Dict[str, Any]) -> None:
+    async with get_async_client().pipeline() as pipe:
+        pipe.hset(job_key(job_id), mapping={"state": state, "result": json.dumps(result)})
+        pipe.expire(job_key(job_id), CHAT_QUEUE_RESULT_TTL_SECONDS)
+        pipe.xack(CHAT_QUEUE_STREAM, CHAT_QUEUE_GROUP, entry_id)
+        await pipe.execute()
+
+
+async def _deliveries(entry_id: str) -> int:
+    pending = await get_async_client().xpending_range(CHAT_QUEUE_STREAM, CHAT_QUEUE_GROUP, entry_id, entry_id, 1)
+    return int(pending[0]["times_delivered"]) if pending else 1
+
+
+async def process(entry_id: str, fields: Dict[str, Any], handler: JobHandler) -> None:
+    """Run one stream entry through `handler(session_id, message)` and store the result."""
+    job_id = fields.get("job_id", "")
+    r = get_async_client()
+    job = await status(job_id)
+    if job.get("state") in ("done", "failed"):
+        await r.xack(CHAT_QUEUE_STREAM, CHAT_QUEUE_GROUP, entry_id)
+        return
+    if await _deliveries(entry_id) > CHAT_QUEUE_MAX_DELIVERIES:
+        metrics.incr("chat_queue.dead_lettered")
+        await _finish(entry_id, job_id, "failed", {"error": {"code": "TURN_FAILED", "message": "The reply could not be generated"}})
+        return
+    await r.hset(job_key(job_id), mapping={"state": "running"})
+    try:
+        enqueued = float(fields.get("enqueued_at") or 0)
+        if enqueued:
+            metrics.observe("chat_queue.wait_ms", (time.time() - enqueued) * 1000)
+        with metrics.timed("chat_queue.turn_ms"):
+            result = await handler(fields.get("session_id", ""), fields.get("message", ""))
+    except Exception:
+        metrics.incr("chat_queue.errors")
+        return  # left pending; redelivered via XAUTOCLAIM
+    await _finish(entry_id, job_id, "done", result)
+    metrics.incr("chat_queue.completed")
+
+
+def read_batch(consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Stale entries claimed from dead consumers first, then new ones.
+
+    Blocks up to `block_ms` for new entries; 0 returns at once. Sync, so the
+    blocking read runs in a thread (see `run_worker`).
+    """
+    r = get_client()
+    claimed = r.xautoclaim(
+        CHAT_QUEUE_STREAM, CHAT_QUEUE_GROUP, consumer, min_idle_time=CHAT_QUEUE_CLAIM_IDLE_MS, start_id="0-0", count=count
+    )
+    entries = [(eid, f) for eid, f in (claimed[1] if claimed else []) if f]
+    if entries:
+        metrics.incr("chat_queue.reclaimed", len(entries))
+        return entries
+    resp = r.xreadgroup(CHAT_QUEUE_GROUP, consumer, {CHAT_QUEUE_STREAM: ">"}, count=count, block=block_ms or None)
+    return [entry for _stream, batch in (resp or []) for entry in batch]
+
+
+async def run_worker(handler: JobHandler, concurrency: int = 8, block_ms: int = 5000, stop: Optional[asyncio.Event] = None) -> None:
+    """Consume the stream until `stop` is set, running up to `concurrency` turns at once."""
+    ensure_group()
+    consumer = consumer_name()
+    running: set = set()
+    stop = stop or asyncio.Event()
+    while not stop.is_set():
+        running = {task for task in running if not task.done()}
+        if len(running) >= concurrency:
+            _done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        batch = await asyncio.to_thread(read_batch, consumer, concurrency - len(running), block_ms)
+        for entry_id, fields in batch:
+            running.add(asyncio.create_task(process(entry_id, fields, handler)))
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,173 @@
+"""Batched Redis IO for one chat turn.
+
+A normal `/v2/chat/send` turn talks to Redis in three round trips:
+
+1. `load_turn`: rate-limit INCR and EXPIRE NX, session HGETALL and history
+   LRANGE
+2. `load_caller`: profile HGETALL, memory GET and recall HGETALL (needs the
+   session's user_id)
+3. `commit_turn`: history append and session TTLs in one MULTI/EXEC; memory
+   and last_seen join it only when write-behind is off, otherwise they are
+   buffered in `core.write_behind` and flushed after the response
+
+`aload_turn`, `aload_caller` and `acommit_turn` issue the same pipelines on
+the async client, for the async chat routes.
+"""
+
+import datetime as dt
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import recall, usage, write_behind
+from core.redis_store import get_async_client, get_client
+from core.session_store import (
+    HISTORY_MAX,
+    SESSION_TTL,
+    aload_history,
+    aload_session,
+    decode_history,
+    decode_session,
+    history_key,
+    load_history,
+    load_session,
+    queue_append,
+    session_key,
+)
+
+
+def _queue_load(pipe: Any, session_id: str, rate_key: str, limit: int) -> None:
+    pipe.incr(rate_key)
+    pipe.expire(rate_key, 60, nx=True)  # opens the window on its first hit; needs Redis 7
+    pipe.hgetall(session_key(session_id))
+    pipe.lrange(history_key(session_id), -limit, -1)
+
+
+def load_turn(session_id: str, rate_key: str, limit: int = HISTORY_MAX) -> Tuple[int, Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return (rate count, session or None, last `limit` history messages)."""
+    r = get_client()
+    pipe = r.pipeline(transaction=False)
+    _queue_load(pipe, session_id, rate_key, limit)
+    count, _, data, raw_history = pipe.execute(raise_on_error=False)
+    if isinstance(count, Exception):
+        raise count
+
+    if isinstance(data, (Exception, str)):  # legacy JSON blob
+        session = load_session(session_id)
+        return int(count), session, load_history(session_id, limit) if session else []
+    if not data:
+        return int(count), None, []
+    return int(count), decode_session(data), decode_history(raw_history)
+
+
+async def aload_turn(session_id: str, rate_key: str, limit: int = HISTORY_MAX) -> Tuple[int, Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    r = get_async_client()
+    pipe = r.pipeline(transaction=False)
+    _queue_load(pipe, session_id, rate_key, limit)
+    count, _, data, raw_history = await pipe.execute(raise_on_error=False)
+    if isinstance(count, Exception):
+        raise count
+
+    if isinstance(data, (Exception, str)):
+        session = await aload_session(session_id)
+        return int(count), session, await aload_history(session_id, limit) if session else []
+    if not data:
+        return int(count), None, []
+    return int(count), decode_session(data), decode_history(raw_history)
+
+
+def _queue_caller(pipe: Any, user_id: str) -> None:
+    pipe.hgetall(f"user:{user_id}")
+    pipe.get(f"memory:{user_id}")
+    pipe.hgetall(recall.recall_key(user_id))
+
+
+def _decode_caller(user_id: str, profile: Any, raw_memory: Any, raw_recall: Any) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    try:
+        memory = json.loads(raw_memory) if raw_memory else {}
+    except Exception:
+        memory = {}
+    buffered = write_behind.pending_memory(user_id)
+    return profile or {}, memory if buffered is None else buffered, recall.decode_items(raw_recall)
+
+
+def load_caller(user_id: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Profile hash, memory blob and recall items for a user in one round trip."""
+    pipe = get_client().pipeline(transaction=False)
+    _queue_caller(pipe, user_id)
+    return _decode_caller(user_id, *pipe.execute())
+
+
+async def aload_caller(user_id: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    pipe = get_async_client().pipeline(transaction=False)
+    _queue_caller(pipe, user_id)
+    return _decode_caller(user_id, *await pipe.execute())
+
+
+def _queue_commit(
+    pipe: Any,
+    session_id: str,
+    user_id: str,
+    messages: List[Dict[str, Any]],
+    memory: Optional[Dict[str, Any]],
+    state: Optional[Dict[str, Any]],
+    ttl: int,
+    fields: Optional[Dict[str, Any]],
+    now: str,
+    route: Optional[Tuple[str, str]] = None,
+) -> None:
+    queue_append(pipe, session_id, messages, state=state, ttl=ttl)
+    if fields:
+        pipe.hset(session_key(session_id), mapping=fields)
+    if route:
+        usage.queue_route(pipe, *route)
+    if not write_behind.enabled():
+        if memory is not None:
+            pipe.set(f"memory:{user_id}", json.dumps(memory))
+        pipe.hset(f"user:{user_id}", mapping={"last_seen": now})
+
+
+def _buffer_commit(user_id: str, memory: Optional[Dict[str, Any]], now: str) -> None:
+    if write_behind.enabled():
+        if memory is not None:
+            write_behind.put_memory(user_id, memory)
+        write_behind.put_last_seen(user_id, now)
+
+
+def commit_turn(
+    session_id: str,
+    user_id: str,
+    messages: List[Dict[str, Any]],
+    memory: Optional[Dict[str, Any]],
+    state: Optional[Dict[str, Any]] = None,
+    ttl: int = SESSION_TTL,
+    fields: Optional[Dict[str, Any]] = None,
+    route: Optional[Tuple[str, str]] = None,
+) -> None:
+    """Atomically append the turn; write (or buffer) the caller's memory and last_seen.
+
+    `memory=None` leaves the stored memory untouched. `fields` are extra
+    session hash fields set in the same transaction. `route` is the turn's
+    (tier, reason) from `core.model_router`, counted by `usage.queue_route`.
+    """
+    now = dt.datetime.utcnow().isoformat()
+    pipe = get_client().pipeline()
+    _queue_commit(pipe, session_id, user_id, messages, memory, state, ttl, fields, now, route)
+    pipe.execute()
+    _buffer_commit(user_id, memory, now)
+
+
+async def acommit_turn(
+    session_id: str,
+    user_id: str,
+    messages: List[Dict[str, Any]],
+    memory: Optional[Dict[str, Any]],
+    state: Optional[Dict[str, Any]] = None,
+    ttl: int = SESSION_TTL,
+    fields: Optional[Dict[str, Any]] = None,
+    route: Optional[Tuple[str, str]] = None,
+) -> None:
+    now = dt.datetime.utcnow().isoformat()
+    pipe = get_async_client().pipeline()
+    _queue_commit(pipe, session_id, user_id, messages, memory, state, ttl, fields, now, route)
+    await pipe.execute()
+    _buffer_commit(user_id, memory, now)
@@ -0,0 +1,195 @@
+"""Token usage accounting per call, user, session, endpoint and day.
+
+Every provider response that carries a usage block (chat completions,
+streamed completions with `include_usage`, captions, embeddings, summaries)
+is recorded by `arecord` (or `record` from sync code) into Redis hashes
+with one non-transactional HINCRBY pipeline:
+
+- `usage:day:{date}`: fields `{endpoint}:{counter}` and `model:{model}:{counter}`
+- `usage:user:{user_id}:{date}`: fields `{endpoint}:{counter}`
+- `usage:session:{session_id}`: fields `{endpoint}:{counter}`
+
+Counters are `calls`, `prompt_tokens`, `completion_tokens`, `cached_tokens`
+and `latency_ms` (summed; divide by `calls` for the mean). Chat turns also
+count their model tier and routing reason (`queue_route`). Endpoints are the
+`core.llm` call names: chat, captions, embed, summary. Keys expire after
+USAGE_RETENTION_DAYS.
+
+The user and session come from `attribute()`, called when a chat request or
+socket loads its session; it sets a context variable, so embedding and
+summary calls made for that turn (including background tasks) are counted
+against the same caller. Calls outside a chat turn (captions, indexing) only
+count per day.
+"""
+
+import contextvars
+import datetime as dt
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import metrics
+from core.redis_store import get_async_client, get_client
+
+USAGE_ENABLED = os.getenv("USAGE_ENABLED", "1") == "1"
+USAGE_RETENTION_DAYS = int(os.getenv("USAGE_RETENTION_DAYS", "35"))
+
+_scope: "contextvars.ContextVar[Tuple[str, str]]" = contextvars.ContextVar("usage_scope", default=("", ""))
+
+
+def usage_tokens(usage: Any) -> dict:
+    """Prompt, completion and provider-cached prompt tokens from a usage block."""
+    if usage is None:
+        return {"prompt": 0, "completion": 0, "cached": 0}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt": int(getattr(usage, "prompt_tokens", 0) or 0),
+        "completion": int(getattr(usage, "completion_tokens", 0) or 0),
+        "cached": int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+    }
+
+
+def attribute(user_id: str, session_id: str) -> None:
+    """Count provider calls made from here on in this context against a caller."""
+    _scope.set((user_id or "", session_id or ""))
+
+
+def _day(when: Optional[dt.datetime] = None) -> str:
+    return (when or dt.datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def day_key(day: str) -> str:
+    return f"usage:day:{day}"
+
+
+def user_key(user_id: str, day: str) -> str:
+    return f"usage:user:{user_id}:{day}"
+
+
+def session_key(session_id: str) -> str:
+    return f"usage:session:{session_id}"
+
+
+def _increments(endpoint: str, usage: Any, model: str, latency_ms: float) -> List[Tuple[str, str, int]]:
+    """`(key, field, amount)` HINCRBYs for one call, empty when nothing to record."""
+    if not USAGE_ENABLED or usage is None:
+        return []
+    tokens = usage_tokens(usage)
+    counts = {
+        "calls": 1,
+        "prompt_tokens": tokens["prompt"],
+        "completion_tokens": tokens["completion"],
+        "cached_tokens": tokens["cached"],
+        "latency_ms": int(round(latency_ms)),
+    }
+    user_id, session_id = _scope.get()
+    day = _day()
+    targets = [(day_key(day), f"{endpoint}:")]
+    if model:
+        targets.append((day_key(day), f"model:{model}:"))
+    if user_id:
+        targets.append((user_key(user_id, day), f"{endpoint}:"))
+    if session_id:
+        targets.append((session_key(session_id), f"{endpoint}:"))
+    return [(key, prefix + counter, amount) for key, prefix in targets for counter, amount in counts.items() if amount]
+
+
+def queue_route(pipe: Any, tier: str, reason: str) -> None:
+    """Queue counters for one routed chat turn on `pipe` (the turn's commit).
+
+    Fields `route:{tier}:turns` and `route:{tier}:{reason}` on the day, user
+    and session keys.
+    """
+    if not USAGE_ENABLED:
+        return
+    user_id, session_id = _scope.get()
+    day = _day()
+    keys = [day_key(day)] + ([user_key(user_id, day)] if user_id else []) + ([session_key(session_id)] if session_id else [])
+    _queue(pipe, [(key, field, 1) for key in keys for field in (f"route:{tier}:turns", f"route:{tier}:{reason}")])
+
+
+def _queue(pipe: Any, increments: List[Tuple[str, str, int]]) -> None:
+    for key, field, amount in increments:
+        pipe.hincrby(key, field, amount)
+    for key in {key for key, _, _ in increments}:
+        pipe.expire(key, USAGE_RETENTION_DAYS * 86400)
+
+
+def record(endpoint: str, usage: Any, model: str = "", latency_ms: float = 0.0) -> None:
+    """Add one call's usage block to the day, user and session counters.
+
+    Sync client, for `core.llm.call_sync`; async callers use `arecord`.
+    Never raises: accounting must not fail a turn.
+    """
+    increments = _increments(endpoint, usage, model, latency_ms)
+    if not increments:
+        return
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        _queue(pipe, increments)
+        pipe.execute()
+    except Exception:
+        metrics.incr("usage.errors")
+        return
+    metrics.incr("usage.recorded")
+
+
+async def arecord(endpoint: str, usage: Any, model: str = "", latency_ms: float = 0.0) -> None:
+    """`record` on the async client, so the write does not block the event loop."""
+    increments = _increments(endpoint, usage, model, latency_ms)
+    if not increments:
+        return
+    try:
+        async with get_async_client().pipeline(transaction=False) as pipe:
+            _queue(pipe, increments)
+            await pipe.execute()
+    except Exception:
+        metrics.incr("usage.errors")
+        return
+    metrics.incr("usage.recorded")
+
+
+def _nest(raw: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """`{"chat:calls": "3", "model:gpt:calls": "1"}` -> `{"chat": {"calls": 3}, "model:gpt": {...}}`."""
+    out: Dict[str, Dict[str, int]] = {}
+    for field, value in (raw or {}).items():
+        group, _, counter = str(field).rpartition(":")
+        try:
+            out.setdefault(group, {})[counter] = int(value)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def report(days: int = 7, user_id: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Usage for the last `days` days (all traffic, or one user), newest first.
+
+    With `session_id` the session's lifetime totals are returned as well.
+    """
+    today = dt.datetime.utcnow()
+    dates: List[str] = [_day(today - dt.timedelta(days=i)) for i in range(max(1, days))]
+    pipe = get_client().pipeline(transaction=False)
+    for day in dates:
+        pipe.hgetall(user_key(user_id, day) if user_id else day_key(day))
+    if session_id:
+        pipe.hgetall(session_key(session_id))
+    rows = pipe.execute()
+    by_day: Dict[str, Any] = {}
+    totals: Dict[str, Dict[str, int]] = {}
+    for day, raw in zip(dates, rows):
+        groups = _nest(raw)
+        if not groups:
+            continue
+        by_day[day] = groups
+        for group, counters in groups.items():
+            if group.startswith("model:"):
+                continue
+            for counter, value in counters.items():
+                totals.setdefault(group, {}).setdefault(counter, 0)
+                totals[group][counter] += value
+    result: Dict[str, Any] = {"days": by_day, "totals": totals}
+    if user_id:
+        result["user_id"] = user_id
+    if session_id:
+        result["session_id"] = session_id
+        result["session"] = _nest(rows[-1])
+    return result
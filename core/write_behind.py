@@ -0,0 +1,170 @@
+"""Write-behind buffer for per-user writes that do not shape the reply.
+
+Chat turns end by rewriting `memory:{user_id}` and the user's `last_seen`.
+Neither affects what the caller sees, so instead of joining the turn's
+MULTI they are buffered here, coalesced per user (the latest value wins),
+and written in one non-transactional pipeline by `flush()`.
+
+WRITE_BEHIND_MODE picks the durability trade-off:
+
+- `off`: write-through inside the turn commit (no buffering)
+- `after_response` (default): flush as a background task once the response
+  is sent; a crash between response and flush loses at most those writes
+- `interval`: flush every WRITE_BEHIND_INTERVAL_SECONDS; a crash loses up to
+  one interval of memory/last_seen updates, in exchange for fewer round trips
+
+In every mode the buffer is flushed on graceful shutdown, and once it holds
+WRITE_BEHIND_MAX_PENDING users (in the executor when called from the event
+loop, inline from sync code). Reads through `pending_memory` see
+buffered values on this worker.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from core import metrics
+from core.redis_store import get_client
+
+WRITE_BEHIND_MODE = os.getenv("WRITE_BEHIND_MODE", "after_response").strip().lower()
+WRITE_BEHIND_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_INTERVAL_SECONDS", "2"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "500"))
+
+_lock = threading.Lock()
+_pending: Dict[str, Dict[str, Any]] = {}
+_task: Optional["asyncio.Task[None]"] = None
+_overflow_flush = threading.Event()  # set while an overflow flush is scheduled
+
+logger = logging.getLogger("cutter")
+
+
+def enabled() -> bool:
+    return WRITE_BEHIND_MODE in ("after_response", "interval")
+
+
+def _put(user_id: str, field: str, value: Any) -> None:
+    with _lock:
+        entry = _pending.setdefault(user_id, {})
+        if field in entry:
+            metrics.incr("write_behind.coalesced")
+        entry[field] = value
+        size = len(_pending)
+    metrics.set_gauge("write_behind.pending", size)
+    if size >= WRITE_BEHIND_MAX_PENDING and not _overflow_flush.is_set():
+        _overflow_flush.set()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _flush_overflow()  # sync caller, already off the loop
+        else:
+            loop.run_in_executor(None, _flush_overflow)
+
+
+def _flush_overflow() -> None:
+    try:
+        flush()
+    except Exception:
+        pass  # counted in write_behind.errors; the entries stay buffered
+    finally:
+        _overflow_flush.clear()
+
+
+def put_memory(user_id: str, memory: Dict[str, Any]) -> None:
+    _put(user_id, "memory", copy.deepcopy(memory))
+
+
+def put_last_seen(user_id: str, when: str) -> None:
+    _put(user_id, "last_seen", when)
+
+
+def pending_memory(user_id: str) -> Optional[Dict[str, Any]]:
+    """Buffered memory for `user_id` not yet written to Redis, if any."""
+    with _lock:
+        memory = _pending.get(user_id, {}).get("memory")
+    return copy.deepcopy(memory) if memory is not None else None
+
+
+def flush(user_id: Optional[str] = None) -> int:
+    """Write buffered entries (all, or one user's) in one pipeline.
+
+    Returns the number of users written. On a Redis error the entries are
+    put back unless a newer value arrived meanwhile, and the error is raised.
+    """
+    with _lock:
+        if user_id is None:
+            batch = dict(_pending)
+            _pending.clear()
+        else:
+            entry = _pending.pop(user_id, None)
+            batch = {user_id: entry} if entry else {}
+        size = len(_pending)
+    metrics.set_gauge("write_behind.pending", size)
+    if not batch:
+        return 0
+    started = time.perf_counter()
+    pipe = get_client().pipeline(transaction=False)
+    for uid, entry in batch.items():
+        if "memory" in entry:
+            pipe.set(f"memory:{uid}", json.dumps(entry["memory"]))
+        if "last_seen" in entry:
+            pipe.hset(f"user:{uid}", mapping={"last_seen": entry["last_seen"]})
+    try:
+        pipe.execute()
+    except Exception:
+        metrics.incr("write_behind.errors")
+        with _lock:
+            for uid, entry in batch.items():
+                current = _pending.setdefault(uid, {})
+                for field, value in entry.items():
+                    current.setdefault(field, value)
+        raise
+    metrics.observe("write_behind.flush_ms", (time.perf_counter() - started) * 1000)
+    metrics.incr("write_behind.flushed", len(batch))
+    return len(batch)
+
+
+def after_response(background) -> None:
+    """Schedule a flush on a response's BackgroundTasks in `after_response` mode."""
+    if WRITE_BEHIND_MODE == "after_response":
+        background.add_task(flush)
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(WRITE_BEHIND_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(flush)
+        except Exception:
+            pass  # kept in the buffer for the next tick
+
+
+def start() -> None:
+    """Start the periodic flusher (interval mode only)."""
+    global _task
+    if WRITE_BEHIND_MODE == "interval" and _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop() -> None:
+    """Stop the periodic flusher and write out everything still buffered.
+
+    A failed final flush is logged rather than raised, so shutdown goes on to
+    close the Redis and OpenAI clients.
+    """
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    try:
+        await asyncio.to_thread(flush)
+    except Exception:
+        logger.exception("write-behind flush failed at shutdown; %d users' writes lost", len(_pending))
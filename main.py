@@ -35,19 +35,32 @@ def create_app() -> FastAPI:
         max_age=600,
     )
 
-    from core.redis_store import get_client, ensure_indexes
+    from core.redis_store import close_async_client as close_redis, get_client, ensure_indexes
     from core.guardrails import load_policy
+    from core.llm import close_async_client
+    from core import retrieval_intent, write_behind
 
     @app.on_event("startup")
     async def startup() -> None:
         get_client()
         ensure_indexes()
         load_policy()
+        retrieval_intent.load_model()
+        write_behind.start()
+
+    @app.on_event("shutdown")
+    async def shutdown() -> None:
+        try:
+            await write_behind.stop()
+        finally:
+            await close_async_client()
+            await close_redis()
 
     # Include routes
-    from routes import auth, chat, voice, memory, system, admin, lit, av, audio_files
+    from routes import auth, chat, chat_ws, voice, memory, system, admin, lit, av, audio_files
     app.include_router(auth.router)
     app.include_router(chat.router)
+    app.include_router(chat_ws.router)
     app.include_router(voice.router)
     app.include_router(memory.router)
     app.include_router(system.router)
@@ -2,15 +2,20 @@ import os
 import json
 import uuid
 import datetime as dt
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Request
 
-from core.redis_store import get_client
+from core import metrics, usage
+from core.redis_store import get_client, get_read_client
 from core.rate_limit import rate_limit
 from core.auth_utils import (
     normalize_name,
-    hash_passphrase,
+    hash_record,
     verify_passphrase,
     normalize_pass_for_debug,
+    attempt_hash,
+    needs_rehash,
+    parse_params,
 )
 from core.redis_store import get_client_scheme
 from schemas.admin import AdminUserUpsert, AdminVerifyPass
@@ -43,6 +48,28 @@ def health(request: Request):
     return {"admin": "ok", "redis_ok": ok}
 
 
+@router.get("/metrics")
+def get_metrics(request: Request):
+    """Per-process counters, gauges and latency summaries."""
+    rate_limit(request)
+    _require_admin(request)
+    return metrics.snapshot()
+
+
+@router.get("/usage")
+def get_usage(request: Request, days: int = 7, user_id: Optional[str] = None, session_id: Optional[str] = None):
+    """Token usage per endpoint for the last `days` days (max 31).
+
+    All traffic by default (with per-model counters), or one user's with
+    `user_id`; `session_id` adds that session's lifetime totals.
+    """
+    rate_limit(request)
+    _require_admin(request)
+    if not 1 <= days <= 31:
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_RANGE", "message": "days must be between 1 and 31"}})
+    return usage.report(days, user_id=user_id, session_id=session_id)
+
+
 @router.post("/user")
 def upsert_user(body: AdminUserUpsert, request: Request):
     rate_limit(request)
@@ -88,14 +115,15 @@ def upsert_user(body: AdminUserUpsert, request: Request):
 
     verified = None
     if body.passphrase:
-        # Strip accidental surrounding quotes and normalise inside hash_passphrase
+        # Strip accidental surrounding quotes and normalise inside hash_record
         pp = body.passphrase.strip().strip('"').strip("'")
-        salt_hex, hash_hex = hash_passphrase(pp)
-        r.hset(f"user:{user_id}", mapping={"pass_salt": salt_hex, "pass_hash": hash_hex})
+        r.hset(f"user:{user_id}", mapping=hash_record(pp))
         # Round-trip verify to confirm persistence
         try:
             user_after = r.hgetall(f"user:{user_id}")
-            verified = verify_passphrase(user_after.get("pass_salt", ""), user_after.get("pass_hash", ""), pp)
+            verified = verify_passphrase(
+                user_after.get("pass_salt", ""), user_after.get("pass_hash", ""), pp, user_after.get("pass_params")
+            )
         except Exception:
             verified = False
     user_after = r.hgetall(f"user:{user_id}")
@@ -120,7 +148,7 @@ def verify_pass(body: AdminVerifyPass, request: Request):
     phash = user.get("pass_hash", "")
     if not salt or not phash:
         return {"ok": False, "reason": "NO_PASSPHRASE", "user_id": uid}
-    ok = verify_passphrase(salt, phash, body.passphrase)
+    ok = verify_passphrase(salt, phash, body.passphrase, user.get("pass_params"))
     return {"ok": bool(ok), "user_id": uid, **({"reason": "MISMATCH"} if not ok else {})}
 
 
@@ -169,15 +197,12 @@ def debug_pass(body: AdminVerifyPass, request: Request):
     phash = user.get("pass_hash", "")
     has_pp = bool(salt and phash)
     norm = normalize_pass_for_debug(body.passphrase)
-    verified = bool(has_pp and verify_passphrase(salt, phash, body.passphrase))
+    verified = bool(has_pp and verify_passphrase(salt, phash, body.passphrase, user.get("pass_params")))
     # Compute attempt hash with stored salt for prefix comparison (admin only)
     attempt_hex = None
     try:
-        import hashlib
-        sbytes = bytes.fromhex(salt)
-        calc = hashlib.scrypt(norm.encode("utf-8"), salt=sbytes, n=16384, r=8, p=1, dklen=32)
-        attempt_hex = calc.hex()
-        salt_len = len(sbytes)
+        attempt_hex = attempt_hash(salt, body.passphrase, user.get("pass_params"))
+        salt_len = len(bytes.fromhex(salt))
     except Exception:
         attempt_hex = None
         salt_len = None
@@ -190,6 +215,8 @@ def debug_pass(body: AdminVerifyPass, request: Request):
             "attempt_norm_len": len(norm),
             "attempt_norm": norm,
             "verified": verified,
+            "pass_params": parse_params(user.get("pass_params")) if has_pp else None,
+            "needs_rehash": needs_rehash(user.get("pass_params")) if has_pp else None,
             "contains_zero_width_input": contains_zero_width,
             "server_store_scheme": get_client_scheme(),
             "salt_len": salt_len,
@@ -210,12 +237,14 @@ def debug_pass(body: AdminVerifyPass, request: Request):
 PREFIXES = [
     "session:",
     "memory:",
+    "recall:",
     "user:",
     "idcode_to_user:",
     "number_to_user:",
     "name_to_user:",
     "lit:",
     "rate:",
+    "usage:",
 ]
 
 
@@ -250,7 +279,7 @@ def _memory_usage(r, key: str):
 def redis_audit(request: Request, top: int = 20):
     rate_limit(request)
     _require_admin(request)
-    r = get_client()
+    r = get_read_client("admin.audit")  # a full keyspace scan; keep it off the primary
     counts = {p: 0 for p in PREFIXES}
     other = 0
     biggest = []
@@ -344,10 +373,10 @@ def redis_purge_orphan_users(request: Request, days: int = 30):
                     old_enough = True
             if old_enough:
                 if hasattr(r, "unlink"):
-                    r.unlink(f"memory:{uid}")
+                    r.unlink(f"memory:{uid}", f"recall:{uid}")
                     r.unlink(key)
                 else:
-                    r.delete(f"memory:{uid}")
+                    r.delete(f"memory:{uid}", f"recall:{uid}")
                     r.delete(key)
                 deleted += 1
         except Exception:
@@ -10,12 +10,9 @@ from core.redis_store import get_client
 from core.rate_limit import rate_limit
 from routes.admin import _require_admin  # reuse token check
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:
-    OpenAI = None
+from core import admission
+from core.llm import call_sync as llm_call_sync, get_sync_client
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 
 router = APIRouter(prefix="/v2/av")
@@ -34,6 +31,8 @@ def captions(body: Dict[str, Any], request: Request):
       { title: str, duration_seconds: number, keywords?: [str], count?: int }
 
     Requires ADMIN_TOKEN. Caches results in Redis by title+duration.
+    Answers 503 with Retry-After when the `captions` admission pool is
+    saturated, rather than caching fallback captions.
     """
     rate_limit(request)
     _require_admin(request)
@@ -78,13 +77,16 @@ def captions(body: Dict[str, Any], request: Request):
 
     overlays: List[Dict[str, Any]] = []
     # Try OpenAI; fallback to simple slices
-    client = OpenAI(api_key=OPENAI_API_KEY) if (OpenAI and OPENAI_API_KEY) else None
+    client = get_sync_client()
     if client:
         try:
-            resp = client.chat.completions.create(
-                model=OPENAI_CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
+            resp = llm_call_sync(
+                "captions",
+                lambda timeout: client.with_options(timeout=timeout).chat.completions.create(
+                    model=OPENAI_CHAT_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7,
+                ),
             )
             content = (
                 getattr(resp.choices[0].message, "content", None)
@@ -106,6 +108,12 @@ def captions(body: Dict[str, Any], request: Request):
                             overlays.append({"t": float(t), "text": txt[:80]})
                     except Exception:
                         continue
+        except admission.Overloaded as exc:
+            raise HTTPException(
+                status_code=503,
+                detail={"error": {"code": "OVERLOADED", "message": "Caption generation is busy; please retry shortly"}},
+                headers={"Retry-After": str(exc.retry_after)},
+            )
         except Exception:
             overlays = []
 
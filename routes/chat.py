@@ -1,134 +1,520 @@
-import os
-import re
+import json
+import asyncio
+import time
 import datetime as dt
-from fastapi import APIRouter, HTTPException, Request
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:
-    OpenAI = None
-
-from core.redis_store import get_json, set_json, hgetall, touch_last_seen, get_client
-from core.guardrails import build_system_prompt
-from core.lit_index import search as lit_search, build_context as lit_context
-from core.rate_limit import rate_limit
+from core.redis_store import ahgetall, ahset, get_async_client as get_redis
+from core.session_store import HISTORY_MAX, SESSION_TTL, SessionConflict, aload_history, aload_session, amutate_session
+from core.turn_store import aload_turn, aload_caller, acommit_turn
+from core.guardrails import build_static_prompt, build_caller_context, crisis_level, crisis_reply
+from core.lit_index import asearch as lit_search, build_context as lit_context
+from core.llm import call as llm_call, get_async_client, message_content, record_prompt_usage, stream as llm_stream
+from core import admission, idempotency, metrics, model_router, recall, reply_cache, retrieval_intent, turn_queue, usage, write_behind
+from core.rate_limit import arate_limit, enforce, rate_key
+from core.summarizer import prompt_window, fold_due, fold_session
 from schemas.chat import ChatSend
-from core.auth_utils import extract_claimed_name, verify_passphrase
+from core.auth_utils import ahash_record, averify_passphrase, extract_claimed_name, needs_rehash
 
 router = APIRouter(prefix="/v2/chat")
 
-SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 
-client = OpenAI(api_key=OPENAI_API_KEY) if (OpenAI and OPENAI_API_KEY) else None
+def _bad_session() -> HTTPException:
+    return HTTPException(status_code=401, detail={"error": {"code": "BAD_SESSION", "message": "Session not found"}})
 
 
-@router.post("/send")
-async def send(body: ChatSend, request: Request):
-    rate_limit(request)
-    session = get_json(f"session:{body.session_id}")
+def _overloaded(exc: admission.Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={"error": {"code": "OVERLOADED", "message": "The service is busy; please retry shortly"}},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def _mutate(session_id: str, fn) -> dict:
+    try:
+        return await amutate_session(session_id, fn, ttl=SESSION_TTL)
+    except SessionConflict:
+        raise HTTPException(status_code=409, detail={"error": {"code": "SESSION_BUSY", "message": "Session is being updated; please retry"}})
+
+
+async def _load_session(session_id: str, request: Request, limit: int = HISTORY_MAX) -> dict:
+    """Rate-limit the caller and load the session with its history in one round trip."""
+    count, session, history = await aload_turn(session_id, rate_key(request), limit=limit)
+    enforce(count)
     if not session:
-        raise HTTPException(status_code=401, detail={"error": {"code": "BAD_SESSION", "message": "Session not found"}})
-    user_id = session["user_id"]
-    r = get_client()
-    state = session.get("state", {})
-    history = state.get("history", [])
+        raise _bad_session()
+    session["history"] = history
+    usage.attribute(session.get("user_id", ""), session_id)
+    return session
+
+
+async def _crisis_turn(session_id: str, session: dict, message: str, background: BackgroundTasks) -> Optional[dict]:
+    """Zero-LLM safety reply when the message matches the crisis patterns.
 
-    # Lightweight identity handshake: detect name claim and ask for passphrase.
-    text = (body.message or "").strip()
+    Runs ahead of the handshake and all model work, so the caller sees the
+    emergency and helpline numbers at once. The turn is recorded and the
+    session flagged with `crisis`/`crisis_at` in the same transaction.
+    """
+    level = crisis_level(message)
+    if level is None:
+        return None
+    metrics.incr("crisis.fast_path")
+    metrics.incr(f"crisis.{level}")
+    reply = crisis_reply(level)
+    turn = [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+    flag = {"crisis": level, "crisis_at": dt.datetime.utcnow().isoformat()}
+    await acommit_turn(
+        session_id, session["user_id"], turn, None,
+        state={} if session.get("state") else None, ttl=SESSION_TTL, fields=flag,
+    )
+    write_behind.after_response(background)
+    session.update(flag)
+    return {"reply": reply, "memory_delta": {}, "crisis": level}
+
+
+async def _rehash_passphrase(user_id: str, user_hash: Dict[str, Any], passphrase: str) -> None:
+    """Re-store a verified passphrase under the current scrypt parameters.
+
+    Skipped if the stored hash changed meanwhile (an admin reset); a failure
+    leaves the old, still valid record in place.
+    """
+    try:
+        record = await ahash_record(passphrase)
+        if (await ahgetall(f"user:{user_id}")).get("pass_hash") != user_hash.get("pass_hash"):
+            return
+        await ahset(f"user:{user_id}", record)
+        metrics.incr("auth.rehashed")
+    except Exception:
+        metrics.incr("auth.rehash_errors")
+
+
+async def _handshake(session_id: str, session: dict, message: str, background: BackgroundTasks) -> Optional[dict]:
+    """Lightweight identity handshake: detect name claim and ask for passphrase.
+
+    Returns the reply payload when the turn is consumed by the handshake,
+    otherwise None so the caller continues with a normal model turn. State
+    changes are applied with `amutate_session` against the freshest session, so
+    concurrent attempts (double submit, two tabs) cannot lose a `tries` count.
+    The passphrase check runs on the bounded scrypt executor, off the event loop.
+    A hash under outdated scrypt parameters is re-stored on `background`,
+    after the reply, so the login does not wait for a second derivation.
+    """
+    state = session.get("state", {})
+    text = (message or "").strip()
     ident = state.get("identity", {})
     if ident.get("stage") == "await_pass":
         cand_uid = ident.get("candidate_user_id")
-        user_hash = hgetall(f"user:{cand_uid}")
+        user_hash = await ahgetall(f"user:{cand_uid}")
         salt = user_hash.get("pass_salt", "")
         phash = user_hash.get("pass_hash", "")
-        ok = bool(salt and phash and verify_passphrase(salt, phash, text))
-        if ok:
-            session["user_id"] = cand_uid
-            state.pop("identity", None)
-            session["state"] = {**state, "history": history[-50:]}
-            set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
-            profile = hgetall(f"user:{cand_uid}")
-            name = profile.get("name", "there")
-            return {"reply": f"Thanks, {name}. I’ve opened your notes. How can I help today?", "memory_delta": {}}
-        else:
-            tries = int(ident.get("tries", 0)) + 1
+        ok = bool(salt and phash and await averify_passphrase(salt, phash, text, user_hash.get("pass_params")))
+        if ok and needs_rehash(user_hash.get("pass_params")):
+            background.add_task(_rehash_passphrase, cand_uid, user_hash, text)
+
+        def apply(current: Optional[dict]):
+            if current is None:
+                raise _bad_session()
+            cur_state = current.get("state", {})
+            cur_ident = cur_state.get("identity", {})
+            if ok:
+                cur_state.pop("identity", None)
+                name = user_hash.get("name", "there")
+                reply = f"Thanks, {name}. I’ve opened your notes. How can I help today?"
+                return {"user_id": cand_uid, "state": cur_state}, {"reply": reply, "memory_delta": {}}
+            if cur_ident.get("stage") != "await_pass":
+                # A concurrent attempt already ended the handshake.
+                return None, {"reply": "That didn’t match. We can continue as guest for now.", "memory_delta": {}}
+            tries = int(cur_ident.get("tries", 0)) + 1
             if tries >= 3:
-                state.pop("identity", None)
-                session["state"] = {**state, "history": history[-50:]}
-                set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
-                return {"reply": "That didn’t match. We can continue as guest for now.", "memory_delta": {}}
-            else:
-                state.setdefault("identity", {})
-                state["identity"]["tries"] = tries
-                session["state"] = {**state, "history": history[-50:]}
-                set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
-                return {"reply": "That didn’t match. Try again, please.", "memory_delta": {}}
+                cur_state.pop("identity", None)
+                return {"state": cur_state}, {"reply": "That didn’t match. We can continue as guest for now.", "memory_delta": {}}
+            cur_ident["tries"] = tries
+            return {"state": cur_state}, {"reply": "That didn’t match. Try again, please.", "memory_delta": {}}
+
+        return await _mutate(session_id, apply)
 
     claimed = extract_claimed_name(text)
     if claimed:
-        cand_uid = r.get(f"name_to_user:{claimed}")
+        cand_uid = await get_redis().get(f"name_to_user:{claimed}")
         if cand_uid:
-            state["identity"] = {"stage": "await_pass", "candidate_user_id": cand_uid, "tries": 0}
-            session["state"] = {**state, "history": history[-50:]}
-            set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
-            return {"reply": "What’s your passphrase please?", "memory_delta": {}}
-
-    profile = hgetall(f"user:{user_id}")
-    memory = get_json(f"memory:{user_id}") or {}
-
-    # Build system prompt and optional NA literature context for stepwork queries
-    system_prompt = build_system_prompt(profile, memory)
-    lit_snippets = []
-    # Simple heuristic: if user mentions step or sponsor/literature terms, retrieve context
-    lower_msg = (body.message or "").lower()
-    if any(t in lower_msg for t in ["step ", "step", "sponsor", "literature", "na text", "basic text", "just for today", "swg", "step one", "step 1", "step two", "step 2", "powerless", "higher power", "inventory"]):
-        try:
-            lit_snippets = lit_search(body.message, k=3)
-        except Exception:
-            lit_snippets = []
+            def claim(current: Optional[dict]):
+                if current is None:
+                    raise _bad_session()
+                cur_state = current.get("state", {})
+                cur_state["identity"] = {"stage": "await_pass", "candidate_user_id": cand_uid, "tries": 0}
+                return {"state": cur_state}, {"reply": "What’s your passphrase please?", "memory_delta": {}}
+
+            return await _mutate(session_id, claim)
+    return None
+
+
+async def _cached_reply(
+    session: dict, message: str, profile: Dict[str, Any], memory: Dict[str, Any], recall_items: Dict[str, Any]
+) -> Tuple[Optional[str], Optional[dict]]:
+    """Reply-cache lookup for opening messages; (None, None) when not eligible."""
+    if not reply_cache.eligible(session, message, profile, memory, recall_items):
+        return None, None
+    try:
+        return await reply_cache.lookup(message, model_router.cache_model_key(), profile)
+    except Exception:
+        return None, None
+
+
+async def _retrieve(message: str) -> List[Dict[str, Any]]:
+    """Optional NA literature context, when the intent classifier asks for it."""
+    if not retrieval_intent.should_retrieve(message):
+        return []
+    try:
+        return await lit_search(message, k=3)
+    except Exception:
+        return []
+
+
+def _build_messages(
+    session: dict,
+    message: str,
+    profile: Dict[str, Any],
+    memory: Dict[str, Any],
+    lit_snippets: List[Dict[str, Any]],
+    recalled: Optional[List[Dict[str, Any]]] = None,
+) -> Tuple[List[Dict[str, str]], str, Tuple[str, str]]:
+    """Assemble the model messages for a turn and pick the model for it.
+
+    Returns (messages, model, (tier, reason)).
+
+    Layout is chosen for provider prefix caching: the static policy prompt
+    first, then caller context, then history, with per-turn recall and
+    literature context placed just before the new user message.
+    """
+    history, summary = prompt_window(session)
+    messages = [{"role": "system", "content": build_static_prompt()}]
+    caller = build_caller_context(profile, memory, summary)
+    if caller:
+        messages.append({"role": "system", "content": caller})
+    messages += history
+    if recalled:
+        messages.append({"role": "system", "content": recall.context(recalled)})
     if lit_snippets:
-        system_prompt = system_prompt + "\n\nContext:\n" + lit_context(lit_snippets)
+        messages.append({"role": "system", "content": "Context:\n" + lit_context(lit_snippets)})
 
-    reply_text = "This is a test reply."  # fallback
-    if client:
-        messages = [{"role": "system", "content": system_prompt}] + history + [
-            {"role": "user", "content": body.message}
-        ]
-        try:
-            resp = client.chat.completions.create(model=OPENAI_CHAT_MODEL, messages=messages)
-            choice = resp.choices[0]
-            # Support both dict-like and object-like message
-            msg = getattr(choice, "message", None)
-            content = None
-            if msg is not None:
-                content = getattr(msg, "content", None)
-                if content is None and isinstance(msg, dict):
-                    content = msg.get("content")
-            if not content:
-                content = ""
-            reply_text = str(content).strip() or "I’m here. How can I help?"
-        except Exception:
-            reply_text = "Sorry, I had trouble responding."  # graceful fallback
-
-    history.append({"role": "user", "content": body.message})
-    history.append({"role": "assistant", "content": reply_text})
-    session["state"] = {"history": history[-50:]}
-    set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
-
-    memory["last_topics"] = body.message[:50]
+    messages.append({"role": "user", "content": message})
+    depth = max(int(session.get("msg_count") or 0), len(session.get("history", [])))
+    tier, model, reason = model_router.choose(message, bool(lit_snippets), depth, flagged=bool(session.get("crisis")))
+    session["tier"] = tier
+    return messages, model, (tier, reason)
+
+
+async def _stage(name: str, aw):
+    """Await `aw`, recording its wall time as `chat.stage.{name}_ms`."""
+    with metrics.timed(f"chat.stage.{name}_ms"):
+        return await aw
+
+
+async def _prepare_turn(session_id: str, session: dict, message: str, caller: Optional[Tuple[Dict[str, Any], Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Gather everything the model call needs, overlapping independent IO.
+
+    The profile/memory read and the literature embedding + search do not
+    depend on each other, so they run concurrently; the reply-cache lookup
+    and recall scoring follow the profile read while retrieval is still in
+    flight. A cache hit cancels both. Each stage and the whole fan-out are timed under
+    `chat.stage.*` so the critical path can be compared with the sum of the
+    stages. A caller that already holds (profile, memory), like a WebSocket
+    connection, passes it as `caller` to skip the read.
+    """
+    started = time.perf_counter()
+    retrieval = asyncio.create_task(_stage("retrieval", _retrieve(message)))
+    recalling = None
+    try:
+        if caller is None:
+            caller = await _stage("caller", aload_caller(session["user_id"]))
+        profile, memory, recall_items = caller
+        if recall_items:
+            # The current conversation's own summary is already in the prompt.
+            recalling = asyncio.create_task(_stage("recall", recall.recall(recall_items, message, exclude=f"s:{session_id}")))
+        cached, probe = await _stage("cache", _cached_reply(session, message, profile, memory, recall_items))
+        turn = {
+            "profile": profile, "memory": memory, "cached": cached, "cache_probe": probe,
+            "recalled": [], "messages": None, "model": None, "route": None,
+        }
+        if cached is None:
+            lit_snippets = await retrieval
+            turn["recalled"] = await recalling if recalling else []
+            turn["messages"], turn["model"], turn["route"] = _build_messages(session, message, profile, memory, lit_snippets, turn["recalled"])
+    finally:
+        for task in (retrieval, recalling):
+            if task is not None and not task.done():
+                task.cancel()
+    metrics.observe("chat.stage.prepare_ms", (time.perf_counter() - started) * 1000)
+    return turn
+
+
+async def _commit_turn(
+    session_id: str,
+    session: dict,
+    memory: Dict[str, Any],
+    message: str,
+    reply_text: str,
+    background: BackgroundTasks,
+    recalled: Optional[List[Dict[str, Any]]] = None,
+    route: Optional[Tuple[str, str]] = None,
+) -> dict:
+    """Persist a completed model turn to session history and caller memory.
+
+    `route` (tier, reason) is counted in the usage hashes in the same commit.
+
+    Schedules a summary fold on `background` once history outgrows the
+    prompt budget, and the write-behind flush of memory/last_seen, so both
+    run after the response is sent.
+    """
+    user_id = session["user_id"]
+    turn = [{"role": "user", "content": message}, {"role": "assistant", "content": reply_text}]
+    if fold_due(session, turn):
+        background.add_task(fold_session, session_id)
+    # A normal turn ends any half-finished handshake state.
+    memory["last_topics"] = message[:50]
     memory["last_contact"] = dt.datetime.utcnow().isoformat()
-    set_json(f"memory:{user_id}", memory)
-    touch_last_seen(user_id)
+    await acommit_turn(session_id, user_id, turn, memory, state={} if session.get("state") else None, ttl=SESSION_TTL, route=route)
+    write_behind.after_response(background)
+    if recalled:
+        background.add_task(recall.touch, user_id, recalled)
+    return {"last_topics": memory.get("last_topics")}
 
-    return {"reply": reply_text, "memory_delta": {"last_topics": memory.get("last_topics")}}
 
+@router.post("/send")
+async def send(
+    body: ChatSend,
+    request: Request,
+    response: Response,
+    background: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Run one chat turn.
 
-@router.get("/history")
-def history(session_id: str, request: Request):
-    rate_limit(request)
-    session = get_json(f"session:{session_id}")
+    With an `Idempotency-Key` header, repeats of the same request within
+    IDEMPOTENCY_TTL_SECONDS return the first reply instead of running (and
+    recording) the turn again; see `core/idempotency.py`.
+
+    With CHAT_QUEUE_MODE=on, model turns are queued for `chat_worker.py`
+    instead: the reply is 202 with a `job_id`, and the client collects the
+    result from `/v2/chat/result/{job_id}`. Crisis and handshake replies need
+    no model and are still answered inline.
+
+    Inline model turns are admitted through the `chat` pool
+    (`core/admission.py`); when it is saturated the reply is 503 with
+    Retry-After.
+    """
+    session = await _load_session(body.session_id, request)
+    try:
+        result = await _send_or_replay(body, session, background, idempotency_key)
+    except admission.Overloaded as exc:
+        raise _overloaded(exc)
+    if result.get("status") == "queued":
+        response.status_code = 202
+    return result
+
+
+async def _send_or_replay(body: ChatSend, session: dict, background: BackgroundTasks, idempotency_key: Optional[str]) -> Dict[str, Any]:
+    if not idempotency_key:
+        return await _send_turn(body, session, background)
+    if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_IDEMPOTENCY_KEY", "message": "Idempotency-Key is too long"}})
+    try:
+        return await idempotency.run_once(
+            body.session_id, idempotency_key, body.message, lambda: _send_turn(body, session, background)
+        )
+    except idempotency.Mismatch:
+        raise HTTPException(status_code=422, detail={"error": {"code": "IDEMPOTENCY_MISMATCH", "message": "Idempotency-Key was already used for a different message"}})
+    except idempotency.InFlight:
+        raise HTTPException(
+            status_code=409,
+            detail={"error": {"code": "IDEMPOTENCY_IN_FLIGHT", "message": "The original request is still running; please retry"}},
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _send_turn(body: ChatSend, session: dict, background: BackgroundTasks) -> Dict[str, Any]:
+    early = await _crisis_turn(body.session_id, session, body.message, background) or await _handshake(body.session_id, session, body.message, background)
+    if early is not None:
+        return early
+    if turn_queue.enabled():
+        job_id = await turn_queue.enqueue(body.session_id, body.message)
+        return {"status": "queued", "job_id": job_id, "result_url": f"/v2/chat/result/{job_id}?session_id={body.session_id}"}
+    async with admission.admit("chat", admission.priority_for(session)):
+        return await complete_turn(body.session_id, session, body.message, background)
+
+
+async def complete_turn(session_id: str, session: dict, message: str, background: BackgroundTasks) -> Dict[str, Any]:
+    """Model turn for /send: prepare, call the model, commit. Also run by queue workers."""
+    turn = await _prepare_turn(session_id, session, message)
+    profile, memory, cache_probe = turn["profile"], turn["memory"], turn["cache_probe"]
+    reply_text = turn["cached"]
+    if reply_text is None:
+        messages, model = turn["messages"], turn["model"]
+        reply_text = "This is a test reply."  # fallback
+        client = get_async_client()
+        if client:
+            started = time.perf_counter()
+            try:
+                resp = await llm_call(
+                    "chat", lambda: client.chat.completions.create(model=model, messages=messages)
+                )
+                record_prompt_usage("chat", getattr(resp, "usage", None))
+                record_prompt_usage(f"chat.{session['tier']}", getattr(resp, "usage", None))
+                metrics.observe(f"router.{session['tier']}.latency_ms", (time.perf_counter() - started) * 1000)
+                reply_text = message_content(resp).strip() or "I’m here. How can I help?"
+                if cache_probe:
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    background.add_task(reply_cache.store, cache_probe, reply_text, profile, latency_ms)
+            except Exception:
+                reply_text = "Sorry, I had trouble responding."  # graceful fallback
+
+    memory_delta = await _commit_turn(session_id, session, memory, message, reply_text, background, turn["recalled"], turn["route"])
+    return {"reply": reply_text, "memory_delta": memory_delta}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _reply_deltas(session: dict, turn: Dict[str, Any], parts: List[str], background: BackgroundTasks):
+    """Yield reply text as it arrives from the model, collecting it in `parts`.
+
+    Covers cached replies and every fallback, so `"".join(parts)` is always
+    the complete reply once the generator is exhausted.
+    """
+    client = get_async_client()
+    if turn["cached"] is not None:
+        parts.append(turn["cached"])
+        yield turn["cached"]
+        return
+    if not client:
+        parts.append("This is a test reply.")  # fallback
+        yield parts[-1]
+        return
+    started = time.perf_counter()
+    try:
+        chunks = llm_stream(
+            "chat",
+            lambda: client.chat.completions.create(
+                model=turn["model"],
+                messages=turn["messages"],
+                stream=True,
+                stream_options={"include_usage": True},
+            ),
+        )
+        try:
+            async for chunk in chunks:
+                if getattr(chunk, "usage", None):
+                    record_prompt_usage("chat", chunk.usage)
+                    record_prompt_usage(f"chat.{session['tier']}", chunk.usage)
+                    await usage.arecord("chat", chunk.usage, getattr(chunk, "model", "") or turn["model"], (time.perf_counter() - started) * 1000)
+                if not chunk.choices:
+                    continue
+                delta = getattr(chunk.choices[0].delta, "content", None)
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await chunks.aclose()  # settles the breaker when the consumer stops early
+        if turn["cache_probe"] and parts:
+            latency_ms = (time.perf_counter() - started) * 1000
+            background.add_task(reply_cache.store, turn["cache_probe"], "".join(parts).strip(), turn["profile"], latency_ms)
+    except Exception:
+        if not parts:
+            parts.append("Sorry, I had trouble responding.")  # graceful fallback
+            yield parts[-1]
+    if not "".join(parts).strip():
+        parts.append("I’m here. How can I help?")
+        yield parts[-1]
+
+
+@router.post("/stream")
+async def stream(body: ChatSend, request: Request, background: BackgroundTasks):
+    """Streaming variant of /send using Server-Sent Events.
+
+    Emits `delta` events ({"text": ...}) as tokens arrive from the model, then
+    a single `done` event with the same payload /send returns, after the turn
+    has been persisted.
+
+    The `chat` admission slot is held until the stream ends; a saturated
+    pool answers 503 with Retry-After before any event is sent.
+    """
+    session = await _load_session(body.session_id, request)
+    early = await _crisis_turn(body.session_id, session, body.message, background) or await _handshake(body.session_id, session, body.message, background)
+    turn = None
+    release = None
+    if early is None:
+        try:
+            release = await admission.hold("chat", admission.priority_for(session))
+        except admission.Overloaded as exc:
+            raise _overloaded(exc)
+        # Released by the generator; the background task covers a client
+        # that disconnects before the stream starts.
+        background.add_task(release)
+        try:
+            turn = await _prepare_turn(body.session_id, session, body.message)
+        except BaseException:
+            release()
+            raise
+
+    async def events():
+        if early is not None:
+            yield _sse("delta", {"text": early["reply"]})
+            yield _sse("done", early)
+            return
+        try:
+            parts: List[str] = []
+            async for delta in _reply_deltas(session, turn, parts, background):
+                yield _sse("delta", {"text": delta})
+        finally:
+            release()
+        reply_text = "".join(parts).strip()
+        memory_delta = await _commit_turn(body.session_id, session, turn["memory"], body.message, reply_text, background, turn["recalled"], turn["route"])
+        yield _sse("done", {"reply": reply_text, "memory_delta": memory_delta})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background,
+    )
+
+
+async def run_queued_turn(session_id: str, message: str) -> Dict[str, Any]:
+    """Job handler for `chat_worker.py`: one queued model turn, end to end."""
+    session = await aload_session(session_id)
     if not session:
-        raise HTTPException(status_code=401, detail={"error": {"code": "BAD_SESSION", "message": "Session not found"}})
-    return {"history": session.get("state", {}).get("history", [])[-25:]}
+        return {"error": {"code": "BAD_SESSION", "message": "Session not found"}}
+    session["history"] = await aload_history(session_id, HISTORY_MAX)
+    usage.attribute(session.get("user_id", ""), session_id)
+    background = BackgroundTasks()
+    result = await complete_turn(session_id, session, message, background)
+    await background()
+    return result
+
+
+@router.get("/result/{job_id}")
+async def result(job_id: str, session_id: str, request: Request, response: Response, wait: float = 20):
+    """Long-poll a queued turn for up to `wait` seconds (max 30).
+
+    Returns 200 with the /send payload once done, 200 with `error` if the
+    turn failed, or 202 with the current status so the client polls again.
+    """
+    await arate_limit(request)
+    job = await turn_queue.wait(job_id, max(0.0, min(wait, 30.0)))
+    if not job or job.get("session_id") != session_id:
+        raise HTTPException(status_code=404, detail={"error": {"code": "JOB_NOT_FOUND", "message": "Unknown or expired job"}})
+    state = job.get("state")
+    if state in ("done", "failed"):
+        return {"status": state, **(job.get("result") or {})}
+    response.status_code = 202
+    return {"status": state, "job_id": job_id}
+
+
+@router.get("/history")
+async def history(session_id: str, request: Request):
+    session = await _load_session(session_id, request, limit=25)
+    return {"history": session["history"]}
@@ -0,0 +1,227 @@
+"""WebSocket text chat: one connection carries many turns.
+
+`/v2/chat/ws?session_id=...` loads the session, history, profile and memory
+once and keeps them in-process for the life of the connection. Every turn is
+still written through to Redis (`acommit_turn`) before its `done` frame, so a
+client that drops can reconnect with the same session_id and resume from the
+history in the `ready` frame.
+
+Frames are JSON objects:
+
+- client: `{"type": "message", "message": "..."}`
+- server: `{"type": "ready", "session_id": ..., "history": [...]}` on connect,
+  then per turn `{"type": "delta", "text": ...}` frames and one
+  `{"type": "done", "reply": ..., "memory_delta": ...}` (plus `crisis` for
+  a crisis fast-path reply), or
+  `{"type": "error", "code": ..., "message": ...}`
+
+Turns run one at a time per connection. At most WS_MAX_PENDING messages wait
+behind the running turn; further messages are answered with a `BUSY` error
+instead of queueing without bound. A turn that fails unexpectedly (for
+example a Redis error) gets a `TURN_FAILED` error frame and the connection
+keeps serving later messages. Model turns share the `chat` admission
+pool with /send and /stream; a shed turn gets an `OVERLOADED` error frame
+and is not recorded. A client that stops reading for
+WS_SEND_TIMEOUT_SECONDS is disconnected. Each worker accepts at most
+WS_MAX_CONNECTIONS sockets and closes extra ones with code 1013 (try again
+later).
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect
+
+from core import admission, metrics, usage
+from core.rate_limit import arate_limit, enforce, rate_key
+from core.session_store import HISTORY_MAX, aload_history, aload_session
+from core.summarizer import fold_session
+from core.turn_store import aload_caller, aload_turn
+from routes.chat import _commit_turn, _crisis_turn, _handshake, _prepare_turn, _reply_deltas
+
+router = APIRouter(prefix="/v2/chat")
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "200"))
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", "4"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+_open = 0
+
+
+def _error(code: str, message: str) -> Dict[str, Any]:
+    return {"type": "error", "code": code, "message": message}
+
+
+def _http_error(exc: HTTPException) -> Dict[str, Any]:
+    err = (exc.detail or {}).get("error", {}) if isinstance(exc.detail, dict) else {}
+    return _error(err.get("code", "ERROR"), err.get("message", str(exc.detail)))
+
+
+class Connection:
+    """In-process state and turn loop for one socket."""
+
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.ws = websocket
+        self.session_id = session_id
+        self.session: Dict[str, Any] = {}
+        self.caller: Any = None
+        self.inbox: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=WS_MAX_PENDING)
+        self.closed = False
+
+    async def send(self, frame: Dict[str, Any]) -> None:
+        """Send a frame; after a disconnect or slow reader, drop frames silently.
+
+        Turns keep running to completion once the client is gone so the
+        write-through commit still happens.
+        """
+        if self.closed:
+            return
+        try:
+            await asyncio.wait_for(self.ws.send_json(frame), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            metrics.incr("ws.slow_consumer")
+            self.closed = True
+            try:
+                await self.ws.close(code=1013)
+            except Exception:
+                pass
+        except Exception:
+            self.closed = True
+
+    async def _reload(self) -> None:
+        """Re-read session state from Redis (after a handshake changed it)."""
+        session = await aload_session(self.session_id)
+        if not session:
+            raise HTTPException(status_code=401, detail={"error": {"code": "BAD_SESSION", "message": "Session not found"}})
+        session["history"] = await aload_history(self.session_id, HISTORY_MAX)
+        self.session = session
+        usage.attribute(session.get("user_id", ""), self.session_id)
+        self.caller = await aload_caller(session["user_id"])
+
+    async def open(self) -> bool:
+        try:
+            count, session, history = await aload_turn(self.session_id, rate_key(self.ws))
+            enforce(count)
+        except HTTPException as exc:
+            await self.send(_http_error(exc))
+            return False
+        if not session:
+            await self.send(_error("BAD_SESSION", "Session not found"))
+            return False
+        session["history"] = history
+        self.session = session
+        usage.attribute(session.get("user_id", ""), self.session_id)
+        self.caller = await aload_caller(session["user_id"])
+        await self.send({"type": "ready", "session_id": self.session_id, "history": history[-25:]})
+        return True
+
+    async def turn(self, message: str) -> None:
+        background = BackgroundTasks()
+        try:
+            await arate_limit(self.ws)
+            crisis = await _crisis_turn(self.session_id, self.session, message, background)
+            if crisis is not None:
+                self._append(message, crisis["reply"])
+                await self.send({"type": "delta", "text": crisis["reply"]})
+                await self.send({"type": "done", **crisis})
+                await background()
+                return
+            early = await _handshake(self.session_id, self.session, message, background)
+            if early is not None:
+                await self._reload()
+                await self.send({"type": "delta", "text": early["reply"]})
+                await self.send({"type": "done", **early})
+                await background()
+                return
+        except HTTPException as exc:
+            await self.send(_http_error(exc))
+            return
+
+        try:
+            async with admission.admit("chat", admission.priority_for(self.session)):
+                turn = await _prepare_turn(self.session_id, self.session, message, caller=self.caller)
+                parts: list = []
+                async for delta in _reply_deltas(self.session, turn, parts, background):
+                    await self.send({"type": "delta", "text": delta})
+        except admission.Overloaded:
+            await self.send(_error("OVERLOADED", "The service is busy; please retry shortly"))
+            return
+        reply_text = "".join(parts).strip()
+        memory_delta = await _commit_turn(self.session_id, self.session, turn["memory"], message, reply_text, background, turn["recalled"], turn["route"])
+        self._append(message, reply_text)
+        await self.send({"type": "done", "reply": reply_text, "memory_delta": memory_delta})
+        await background()
+        if any(task.func is fold_session for task in background.tasks):
+            fresh = await aload_session(self.session_id) or {}
+            self.session["summary"] = fresh.get("summary", "")
+            self.session["summary_upto"] = fresh.get("summary_upto", 0)
+
+    def _append(self, message: str, reply_text: str) -> None:
+        """Mirror commit_turn's writes on the in-process session."""
+        history = self.session.setdefault("history", [])
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply_text}]
+        del history[:-HISTORY_MAX]
+        self.session["msg_count"] = int(self.session.get("msg_count") or 0) + 2
+        self.session["state"] = {}
+
+    async def work(self) -> None:
+        while True:
+            message = await self.inbox.get()
+            if message is None:
+                return
+            with metrics.timed("ws.turn_ms"):
+                try:
+                    await self.turn(message)
+                except Exception:
+                    # e.g. Redis down mid-turn: report it and keep serving the socket.
+                    metrics.incr("ws.turn_errors")
+                    await self.send(_error("TURN_FAILED", "Sorry, that message could not be processed; please try again"))
+
+    async def read(self) -> None:
+        while not self.closed:
+            try:
+                frame = await self.ws.receive_json()
+            except (WebSocketDisconnect, RuntimeError):
+                # RuntimeError (WebSocketDisconnected): we closed it, e.g. a slow reader.
+                return
+            except (ValueError, KeyError):  # not JSON, or a binary frame
+                await self.send(_error("BAD_FRAME", "Frames must be JSON objects"))
+                continue
+            message = frame.get("message") if isinstance(frame, dict) and frame.get("type") == "message" else None
+            if not isinstance(message, str) or not message.strip():
+                await self.send(_error("BAD_FRAME", "Expected {\"type\": \"message\", \"message\": \"...\"}"))
+                continue
+            try:
+                self.inbox.put_nowait(message)
+            except asyncio.QueueFull:
+                metrics.incr("ws.shed")
+                await self.send(_error("BUSY", "Too many messages in flight; wait for a reply"))
+
+
+@router.websocket("/ws")
+async def chat_ws(websocket: WebSocket, session_id: str):
+    global _open
+    await websocket.accept()
+    if _open >= WS_MAX_CONNECTIONS:
+        metrics.incr("ws.rejected")
+        await websocket.close(code=1013)
+        return
+    _open += 1
+    metrics.set_gauge("ws.connections", _open)
+    conn = Connection(websocket, session_id)
+    try:
+        if not await conn.open():
+            await websocket.close(code=1008)
+            return
+        worker = asyncio.create_task(conn.work())
+        await conn.read()
+        conn.closed = True
+        # Finish (and persist) the running turn; drop messages still queued.
+        while not conn.inbox.empty():
+            conn.inbox.get_nowait()
+        await conn.inbox.put(None)
+        await worker
+    finally:
+        _open -= 1
+        metrics.set_gauge("ws.connections", _open)
@@ -2,7 +2,7 @@ import os
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File
 
 from core.rate_limit import rate_limit
-from core.lit_index import index_dir, list_docs, search
+from core.lit_index import index_dir, list_docs, search, phrase_search
 from routes.admin import _require_admin  # reuse token check
 
 router = APIRouter(prefix="/v2")
@@ -18,8 +18,18 @@ def docs(request: Request):
 
 
 @router.get("/lit/search")
-def lit_search(q: str, k: int = 4, request: Request = None):
+def lit_search(q: str, k: int = 4, mode: str = "ranked", request: Request = None):
+    """Search the NA literature index.
+
+    mode=ranked (default) scores chunks by embeddings or keywords; mode=phrase
+    returns exact occurrences of `q` from the positional index with a
+    ready-made `[ABBREV p.N]` citation per hit.
+    """
     rate_limit(request)
+    if mode == "phrase":
+        return {"mode": "phrase", "results": phrase_search(q, k=k)}
+    if mode != "ranked":
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_MODE", "message": "mode must be 'ranked' or 'phrase'"}})
     return {"results": search(q, k=k)}
 
 
@@ -2,12 +2,11 @@ import os
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
-from core.redis_store import get_json, set_json
+from core.session_store import SESSION_TTL, load_session, update_session
 from core.rate_limit import rate_limit
 
 router = APIRouter(prefix="/v2/chat/voice")
 
-SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
 VOICE_ALLOWED = {v.strip() for v in os.getenv("VOICE_ALLOWED", "alloy,verse,amber,copper").split(",") if v.strip()}
 
 
@@ -21,11 +20,9 @@ def start(body: VoiceStart, request: Request):
     rate_limit(request)
     if body.voice not in VOICE_ALLOWED:
         raise HTTPException(status_code=400, detail={"error": {"code": "BAD_VOICE", "message": "Voice not allowed"}})
-    session = get_json(f"session:{body.session_id}")
-    if not session:
+    if not load_session(body.session_id):
         raise HTTPException(status_code=401, detail={"error": {"code": "BAD_SESSION", "message": "Session not found"}})
-    session["mode"] = "voice"
-    set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
+    update_session(body.session_id, {"mode": "voice"}, ttl=SESSION_TTL)
     return {"token": f"{body.session_id}-voice", "voice": body.voice}
 
 
@@ -36,8 +33,6 @@ class VoiceStop(BaseModel):
 @router.post("/stop")
 def stop(body: VoiceStop, request: Request):
     rate_limit(request)
-    session = get_json(f"session:{body.session_id}")
-    if session:
-        session["mode"] = "text"
-        set_json(f"session:{body.session_id}", session, ttl=SESSION_TTL)
+    if load_session(body.session_id):
+        update_session(body.session_id, {"mode": "text"}, ttl=SESSION_TTL)
     return {"status": "stopped"}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure the per-message cost of the crisis fast-path matcher.
+
+Runs `guardrails.crisis_level` (one compiled regex per level, loaded from
+guardrails/crisis_patterns.txt) over a mix of ordinary and crisis messages
+and reports mean and p99 time per message, next to a naive loop that checks
+each phrase with `in` for comparison (the naive list is faster but only
+catches exact phrasings). The chat path pays this cost on every message
+before any model call.
+
+Usage:
+  python scripts/bench_crisis_match.py --iterations 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+# Ensure local imports work when running from repo root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.guardrails import crisis_level, load_policy  # type: ignore
+
+MESSAGES = [
+    "hi",
+    "Can you help me with step one? I keep thinking about whether I am really powerless.",
+    "I went to a meeting tonight and shared for the first time, it felt good but scary.",
+    "My sponsor says I should write about my resentments but I don't know where to start. " * 4,
+    "I feel like using again and I can't cope any more",
+    "I want to end it all",
+    "I've just taken all my pills",
+    "Just for today I am grateful.",
+]
+NAIVE_TERMS = [
+    "kill myself", "end my life", "end it all", "want to die", "suicide", "suicidal", "overdose",
+    "self harm", "self-harm", "hurt myself", "can't cope", "better off dead", "took all my pills",
+]
+
+
+def naive(text: str) -> bool:
+    lower = text.lower()
+    return any(term in lower for term in NAIVE_TERMS)
+
+
+def bench(fn: Callable[[str], object], iterations: int) -> List[float]:
+    samples = []
+    for i in range(iterations):
+        msg = MESSAGES[i % len(MESSAGES)]
+        start = time.perf_counter_ns()
+        fn(msg)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return samples
+
+
+def report(label: str, samples: List[float]) -> None:
+    ordered = sorted(samples)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(f"{label:<14} mean {statistics.mean(samples):7.2f} µs   p50 {statistics.median(samples):7.2f} µs   p99 {p99:7.2f} µs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    load_policy()
+    for msg in MESSAGES:
+        print(f"{str(crisis_level(msg)):<9} {msg[:60]}")
+    print()
+    bench(crisis_level, 1000)  # warm up
+    report("compiled regex", bench(crisis_level, args.iterations))
+    report("naive `in`", bench(naive, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare chat prompt layouts for provider prefix caching.
+
+"legacy" sends one system message mixing policy, caller details and literature
+context (the pre-change layout). "cached" sends the static policy prompt first,
+caller context second and literature context just before the user message.
+Each layout runs the same simulated callers; the report shows mean latency,
+prompt and cached tokens, and estimated input cost.
+
+Usage:
+  OPENAI_API_KEY=... python scripts/bench_prompt_cache.py --callers 10 --rounds 2
+
+OpenAI only caches prompts of 1024+ tokens, in 128-token steps, so the
+static prefix must reach that size before cached tokens show up.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# Ensure local imports work when running from repo root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from openai import OpenAI  # type: ignore
+
+from core.guardrails import load_policy, build_static_prompt, build_caller_context, build_system_prompt  # type: ignore
+from core.llm import usage_tokens  # type: ignore
+
+NAMES = ["Alice A", "Bob B", "Cara C", "Dev D", "Eli E", "Fay F", "Gus G", "Hana H", "Ivo I", "Jo J"]
+CONTEXT = "Context:\n[BT p.21] We admitted that we were powerless over our addiction, that our lives had become unmanageable."
+
+
+def legacy_messages(name: str, message: str) -> List[Dict[str, str]]:
+    system = build_system_prompt({"name": name}, {"last_topics": "step one"}) + "\n\n" + CONTEXT
+    return [{"role": "system", "content": system}, {"role": "user", "content": message}]
+
+
+def cached_messages(name: str, message: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": build_static_prompt()},
+        {"role": "system", "content": build_caller_context({"name": name}, {"last_topics": "step one"})},
+        {"role": "system", "content": CONTEXT},
+        {"role": "user", "content": message},
+    ]
+
+
+def run(client: OpenAI, model: str, layout, callers: int, rounds: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    prompt = cached = 0
+    for _ in range(rounds):
+        for i in range(callers):
+            name = NAMES[i % len(NAMES)] + str(i)
+            start = time.perf_counter()
+            resp = client.chat.completions.create(
+                model=model, messages=layout(name, "How do I start Step One?"), max_tokens=40
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            tokens = usage_tokens(resp.usage)
+            prompt += tokens["prompt"]
+            cached += tokens["cached"]
+    return {
+        "calls": len(latencies),
+        "mean_ms": statistics.mean(latencies),
+        "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "prompt_tokens": prompt,
+        "cached_tokens": cached,
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Benchmark prompt layouts for prefix caching")
+    p.add_argument("--callers", type=int, default=10)
+    p.add_argument("--rounds", type=int, default=2)
+    p.add_argument("--model", default=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"))
+    p.add_argument("--input-price", type=float, default=0.15, help="USD per 1M uncached input tokens")
+    p.add_argument("--cached-price", type=float, default=0.075, help="USD per 1M cached input tokens")
+    args = p.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY is required.")
+        sys.exit(1)
+    load_policy()
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    print(f"Static prefix: ~{len(build_static_prompt()) // 4} tokens\n")
+    for label, layout in (("legacy", legacy_messages), ("cached", cached_messages)):
+        res = run(client, args.model, layout, args.callers, args.rounds)
+        uncached = res["prompt_tokens"] - res["cached_tokens"]
+        cost = (uncached * args.input_price + res["cached_tokens"] * args.cached_price) / 1_000_000
+        ratio = res["cached_tokens"] / res["prompt_tokens"] if res["prompt_tokens"] else 0.0
+        print(
+            f"{label:<7} calls={res['calls']} mean={res['mean_ms']:.0f}ms p95={res['p95_ms']:.0f}ms "
+            f"prompt={res['prompt_tokens']} cached={res['cached_tokens']} ({ratio:.0%}) input_cost=${cost:.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
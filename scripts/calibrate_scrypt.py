@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Pick scrypt parameters for a target passphrase-verify latency on this host.
+
+Times one verification (the same code path as login) at N = 2**12, 2**13,
+... with the configured r and p, and recommends the largest N whose median
+stays within --target-ms and whose per-call memory (128 * N * r bytes) stays
+within --max-mb. Run it on the instance size you deploy to, then set the
+printed SCRYPT_N in the environment. Stored passphrases keep verifying with
+the parameters they were hashed with and move to the new ones on their next
+successful login.
+
+Usage:
+  python scripts/calibrate_scrypt.py --target-ms 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Ensure local imports work when running from repo root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core import auth_utils  # type: ignore
+
+
+def time_verify(n: int, r: int, p: int, samples: int) -> float:
+    params = {"alg": "scrypt", "n": n, "r": r, "p": p, "dklen": auth_utils.SCRYPT_LEN}
+    salt = os.urandom(16)
+    stored = auth_utils._derive("calibration passphrase", salt, params)
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        auth_utils._verify(salt.hex(), stored, "calibration passphrase", json.dumps(params))
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    pa = argparse.ArgumentParser(description="Calibrate scrypt cost for a target verify latency")
+    pa.add_argument("--target-ms", type=float, default=50.0, help="Median verify latency to stay within")
+    pa.add_argument("--max-mb", type=float, default=64.0, help="Memory ceiling per scrypt call")
+    pa.add_argument("--samples", type=int, default=5, help="Verifications timed per setting")
+    pa.add_argument("--min-log2n", type=int, default=12)
+    pa.add_argument("--max-log2n", type=int, default=20)
+    args = pa.parse_args()
+
+    r, p = auth_utils.SCRYPT_R, auth_utils.SCRYPT_P
+    chosen = None
+    print(f"r={r} p={p} target={args.target_ms:.0f} ms max_mem={args.max_mb:.0f} MB")
+    for log2n in range(args.min_log2n, args.max_log2n + 1):
+        n = 2 ** log2n
+        mem_mb = 128 * n * r / (1 << 20)
+        if mem_mb > args.max_mb:
+            print(f"  N=2**{log2n:<2} {mem_mb:7.0f} MB  over memory ceiling")
+            break
+        ms = time_verify(n, r, p, args.samples)
+        print(f"  N=2**{log2n:<2} {mem_mb:7.0f} MB  {ms:8.1f} ms")
+        if ms > args.target_ms:
+            break
+        chosen = n
+    if chosen is None:
+        print(f"Even N=2**{args.min_log2n} exceeds the target; keep the current SCRYPT_N={auth_utils.SCRYPT_N}")
+        sys.exit(1)
+    print(f"SCRYPT_N={chosen}")
+    if chosen != auth_utils.SCRYPT_N:
+        print(f"(current SCRYPT_N={auth_utils.SCRYPT_N}; existing hashes are upgraded on next login)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Report precision and recall of the retrieval-intent classifier.
+
+Runs k-fold cross-validation over guardrails/retrieval_intent.tsv (train on
+k-1 folds, score the held-out fold) at several thresholds, next to the old
+substring trigger list on the same messages, and times a decision. Use it
+after adding samples or before changing RETRIEVAL_INTENT_THRESHOLD.
+
+Usage:
+  python scripts/eval_retrieval_intent.py --folds 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Ensure local imports work when running from repo root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core import retrieval_intent as ri  # type: ignore
+
+
+def cross_validate(samples: List[Tuple[int, str]], folds: int, thresholds: List[float]) -> Dict[float, Dict[str, float]]:
+    shuffled = list(samples)
+    random.Random(1).shuffle(shuffled)
+    scored: List[Tuple[int, float]] = []
+    for k in range(folds):
+        held = shuffled[k::folds]
+        train = [s for i, s in enumerate(shuffled) if i % folds != k]
+        model = ri.train(train)
+        scored += [(label, model.score(text)) for label, text in held]
+    return {t: ri._scores([(label, p >= t) for label, p in scored]) for t in thresholds}
+
+
+def row(label: str, s: Dict[str, float]) -> str:
+    return (
+        f"{label:<16} precision={s['precision']:.3f} recall={s['recall']:.3f} f1={s['f1']:.3f} "
+        f"(tp={s['tp']} fp={s['fp']} fn={s['fn']} tn={s['tn']})"
+    )
+
+
+def main() -> None:
+    pa = argparse.ArgumentParser(description="Evaluate the retrieval-intent classifier")
+    pa.add_argument("--samples", default=ri.SAMPLES_PATH, help="Labelled TSV file")
+    pa.add_argument("--folds", type=int, default=5)
+    pa.add_argument("--thresholds", default="0.3,0.4,0.5,0.6,0.7")
+    args = pa.parse_args()
+
+    samples = ri.load_samples(args.samples)
+    positives = sum(label for label, _ in samples)
+    print(f"{len(samples)} samples ({positives} retrieve, {len(samples) - positives} skip), {args.folds}-fold CV")
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    for t, s in cross_validate(samples, args.folds, thresholds).items():
+        print(row(f"classifier@{t:.2f}", s))
+    legacy = ri._scores([(label, ri.legacy_decision(text)) for label, text in samples])
+    print(row("trigger list", legacy))
+
+    model = ri.train(samples)
+    texts = [text for _, text in samples]
+    start = time.perf_counter()
+    for _ in range(20):
+        for text in texts:
+            model.score(text)
+    per_us = (time.perf_counter() - start) / (20 * len(texts)) * 1e6
+    train_ms = statistics.median(_time_train(samples) for _ in range(3))
+    print(f"decision: {per_us:.1f} us/message; training: {train_ms:.0f} ms")
+
+
+def _time_train(samples: List[Tuple[int, str]]) -> float:
+    start = time.perf_counter()
+    ri.train(samples)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load test for the chat and auth routes.
+
+Starts --concurrency virtual users, each with its own guest session and
+client address (X-Forwarded-For, so the per-IP rate limit applies per user),
+and has each one issue requests back to back against --endpoint for
+--duration seconds. Reports throughput, p50/p95/p99 latency and status
+counts. Compare runs at the same concurrency (req/s at similar p95) before
+and after a change to the request path.
+
+By default the app runs in-process over ASGI against REDIS_URL (memory://
+if unset) with OPENAI_API_KEY cleared, so model calls take the stub reply
+and the run measures routing, Redis IO and event-loop blocking only. Point
+REDIS_URL at a real Redis for meaningful numbers. With --base-url the
+requests go to a running server instead (raise its RATE_LIMIT_PER_MINUTE).
+
+Usage:
+  python scripts/load_harness.py --endpoint send --concurrency 32 --duration 20
+  python scripts/load_harness.py --base-url http://localhost:8000 --endpoint history
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+# Ensure local imports work when running from repo root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+ENDPOINTS = ("send", "history", "call", "mode")
+
+
+def _request(endpoint: str, session_id: str, user: int) -> Tuple[str, str, Dict[str, Any]]:
+    if endpoint == "send":
+        return "POST", "/v2/chat/send", {"json": {"session_id": session_id, "message": "how are you today"}}
+    if endpoint == "history":
+        return "GET", "/v2/chat/history", {"params": {"session_id": session_id}}
+    if endpoint == "call":
+        return "POST", "/v2/auth/call", {"json": {"number": f"load-{user}"}}
+    return "POST", "/v2/session/mode", {"json": {"session_id": session_id, "mode": "text"}}
+
+
+async def _user(client: httpx.AsyncClient, endpoint: str, user: int, deadline: float, latencies: List[float], statuses: Counter) -> None:
+    headers = {"X-Forwarded-For": f"10.{user // 65536 % 256}.{user // 256 % 256}.{user % 256}"}
+    resp = await client.post("/v2/auth/guest", json={"name": f"Load {user}"}, headers=headers)
+    resp.raise_for_status()
+    session_id = resp.json()["session_id"]
+    method, path, kwargs = _request(endpoint, session_id, user)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            resp = await client.request(method, path, headers=headers, **kwargs)
+            statuses[resp.status_code] += 1
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def _client(base_url: str) -> httpx.AsyncClient:
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, timeout=30)
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000")
+    os.environ["OPENAI_API_KEY"] = ""
+    from main import app  # type: ignore
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=30)
+
+
+async def run(endpoint: str, concurrency: int, duration: float, base_url: str) -> None:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    async with _client(base_url) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[_user(client, endpoint, i, deadline, latencies, statuses) for i in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    if not latencies:
+        print("no requests completed")
+        return
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"endpoint={endpoint} concurrency={concurrency} duration={elapsed:.1f}s target={base_url or 'in-process'}")
+    print(f"  requests={len(latencies)} throughput={len(latencies) / elapsed:.1f} req/s")
+    print(f"  latency p50={cuts[49]:.1f} ms p95={cuts[94]:.1f} ms p99={cuts[98]:.1f} ms max={max(latencies):.1f} ms")
+    print("  status " + " ".join(f"{code}={n}" for code, n in sorted(statuses.items(), key=str)))
+
+
+def main() -> None:
+    pa = argparse.ArgumentParser(description="Closed-loop load test for chat and auth routes")
+    pa.add_argument("--endpoint", choices=ENDPOINTS, default="send")
+    pa.add_argument("--concurrency", type=int, default=16, help="Virtual users issuing requests back to back")
+    pa.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    pa.add_argument("--base-url", default="", help="Target a running server instead of the in-process app")
+    args = pa.parse_args()
+    asyncio.run(run(args.endpoint, args.concurrency, args.duration, args.base_url))
+
+
+if __name__ == "__main__":
+    main()
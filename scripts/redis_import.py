@@ -29,7 +29,7 @@ from typing import Dict, Iterable, Optional
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from core.redis_store import get_client  # type: ignore
-from core.auth_utils import normalize_name, hash_passphrase
+from core.auth_utils import normalize_name, hash_record
 
 IDCODE_RE = re.compile(r"^[A-Za-z0-9-]{4,32}$")
 
@@ -108,8 +108,7 @@ def upsert_user(row: Dict[str, str], overwrite: bool = False) -> str:
         },
     )
     if passphrase:
-        salt_hex, hash_hex = hash_passphrase(passphrase)
-        r.hset(f"user:{user_id}", mapping={"pass_salt": salt_hex, "pass_hash": hash_hex})
+        r.hset(f"user:{user_id}", mapping=hash_record(passphrase))
     return user_id
 
 
@@ -15,6 +15,9 @@ Usage examples:
 
   # Purge memory:* entries whose users don't exist or last_contact older than 60 days
   REDIS_URL=... python scripts/redis_maint.py purge-memory --days 60 --yes
+
+  # Convert legacy JSON session blobs to hash + history list (sessions also migrate lazily on read)
+  REDIS_URL=... python scripts/redis_maint.py migrate-sessions
 """
 
 import argparse
@@ -28,17 +31,20 @@ from typing import Dict, Iterable, List, Optional, Set, Tuple
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from core.redis_store import get_client  # type: ignore
+from core.session_store import migrate_legacy  # type: ignore
 
 
 PREFIXES = [
     "session:",
     "memory:",
+    "recall:",
     "user:",
     "idcode_to_user:",
     "number_to_user:",
     "name_to_user:",
     "lit:",
     "rate:",
+    "usage:",
 ]
 
 
@@ -177,8 +183,9 @@ def purge_orphan_users(days: int, confirm: bool) -> None:
                 except Exception:
                     old_enough = True
             if old_enough:
-                # also remove memory if present
-                r.unlink(f"memory:{uid}") if hasattr(r, "unlink") else r.delete(f"memory:{uid}")
+                # also remove memory and recall items if present
+                for extra in (f"memory:{uid}", f"recall:{uid}"):
+                    r.unlink(extra) if hasattr(r, "unlink") else r.delete(extra)
                 r.unlink(key) if hasattr(r, "unlink") else r.delete(key)
                 deleted += 1
         except Exception:
@@ -222,6 +229,22 @@ def purge_memory(days: int, confirm: bool) -> None:
     print(f"Scanned {scanned} memory entries; deleted {deleted} older than {days} days or without users.")
 
 
+def migrate_sessions() -> None:
+    r = get_client()
+    scanned = 0
+    migrated = 0
+    for key in _scan_keys("session:*"):
+        if key.endswith(":history"):
+            continue
+        scanned += 1
+        try:
+            if r.type(key) == "string" and migrate_legacy(key.split(":", 1)[1]):
+                migrated += 1
+        except Exception:
+            continue
+    print(f"Scanned {scanned} sessions; migrated {migrated} legacy JSON blobs.")
+
+
 def main() -> None:
     p = argparse.ArgumentParser(description="Redis audit and purge tools")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -240,6 +263,8 @@ def main() -> None:
     pm.add_argument("--days", type=int, default=60)
     pm.add_argument("--yes", action="store_true", help="Confirm deletion")
 
+    sub.add_parser("migrate-sessions", help="Convert legacy session:* JSON blobs to hash + history list")
+
     args = p.parse_args()
     if args.cmd == "audit":
         audit(top_n=args.top)
@@ -249,6 +274,8 @@ def main() -> None:
         purge_orphan_users(days=args.days, confirm=args.yes)
     elif args.cmd == "purge-memory":
         purge_memory(days=args.days, confirm=args.yes)
+    elif args.cmd == "migrate-sessions":
+        migrate_sessions()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from core import admission, metrics
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    metrics.reset()
+    admission.reset()
+
+
+def teardown_function() -> None:
+    admission.reset()
+
+
+def _session() -> str:
+    return client.post("/v2/auth/verify-name", json={"number": "61", "name": "Gil G"}).json()["session_id"]
+
+
+def test_waiters_run_in_priority_order_and_full_queue_sheds():
+    lim = admission.Limiter("chat", limit=1, queue_max=3)
+    order = []
+
+    async def worker(name, priority):
+        token = await lim.acquire(priority)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        lim.release(token)
+
+    async def run():
+        await lim.acquire()
+        tasks = [asyncio.create_task(worker("normal", admission.NORMAL))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("crisis", admission.CRISIS)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("late", admission.NORMAL)))
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Overloaded) as shed:
+            await lim.acquire()
+        assert shed.value.reason == "queue_full"
+        lim.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["crisis", "normal", "late"]
+    assert lim.active == 0 and lim.queued == 0
+    snap = metrics.snapshot()
+    assert snap["counters"]["admission.chat.shed.queue_full"] == 1
+    assert snap["counters"]["admission.chat.admitted"] == 4
+
+
+def test_waiter_times_out(monkeypatch):
+    monkeypatch.setattr(admission, "ADMIT_WAIT_SECONDS", 0.05)
+    lim = admission.Limiter("embed", limit=1, queue_max=4)
+
+    async def run():
+        await lim.acquire()
+        with pytest.raises(admission.Overloaded) as shed:
+            await lim.acquire()
+        assert shed.value.reason == "timeout"
+        lim.release()
+
+    asyncio.run(run())
+    assert lim.active == 0 and lim.queued == 0
+
+
+def test_cluster_limit_is_shared_between_processes(monkeypatch):
+    monkeypatch.setattr(admission, "ADMIT_WAIT_SECONDS", 0.1)
+    first = admission.Limiter("chat", limit=4, queue_max=4, cluster_limit=1)
+    second = admission.Limiter("chat", limit=4, queue_max=4, cluster_limit=1)
+
+    async def run():
+        token = await first.acquire()
+        with pytest.raises(admission.Overloaded) as shed:
+            await second.acquire()
+        assert shed.value.reason == "cluster_full"
+        assert await second.acquire(admission.CRISIS) is None  # crisis is not held back
+        second.release()
+        first.release(token)
+        second.release(await second.acquire())
+
+    asyncio.run(run())
+    assert get_client().zcard("admit:chat") == 0
+    assert second.active == 0
+
+
+def test_send_sheds_with_503_and_retry_after(monkeypatch):
+    admission._limiters["chat"] = admission.Limiter("chat", limit=1, queue_max=0)
+
+    async def create(**kwargs):
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    first, second = _session(), _session()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(
+                ac.post("/v2/chat/send", json={"session_id": first, "message": "hello"}),
+                ac.post("/v2/chat/send", json={"session_id": second, "message": "hello"}),
+            )
+
+    resps = asyncio.run(run())
+    assert sorted(r.status_code for r in resps) == [200, 503]
+    shed = next(r for r in resps if r.status_code == 503)
+    assert shed.json()["detail"]["error"]["code"] == "OVERLOADED"
+    assert shed.headers["Retry-After"] == str(admission.ADMIT_RETRY_AFTER_SECONDS)
+    assert metrics.snapshot()["gauges"]["admission.chat.active"] == 0
+
+
+def test_crisis_flagged_session_waits_instead_of_shedding(monkeypatch):
+    admission._limiters["chat"] = admission.Limiter("chat", limit=1, queue_max=0)
+
+    async def create(**kwargs):
+        await asyncio.sleep(0.1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    busy, flagged = _session(), _session()
+    get_client().hset(f"session:{flagged}", mapping={"crisis": "risk"})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(
+                ac.post("/v2/chat/send", json={"session_id": busy, "message": "hello"}),
+                ac.post("/v2/chat/send", json={"session_id": flagged, "message": "hello again"}),
+            )
+
+    resps = asyncio.run(run())
+    assert [r.status_code for r in resps] == [200, 200]
@@ -0,0 +1,105 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+
+import asyncio
+
+from fastapi.testclient import TestClient
+from main import app
+import core.redis_store as redis_store
+import core.rate_limit as rl
+import core.write_behind as write_behind
+from core import metrics, reply_cache, session_store, turn_queue
+
+client = TestClient(app)
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    redis_store.get_client().flushdb()
+
+
+def test_async_client_shares_data_with_sync_client():
+    r = redis_store.get_client()
+    r.hset("user:u1", mapping={"name": "Ann A"})
+
+    async def run():
+        profile = await redis_store.ahgetall("user:u1")
+        await redis_store.aset_json("memory:u1", {"notes": []})
+        await redis_store.atouch_last_seen("u1")
+        return profile
+
+    assert asyncio.run(run()) == {"name": "Ann A"}
+    assert redis_store.get_json("memory:u1") == {"notes": []}
+    assert r.hget("user:u1", "last_seen")
+
+
+def test_memory_store_async_wrapper():
+    store = redis_store.MemoryStore()
+    aclient = redis_store.AsyncMemoryStore(store)
+
+    async def run():
+        await aclient.hset("session:s1", mapping={"user_id": "u1"})
+        async with aclient.pipeline() as pipe:
+            await pipe.watch("session:s1")
+            current = dict(await pipe.hgetall("session:s1"))
+            pipe.multi()
+            pipe.hset("session:s1", mapping={"user_id": "u2"})
+            pipe.hincrby("session:s1", "version", 1)
+            await pipe.execute()
+        return current
+
+    assert asyncio.run(run()) == {"user_id": "u1"}
+    assert store.hgetall("session:s1") == {"user_id": "u2", "version": "1"}
+
+
+def test_async_mutate_retries_on_conflict():
+    session_store.create_session("s1", {"user_id": "u1", "state": {}})
+    metrics.reset()
+    calls = []
+
+    def bump(current):
+        calls.append(current["user_id"])
+        if len(calls) == 1:  # a concurrent writer lands between WATCH and EXEC
+            session_store.update_session("s1", {"user_id": "u3"})
+        return {"mode": "voice"}, len(calls)
+
+    assert asyncio.run(session_store.amutate_session("s1", bump)) == 2
+    assert calls == ["u1", "u3"]
+    assert session_store.load_session("s1")["mode"] == "voice"
+    assert metrics.snapshot()["counters"]["session.cas_conflicts"] == 1
+
+
+def test_chat_request_path_uses_only_the_async_client(monkeypatch):
+    sid = client.post("/v2/auth/verify-name", json={"number": "71", "name": "Bo B"}).json()["session_id"]
+
+    class NoSync:
+        def __getattr__(self, name):
+            raise AssertionError(f"sync Redis call on the request path: {name}")
+
+    monkeypatch.setattr(redis_store, "_client", NoSync())
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_MODE", "interval")  # no after-response flush
+    monkeypatch.setattr(reply_cache, "REPLY_CACHE_ENABLED", True)
+    assert client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}, headers={"Idempotency-Key": "k1"}).status_code == 200
+    assert client.post("/v2/session/mode", json={"session_id": sid, "mode": "voice"}).status_code == 200
+    history = client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]
+    assert [m["role"] for m in history] == ["user", "assistant"]
+    monkeypatch.undo()
+    write_behind.flush()
+    assert session_store.load_session(sid)["mode"] == "voice"
+
+
+def test_queued_turn_polling_uses_only_the_async_client(monkeypatch):
+    sid = client.post("/v2/auth/verify-name", json={"number": "72", "name": "Cy C"}).json()["session_id"]
+
+    class NoSync:
+        def __getattr__(self, name):
+            raise AssertionError(f"sync Redis call on the request path: {name}")
+
+    monkeypatch.setattr(redis_store, "_client", NoSync())
+    monkeypatch.setattr(turn_queue, "CHAT_QUEUE_MODE", "on")
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"})
+    assert resp.status_code == 202
+    poll = client.get(resp.json()["result_url"] + "&wait=0.3")
+    assert poll.status_code == 202 and poll.json()["status"] == "queued"
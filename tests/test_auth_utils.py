@@ -0,0 +1,82 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+
+import asyncio
+
+from fastapi.testclient import TestClient
+from main import app
+from core import auth_utils, metrics
+from core.redis_store import get_client
+
+client = TestClient(app)
+
+
+def test_async_hash_and_verify_round_trip():
+    async def run():
+        salt, phash = await auth_utils.ahash_passphrase("Blue  Skies")
+        return (
+            await auth_utils.averify_passphrase(salt, phash, "blue skies"),
+            await auth_utils.averify_passphrase(salt, phash, "grey skies"),
+            auth_utils.verify_passphrase(salt, phash, " Blue Skies "),
+        )
+
+    assert asyncio.run(run()) == (True, False, True)
+
+
+def test_verification_does_not_block_the_event_loop():
+    salt, phash = auth_utils.hash_passphrase("blue skies")
+    metrics.reset()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*[auth_utils.averify_passphrase(salt, phash, "blue skies") for _ in range(8)])
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(run())
+    assert all(results)
+    assert ticks > 8
+    snap = metrics.snapshot()
+    assert snap["timings"]["scrypt.hash_ms"]["count"] == 8
+    assert snap["timings"]["scrypt.queue_ms"]["count"] == 8
+    assert snap["gauges"]["scrypt.queued"] == 0
+    assert auth_utils._scrypt_executor()._max_workers == auth_utils.SCRYPT_MAX_CONCURRENCY
+
+
+def test_records_carry_their_parameters(monkeypatch):
+    legacy_salt, legacy_hash = auth_utils.hash_passphrase("blue skies")  # no pass_params stored
+    monkeypatch.setattr(auth_utils, "SCRYPT_N", 2 ** 12)
+    record = auth_utils.hash_record("blue skies")
+    assert auth_utils.parse_params(record["pass_params"])["n"] == 2 ** 12
+    assert not auth_utils.needs_rehash(record["pass_params"])
+    assert auth_utils.verify_passphrase(record["pass_salt"], record["pass_hash"], "blue skies", record["pass_params"])
+    # Old records still verify with the parameters they were made with.
+    assert auth_utils.needs_rehash(None)
+    assert auth_utils.verify_passphrase(legacy_salt, legacy_hash, "blue skies")
+
+
+def test_successful_login_rehashes_to_current_parameters(monkeypatch):
+    r = get_client()
+    r.flushdb()
+    salt, phash = auth_utils.hash_passphrase("blue skies")
+    r.hset("user:known", mapping={"name": "Gail G", "pass_salt": salt, "pass_hash": phash})
+    r.set("name_to_user:GAIL G", "known")
+    monkeypatch.setattr(auth_utils, "SCRYPT_N", 2 ** 12)
+    sid = client.post("/v2/auth/verify-name", json={"number": "62", "name": "Hal H"}).json()["session_id"]
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "I'm Gail G"})
+    reply = client.post("/v2/chat/send", json={"session_id": sid, "message": "Blue Skies"}).json()["reply"]
+    assert reply.startswith("Thanks, Gail G")
+    user = r.hgetall("user:known")
+    assert user["pass_hash"] != phash
+    assert auth_utils.parse_params(user["pass_params"])["n"] == 2 ** 12
+    assert auth_utils.verify_passphrase(user["pass_salt"], user["pass_hash"], "blue skies", user["pass_params"])
@@ -0,0 +1,68 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+LLM_DELAY = 0.3
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(LLM_DELAY)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+
+class FakeAsyncOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=FakeCompletions())
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def create_session(n: int) -> str:
+    resp = client.post("/v2/auth/verify-name", json={"number": f"55{n}", "name": f"Caller {n}"})
+    return resp.json()["session_id"]
+
+
+def test_concurrent_sends_overlap(monkeypatch):
+    fake = FakeAsyncOpenAI()
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    n = 5
+    sessions = [create_session(i) for i in range(n)]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            start = time.perf_counter()
+            resps = await asyncio.gather(
+                *[ac.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}) for sid in sessions]
+            )
+            return time.perf_counter() - start, resps
+
+    elapsed, resps = asyncio.run(run())
+    assert all(r.status_code == 200 for r in resps)
+    assert all(r.json()["reply"] == "ok" for r in resps)
+    assert fake.chat.completions.calls == n
+    # Serialised calls would take n * LLM_DELAY; overlapping ones take about one.
+    assert elapsed < LLM_DELAY * 2.5
@@ -0,0 +1,50 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+
+from fastapi.testclient import TestClient
+from main import app
+from core import metrics
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+STAGE_DELAY = 0.3
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    metrics.reset()
+
+
+def test_retrieval_overlaps_caller_reads(monkeypatch):
+    aload_caller = chat.aload_caller
+
+    async def slow_caller(user_id):
+        await asyncio.sleep(STAGE_DELAY)
+        return await aload_caller(user_id)
+
+    async def slow_search(message, k=3):
+        await asyncio.sleep(STAGE_DELAY)
+        return [{"cite": "[BT p.21]", "text": "We admitted that we were powerless."}]
+
+    monkeypatch.setattr(chat, "aload_caller", slow_caller)
+    monkeypatch.setattr(chat, "lit_search", slow_search)
+    monkeypatch.setattr(chat, "get_async_client", lambda: None)
+
+    sid = client.post("/v2/auth/verify-name", json={"number": "7", "name": "Fay F"}).json()["session_id"]
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "help me with step one"})
+    assert resp.status_code == 200
+
+    snap = metrics.snapshot()["timings"]
+    for stage in ("caller", "retrieval", "cache"):
+        assert snap[f"chat.stage.{stage}_ms"]["count"] == 1
+    # Both slow stages ran, but the fan-out took about one of them, not both.
+    assert snap["chat.stage.prepare_ms"]["max_ms"] < 2 * STAGE_DELAY * 1000 * 0.85
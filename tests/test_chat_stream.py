@@ -0,0 +1,71 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from main import app
+from core.redis_store import get_client, get_json
+from core.session_store import load_history
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            raise StopAsyncIteration
+        piece = self.pieces.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        assert kwargs.get("stream") is True
+        return FakeStream(["Call ", "your ", "sponsor."])
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def parse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_forwards_deltas_and_persists(monkeypatch):
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    data = client.post("/v2/auth/verify-name", json={"number": "77", "name": "Bob B"}).json()
+
+    resp = client.post("/v2/chat/stream", json={"session_id": data["session_id"], "message": "I feel shaky"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(resp.text)
+    assert [e for e, _ in events] == ["delta", "delta", "delta", "done"]
+    assert events[-1][1]["reply"] == "Call your sponsor."
+
+    assert load_history(data["session_id"])[-1] == {"role": "assistant", "content": "Call your sponsor."}
+    assert get_json(f"memory:{data['user_id']}")["last_topics"] == "I feel shaky"
+
+
+def test_stream_bad_session():
+    resp = client.post("/v2/chat/stream", json={"session_id": "nope", "message": "hi"})
+    assert resp.status_code == 401
@@ -0,0 +1,174 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from main import app
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+import routes.chat_ws as chat_ws
+
+client = TestClient(app)
+
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            raise StopAsyncIteration
+        text = self.pieces.pop(0)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs["messages"])
+        return FakeStream(["Hello ", "there."])
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def _session() -> str:
+    return client.post("/v2/auth/verify-name", json={"number": "71", "name": "Hal H"}).json()["session_id"]
+
+
+def _turn(ws, message):
+    ws.send_json({"type": "message", "message": message})
+    deltas = []
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == "delta":
+            deltas.append(frame["text"])
+        else:
+            return deltas, frame
+
+
+def test_streams_turns_and_resumes_after_reconnect(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    sid = _session()
+
+    with client.websocket_connect(f"/v2/chat/ws?session_id={sid}") as ws:
+        assert ws.receive_json() == {"type": "ready", "session_id": sid, "history": []}
+        deltas, done = _turn(ws, "hi")
+        assert deltas == ["Hello ", "there."]
+        assert done == {"type": "done", "reply": "Hello there.", "memory_delta": {"last_topics": "hi"}}
+        _turn(ws, "again")
+    # The second prompt saw the first turn from in-process history.
+    assert {"role": "assistant", "content": "Hello there."} in completions.calls[1]
+
+    # Written through to Redis: HTTP history and a new socket both see the turns.
+    assert len(client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]) == 4
+    with client.websocket_connect(f"/v2/chat/ws?session_id={sid}") as ws:
+        assert [m["content"] for m in ws.receive_json()["history"]] == ["hi", "Hello there.", "again", "Hello there."]
+
+
+def test_unknown_session_is_closed():
+    with client.websocket_connect("/v2/chat/ws?session_id=nope") as ws:
+        assert ws.receive_json()["code"] == "BAD_SESSION"
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+
+def test_connection_cap(monkeypatch):
+    monkeypatch.setattr(chat_ws, "WS_MAX_CONNECTIONS", 0)
+    with client.websocket_connect(f"/v2/chat/ws?session_id={_session()}") as ws:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 1013
+
+
+def test_messages_beyond_pending_limit_are_shed(monkeypatch):
+    import asyncio
+
+    class SlowCompletions(FakeCompletions):
+        async def create(self, **kwargs):
+            await asyncio.sleep(0.2)
+            return await super().create(**kwargs)
+
+    completions = SlowCompletions()
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(chat_ws, "WS_MAX_PENDING", 1)
+    with client.websocket_connect(f"/v2/chat/ws?session_id={_session()}") as ws:
+        ws.receive_json()
+        for i in range(4):
+            ws.send_json({"type": "message", "message": f"msg {i}"})
+        frames = []
+        while sum(f["type"] in ("done", "error") for f in frames) < 4:
+            frames.append(ws.receive_json())
+    assert any(f["type"] == "error" and f["code"] == "BUSY" for f in frames)
+    assert len(completions.calls) < 4
+
+
+def test_failed_turn_reports_error_and_socket_keeps_working(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    commit = chat_ws._commit_turn
+    failures = [ConnectionError("redis down")]
+
+    async def flaky_commit(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await commit(*args, **kwargs)
+
+    monkeypatch.setattr(chat_ws, "_commit_turn", flaky_commit)
+    with client.websocket_connect(f"/v2/chat/ws?session_id={_session()}") as ws:
+        ws.receive_json()
+        deltas, frame = _turn(ws, "hi")
+        assert frame["type"] == "error" and frame["code"] == "TURN_FAILED"
+        deltas, done = _turn(ws, "hi again")
+        assert done["type"] == "done" and done["reply"] == "Hello there."
+
+
+def test_slow_reader_is_dropped_and_handler_finishes(monkeypatch):
+    import asyncio
+    from starlette.websockets import WebSocket
+
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(chat_ws, "WS_SEND_TIMEOUT_SECONDS", 0.05)
+    send_json, receive_json = WebSocket.send_json, WebSocket.receive_json
+    receives = []
+
+    async def stalled_send(self, data, mode="text"):
+        if data.get("type") != "ready":
+            await asyncio.sleep(1)  # the client has stopped reading
+        await send_json(self, data, mode)
+
+    async def counted_receive(self, mode="text"):
+        receives.append(1)
+        if len(receives) > 100:  # a spinning read loop; bail out instead of hanging
+            raise asyncio.CancelledError
+        return await receive_json(self, mode)
+
+    monkeypatch.setattr(WebSocket, "send_json", stalled_send)
+    monkeypatch.setattr(WebSocket, "receive_json", counted_receive)
+    with client.websocket_connect(f"/v2/chat/ws?session_id={_session()}") as ws:
+        ws.receive_json()
+        for i in range(5):
+            ws.send_json({"type": "message", "message": f"msg {i}"})
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+        ws.send_json({"type": "message", "message": "still there?"})  # arrives after the server closed
+    assert exc.value.code == 1013
+    assert len(receives) < 100
+    assert chat_ws._open == 0
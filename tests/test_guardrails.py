@@ -11,3 +11,57 @@ def test_guardrails():
     with TestClient(app) as client:
         resp = client.get("/v2/guardrails")
         assert "policy" in resp.json()
+
+
+def test_static_prefix_is_caller_independent():
+    from core.guardrails import load_policy, build_static_prompt, build_caller_context
+
+    load_policy()
+    static = build_static_prompt()
+    assert "The caller is" not in static
+    assert build_caller_context({"name": "Alice A"}, {"last_topics": "step one"}) == (
+        "The caller is Alice A.\nRecent topics: step one."
+    )
+    assert build_static_prompt() == static
+
+
+def test_crisis_levels():
+    from core.guardrails import crisis_level
+
+    assert crisis_level("I want to END IT ALL") == "imminent"
+    assert crisis_level("I've just taken all my pills") == "imminent"
+    assert crisis_level("I keep cutting myself") == "risk"
+    assert crisis_level("Can you help me with step one? I feel powerless.") is None
+    assert crisis_level("that was a killer meeting") is None
+    assert crisis_level("I\u2019m suicidal") == "imminent"
+    assert crisis_level("I'm going to die") == "imminent"
+    assert crisis_level("I od'd last night") == "imminent"
+    assert crisis_level("I can't go on anymore") == "risk"
+    assert crisis_level("I just can't go on.") == "risk"
+    # Third-person, past-tense and figurative mentions are for the model.
+    assert crisis_level("my brother died of an overdose last year, how do I grieve") is None
+    assert crisis_level("we talked about suicide prevention at the meeting") is None
+    assert crisis_level("I'm going to die of embarrassment") is None
+    assert crisis_level("I od on coffee") is None
+    assert crisis_level("I can't go on holiday") is None
+
+
+def test_crisis_message_skips_the_model(monkeypatch):
+    import routes.chat as chat
+    from core.redis_store import get_client
+
+    def no_model():
+        raise AssertionError("crisis replies must not call the model")
+
+    monkeypatch.setenv("EMERGENCY_UK", "999")
+    monkeypatch.setenv("NA_HELPLINE_UK", "0300 000 0000")
+    monkeypatch.setattr(chat, "get_async_client", no_model)
+    client = TestClient(app)
+    sid = client.post("/v2/auth/verify-name", json={"number": "81", "name": "Jo J"}).json()["session_id"]
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "I want to kill myself"})
+    body = resp.json()
+    assert body["crisis"] == "imminent"
+    assert "999" in body["reply"] and "0300 000 0000" in body["reply"]
+    assert get_client().hget(f"session:{sid}", "crisis") == "imminent"
+    history = client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]
+    assert history[-1]["content"] == body["reply"]
@@ -0,0 +1,85 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"reply {self.calls}"))])
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def _session() -> str:
+    return client.post("/v2/auth/verify-name", json={"number": "61", "name": "Gil G"}).json()["session_id"]
+
+
+def _fake(monkeypatch) -> FakeCompletions:
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return completions
+
+
+def test_retry_replays_first_reply(monkeypatch):
+    completions = _fake(monkeypatch)
+    sid = _session()
+    headers = {"Idempotency-Key": "abc-1"}
+    first = client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}, headers=headers)
+    again = client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert first.json() == again.json()
+    assert completions.calls == 1
+    history = client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]
+    assert len(history) == 2
+
+
+def test_concurrent_duplicates_share_one_completion(monkeypatch):
+    completions = _fake(monkeypatch)
+    sid = _session()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(
+                *[
+                    ac.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}, headers={"Idempotency-Key": "dup"})
+                    for _ in range(4)
+                ]
+            )
+
+    resps = asyncio.run(run())
+    assert all(r.status_code == 200 for r in resps)
+    assert {r.json()["reply"] for r in resps} == {"reply 1"}
+    assert completions.calls == 1
+
+
+def test_key_reused_for_other_message_is_rejected(monkeypatch):
+    _fake(monkeypatch)
+    sid = _session()
+    headers = {"Idempotency-Key": "abc-2"}
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}, headers=headers)
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "something else"}, headers=headers)
+    assert resp.status_code == 422
+    assert resp.json()["detail"]["error"]["code"] == "IDEMPOTENCY_MISMATCH"
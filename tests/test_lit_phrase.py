@@ -0,0 +1,87 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import json
+from fastapi.testclient import TestClient
+from main import app
+from core.redis_store import get_client
+from core.lit_index import build_phrase_index
+import core.rate_limit as rl
+
+client = TestClient(app)
+
+
+def seed_chunks():
+    r = get_client()
+    chunks = {
+        "basic-text:0": {"doc_id": "basic-text", "abbrev": "BT", "page": 21, "text": "We admitted that we were powerless over our addiction."},
+        "basic-text:1": {"doc_id": "basic-text", "abbrev": "BT", "page": 22, "text": "We were powerless, and we admitted it only later."},
+        "jft:0": {"doc_id": "jft", "abbrev": "JFT", "page": 3, "text": "Just for today my thoughts will be on my recovery. Just for today I will have faith."},
+    }
+    for cid, c in chunks.items():
+        r.set(f"lit:chunk:{cid}", json.dumps(c))
+    r.set("lit:index:all", json.dumps(list(chunks)))
+    build_phrase_index(list(chunks))
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 100
+    get_client().flushdb()
+    seed_chunks()
+
+
+def test_phrase_search_exact_hits():
+    resp = client.get("/v2/lit/search", params={"q": "we were powerless", "mode": "phrase"})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["cite"] for r in results] == ["[BT p.21]", "[BT p.22]"]
+
+    resp = client.get("/v2/lit/search", params={"q": "Just for Today", "mode": "phrase"})
+    top = resp.json()["results"][0]
+    assert top["cite"] == "[JFT p.3]"
+    assert top["score"] == 2.0
+
+
+def test_phrase_search_no_match_and_rebuild():
+    resp = client.get("/v2/lit/search", params={"q": "powerless we", "mode": "phrase"})
+    assert resp.json()["results"] == []
+    # Rebuilding over fewer chunks drops stale postings
+    build_phrase_index(["jft:0"])
+    resp = client.get("/v2/lit/search", params={"q": "powerless", "mode": "phrase"})
+    assert resp.json()["results"] == []
+
+
+def test_bad_mode():
+    resp = client.get("/v2/lit/search", params={"q": "step", "mode": "fuzzy"})
+    assert resp.status_code == 400
+
+
+def test_phrase_lookup_loads_only_the_rarest_postings(monkeypatch):
+    import core.lit_index as lit_index
+
+    r = get_client()
+    for i in range(20):  # "we" becomes a common term
+        r.set(f"lit:chunk:filler:{i}", json.dumps({"doc_id": "filler", "abbrev": "IP", "page": i, "text": f"we keep coming back {i}"}))
+    ids = json.loads(r.get("lit:index:all")) + [f"filler:{i}" for i in range(20)]
+    monkeypatch.setattr(lit_index, "PHRASE_INDEX_BATCH", 4)  # exercise the batched rebuild
+    build_phrase_index(ids)
+    assert not r.exists("lit:pos:tmp:we")
+
+    loaded = []
+    reader = lit_index.get_read_client("lit.phrase")
+
+    class Spy:
+        def __getattr__(self, name):
+            return getattr(reader, name)
+
+        def hgetall(self, key):
+            loaded.append(key)
+            return reader.hgetall(key)
+
+    monkeypatch.setattr(lit_index, "get_read_client", lambda endpoint: Spy())
+    results = lit_index.phrase_search("we were powerless")
+    assert [x["cite"] for x in results] == ["[BT p.21]", "[BT p.22]"]
+    assert len(loaded) == 1 and loaded[0] != "lit:pos:we"  # "we" is only probed by HMGET
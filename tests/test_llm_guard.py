@@ -0,0 +1,177 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from core import metrics
+from core.redis_store import get_client
+import core.llm as llm
+import core.rate_limit as rl
+import routes.chat as chat
+
+
+def setup_function() -> None:
+    metrics.reset()
+    llm._breakers.clear()
+
+
+def teardown_function() -> None:
+    llm._breakers.clear()
+
+
+def test_deadline_raises_timeout():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.call("t_deadline", slow, deadline=0.05))
+    assert metrics.counter("llm.t_deadline.timeouts") == 1
+
+
+def test_hedge_takes_faster_second_request(monkeypatch):
+    monkeypatch.setattr(llm, "HEDGE_MIN_MS", 10)
+    for _ in range(llm.HEDGE_MIN_SAMPLES):
+        metrics.observe("llm.t_hedge.latency_ms", 20)
+    calls = []
+
+    async def make_call():
+        calls.append(1)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.perf_counter()
+    assert asyncio.run(llm.call("t_hedge", make_call)) == 2
+    assert time.perf_counter() - start < 0.5
+    assert metrics.counter("llm.t_hedge.hedge_wins") == 1
+
+
+def test_breaker_opens_then_probes(monkeypatch):
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise RuntimeError("brownout")
+
+    for _ in range(llm.BREAKER_FAILURES):
+        with pytest.raises(RuntimeError):
+            asyncio.run(llm.call("t_breaker", failing, hedge=False))
+    with pytest.raises(llm.CircuitOpen):
+        asyncio.run(llm.call("t_breaker", failing, hedge=False))
+    assert len(calls) == llm.BREAKER_FAILURES
+    assert metrics.snapshot()["gauges"]["llm.t_breaker.breaker"] == llm.CircuitBreaker.OPEN
+
+    guard = llm.breaker("t_breaker")
+    monkeypatch.setattr(guard, "opened_at", time.monotonic() - guard.cooldown - 1)
+
+    async def ok():
+        return "fine"
+
+    assert asyncio.run(llm.call("t_breaker", ok, hedge=False)) == "fine"
+    assert guard.state == llm.CircuitBreaker.CLOSED
+
+
+def test_chat_falls_back_when_breaker_open(monkeypatch):
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    client = TestClient(app)
+
+    class NeverCalled:
+        async def create(self, **kwargs):
+            raise AssertionError("provider should not be called while the breaker is open")
+
+    monkeypatch.setattr(chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=NeverCalled())))
+    guard = llm.breaker("chat")
+    guard.state, guard.opened_at = llm.CircuitBreaker.OPEN, time.monotonic()
+    sid = client.post("/v2/auth/verify-name", json={"number": "8", "name": "Hal H"}).json()["session_id"]
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"})
+    assert resp.json()["reply"] == "Sorry, I had trouble responding."
+
+
+def _expire(guard) -> None:
+    guard.state, guard.opened_at = llm.CircuitBreaker.OPEN, time.monotonic() - guard.cooldown - 1
+
+
+def test_cancelled_probe_reopens_breaker():
+    guard = llm.breaker("t_cancel")
+    _expire(guard)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def run():
+        probe = asyncio.create_task(llm.call("t_cancel", hang, hedge=False))
+        await asyncio.sleep(0.01)
+        assert guard.state == llm.CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert guard.state == llm.CircuitBreaker.OPEN
+
+    async def ok():
+        return "fine"
+
+    # The cooldown already ran out, so the next call is the new probe.
+    assert asyncio.run(llm.call("t_cancel", ok, hedge=False)) == "fine"
+    assert guard.state == llm.CircuitBreaker.CLOSED
+
+
+class Stream:
+    def __init__(self, pieces, stall=0.0, fail=False):
+        self.pieces = list(pieces)
+        self.stall = stall
+        self.fail = fail
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            if self.fail:
+                raise RuntimeError("connection reset")
+            if self.stall:
+                await asyncio.sleep(self.stall)
+            raise StopAsyncIteration
+        return self.pieces.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+def _collect(name, resp, **kwargs):
+    async def open_stream():
+        return resp
+
+    async def run():
+        got = []
+        async for chunk in llm.stream(name, open_stream, **kwargs):
+            got.append(chunk)
+        return got
+
+    return asyncio.run(run())
+
+
+def test_stream_stall_and_errors_count_against_breaker():
+    assert _collect("t_stream", Stream(["a", "b"])) == ["a", "b"]
+    assert metrics.timing_count("llm.t_stream.latency_ms") == 1
+
+    stalled = Stream(["a"], stall=5)
+    with pytest.raises(asyncio.TimeoutError):
+        _collect("t_stream", stalled, chunk_timeout=0.05)
+    assert stalled.closed
+    assert metrics.counter("llm.t_stream.timeouts") == 1
+
+    with pytest.raises(RuntimeError):
+        _collect("t_stream", Stream(["a"], fail=True))
+    assert metrics.counter("llm.t_stream.errors") == 1
+    assert llm.breaker("t_stream").consecutive == 2
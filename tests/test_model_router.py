@@ -0,0 +1,36 @@
+from core import metrics, model_router
+
+
+def setup_function():
+    metrics.reset()
+
+
+def _route(monkeypatch, message, retrieval=False, depth=0):
+    monkeypatch.setitem(model_router.TIERS, "fast", "fast-model")
+    monkeypatch.setitem(model_router.TIERS, "strong", "strong-model")
+    return model_router.choose(message, retrieval, depth)
+
+
+def test_short_turn_goes_fast(monkeypatch):
+    assert _route(monkeypatch, "hi there") == ("fast", "fast-model", "default")
+    assert metrics.counter("router.fast") == 1
+
+
+def test_crisis_flag_beats_everything(monkeypatch):
+    _route(monkeypatch, "hi")
+    assert model_router.choose("step one", True, 2, flagged=True) == ("strong", "strong-model", "crisis_session")
+    # Crisis wording itself never reaches the router: the fast path answers it.
+    assert _route(monkeypatch, "I want to end it all") == ("fast", "fast-model", "default")
+
+
+def test_retrieval_long_and_deep_turns_go_strong(monkeypatch):
+    assert _route(monkeypatch, "step one", retrieval=True)[2] == "retrieval"
+    long_msg = "x" * (model_router.ROUTER_LONG_MESSAGE_CHARS + 1)
+    assert _route(monkeypatch, long_msg)[2] == "long_message"
+    assert _route(monkeypatch, "ok", depth=model_router.ROUTER_DEEP_MESSAGES + 1)[2] == "deep_conversation"
+    assert metrics.counter("router.strong") == 3
+
+
+def test_crisis_flagged_session_stays_strong(monkeypatch):
+    monkeypatch.setitem(model_router.TIERS, "strong", "strong-model")
+    assert model_router.choose("thanks", False, 2, flagged=True) == ("strong", "strong-model", "crisis_session")
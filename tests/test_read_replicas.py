@@ -0,0 +1,67 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+
+import json
+
+import fakeredis
+import core.redis_store as redis_store
+from core import lit_index, metrics
+
+
+class BrokenReplica:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("replica down")
+
+        return fail
+
+
+def setup_function() -> None:
+    r = redis_store.get_client()
+    r.flushdb()
+    r.set("lit:doc:bt", json.dumps({"title": "Basic Text", "abbrev": "BT"}))
+    r.set("lit:index:all", json.dumps(["bt:1"]))
+    r.set("lit:chunk:bt:1", json.dumps({"doc_id": "bt", "abbrev": "BT", "page": 21, "text": "We admitted that we were powerless"}))
+    metrics.reset()
+
+
+def _replicas(monkeypatch, replicas) -> None:
+    monkeypatch.setattr(redis_store, "_replicas", replicas)
+    monkeypatch.setattr(redis_store, "_replica_down_until", {})
+
+
+def test_reads_use_primary_without_replicas(monkeypatch):
+    _replicas(monkeypatch, [])
+    assert [d["doc_id"] for d in lit_index.list_docs()] == ["bt"]
+    counters = metrics.snapshot()["counters"]
+    assert counters["redis.read.lit.docs.primary"] >= 1
+    assert "redis.read.lit.docs.replica" not in counters
+
+
+def test_lit_reads_go_to_replicas(monkeypatch):
+    monkeypatch.setattr(redis_store, "REDIS_REPLICA_URLS", ["fakeredis://", "fakeredis://"])
+    _replicas(monkeypatch, None)
+    assert lit_index.search("powerless", k=1)[0]["page"] == 21
+    assert lit_index.phrase_search("powerless") == []  # no positional index built
+    counters = metrics.snapshot()["counters"]
+    assert counters["redis.read.lit.chunks.replica"] == 2  # index + one chunk
+    assert counters["redis.read.lit.phrase.replica"] == 1
+    assert "redis.read.lit.chunks.primary" not in counters
+    assert len(redis_store._replica_clients()) == 2
+
+
+def test_replica_errors_fall_back_to_primary(monkeypatch):
+    replica = fakeredis.FakeRedis(server=redis_store._fake_server, decode_responses=True)
+    _replicas(monkeypatch, [BrokenReplica(), replica])
+    for _ in range(4):
+        assert [d["doc_id"] for d in lit_index.list_docs()] == ["bt"]
+    counters = metrics.snapshot()["counters"]
+    # The broken replica fails once, is skipped afterwards, and the read is
+    # retried on the primary; the healthy replica serves the rest.
+    assert counters["redis.replica.errors"] == 1
+    assert counters["redis.read.lit.docs.fallback"] == 1
+    assert counters["redis.read.lit.docs.primary"] >= 1
+    assert counters["redis.read.lit.docs.replica"] >= 1
+    assert 0 in redis_store._replica_down_until
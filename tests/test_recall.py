@@ -0,0 +1,102 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from core import recall
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+def bag_of_words(text: str):
+    vec = [0.0] * 64
+    for word in text.lower().split():
+        vec[int(hashlib.md5(word.strip(".,?!").encode()).hexdigest(), 16) % 64] += 1.0
+    return vec
+
+
+class FakeEmbeddings:
+    async def create(self, model, input, dimensions=None):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=bag_of_words(t)) for t in input])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.messages = None
+
+    async def create(self, model, messages):
+        self.messages = messages
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    fake = SimpleNamespace(embeddings=FakeEmbeddings(), chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(recall, "get_async_client", lambda: fake)
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    return fake
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def _items(uid):
+    return recall.decode_items(get_client().hgetall(recall.recall_key(uid)))
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_top_k_and_eviction(fake_openai, monkeypatch, use_numpy):
+    if use_numpy and recall.np is None:
+        pytest.skip("numpy not installed")
+    if not use_numpy:
+        monkeypatch.setattr(recall, "np", None)
+    monkeypatch.setattr(recall, "RECALL_MAX_ITEMS", 3)
+    for note in ["my sponsor is called Dave", "I work night shifts at the bakery", "my daughter starts school", "step four scares me"]:
+        asyncio.run(recall.remember("u1", "note", note))
+    items = _items("u1")
+    assert len(items) == 3
+    assert "my sponsor is called Dave" not in {i["text"] for i in items.values()}  # oldest evicted
+
+    hits = asyncio.run(recall.recall(items, "how do I start step four"))
+    assert hits[0]["text"] == "step four scares me"
+    assert len(hits) <= recall.RECALL_TOP_K
+
+
+def test_chat_prompt_includes_recalled_memories(fake_openai):
+    sid = client.post("/v2/auth/verify-name", json={"number": "91", "name": "Kit K"}).json()["session_id"]
+    uid = get_client().hget(f"session:{sid}", "user_id")
+    asyncio.run(recall.remember(uid, "summary", "We talked about night shifts and cravings after work", item_id="s:old"))
+    asyncio.run(recall.remember(uid, "summary", "This very session talked about cravings", item_id=f"s:{sid}"))
+
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "cravings after my night shifts again"})
+    block = [m["content"] for m in fake_openai.chat.completions.messages if m["content"].startswith("From past conversations")]
+    assert len(block) == 1
+    assert "night shifts and cravings" in block[0]
+    assert "This very session" not in block[0]
+
+
+def test_touch_does_not_restore_evicted_items(fake_openai):
+    for note in ["my sponsor is called Dave", "step four scares me"]:
+        asyncio.run(recall.remember("u1", "note", note))
+    items = _items("u1")
+    hits = [dict(item, id=item_id, score=0.9) for item_id, item in items.items()]
+    evicted = hits[0]["id"]
+    get_client().hdel(recall.recall_key("u1"), evicted)  # a concurrent remember() evicted it
+
+    asyncio.run(recall.touch("u1", hits))
+    after = _items("u1")
+    assert evicted not in after
+    assert after[hits[1]["id"]]["last_used"] > items[hits[1]["id"]]["last_used"]
@@ -0,0 +1,121 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from main import app
+from core import metrics
+from core.redis_store import get_client
+import core.rate_limit as rl
+import core.reply_cache as reply_cache
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        system = "\n".join(m["content"] for m in kwargs["messages"] if m["role"] == "system")
+        name = system.split("The caller is ", 1)[1].split(".", 1)[0]
+        first = name.split()[0]
+        text = f"Welcome, {first}. Good to hear from you, {name}."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    metrics.reset()
+
+
+def start(number, name):
+    return client.post("/v2/auth/verify-name", json={"number": number, "name": name}).json()["session_id"]
+
+
+def test_opening_reply_cached_and_personalised(monkeypatch):
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()), embeddings=None)
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    monkeypatch.setattr(reply_cache, "get_async_client", lambda: None)
+    monkeypatch.setattr(reply_cache, "REPLY_CACHE_ENABLED", True)
+
+    first = client.post("/v2/chat/send", json={"session_id": start("1", "Alice A"), "message": "Hi!"}).json()
+    assert first["reply"] == "Welcome, Alice. Good to hear from you, Alice A."
+    second = client.post("/v2/chat/send", json={"session_id": start("2", "Bob B"), "message": "hi"}).json()
+    assert second["reply"] == "Welcome, Bob. Good to hear from you, Bob B."
+    assert fake.chat.completions.calls == 1
+
+    snap = metrics.snapshot()
+    assert snap["counters"]["reply_cache.exact_hits"] == 1
+    assert snap["gauges"]["reply_cache.hit_rate"] == 0.5
+
+
+def test_later_turns_bypass_cache(monkeypatch):
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()), embeddings=None)
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    monkeypatch.setattr(reply_cache, "get_async_client", lambda: None)
+    monkeypatch.setattr(reply_cache, "REPLY_CACHE_ENABLED", True)
+    sid = start("3", "Cara C")
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "hi"})
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "hi"})
+    assert fake.chat.completions.calls == 2
+
+
+def test_caller_memory_never_crosses_callers(monkeypatch):
+    class EchoTopics(FakeCompletions):
+        async def create(self, **kwargs):
+            self.calls += 1
+            system = "\n".join(m["content"] for m in kwargs["messages"] if m["role"] == "system")
+            topics = system.split("Recent topics: ", 1)[1].split("\n", 1)[0] if "Recent topics: " in system else ""
+            text = f"Welcome back. Last time: {topics}" if topics else "Welcome."
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=EchoTopics()), embeddings=None)
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    monkeypatch.setattr(reply_cache, "get_async_client", lambda: None)
+    monkeypatch.setattr(reply_cache, "REPLY_CACHE_ENABLED", True)
+    r = get_client()
+
+    sid_a = start("4", "Ann A")
+    uid_a = r.hget(f"session:{sid_a}", "user_id")
+    r.set(f"memory:{uid_a}", '{"last_topics": "I relapsed on heroin"}')
+    a = client.post("/v2/chat/send", json={"session_id": sid_a, "message": "hi"}).json()
+    assert a["reply"] == "Welcome back. Last time: I relapsed on heroin."
+    b = client.post("/v2/chat/send", json={"session_id": start("5", "Ben B"), "message": "hi"}).json()
+    assert b["reply"] == "Welcome."
+    # B's reply is cacheable, but is not served to a caller with memory either.
+    sid_c = start("6", "Cat C")
+    uid_c = r.hget(f"session:{sid_c}", "user_id")
+    r.set(f"memory:{uid_c}", '{"last_topics": "court tomorrow"}')
+    c = client.post("/v2/chat/send", json={"session_id": sid_c, "message": "hi"}).json()
+    assert c["reply"] == "Welcome back. Last time: court tomorrow."
+    assert fake.chat.completions.calls == 3
+    assert metrics.counter("reply_cache.hits") == 0
+
+
+def test_first_names_that_are_words_are_only_templated_as_vocatives(monkeypatch):
+    will = {"name": "Will W"}
+    assert reply_cache._template("Hi Will, welcome.", will) == "Hi {{first_name}}, welcome."
+    assert reply_cache._template("Good to hear from you, Will.", will) == "Good to hear from you, {{first_name}}."
+    assert reply_cache._template("Welcome. Will you tell me how today went?", will) is None
+    assert reply_cache._template("There is always hope, Hope.", {"name": "Hope"}) == "There is always hope, {{first_name}}."
+
+    class WillYou(FakeCompletions):
+        async def create(self, **kwargs):
+            self.calls += 1
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Welcome, Will. Will you tell me more?"))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=WillYou()), embeddings=None)
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    monkeypatch.setattr(reply_cache, "get_async_client", lambda: None)
+    monkeypatch.setattr(reply_cache, "REPLY_CACHE_ENABLED", True)
+    client.post("/v2/chat/send", json={"session_id": start("7", "Will W"), "message": "hi"})
+    client.post("/v2/chat/send", json={"session_id": start("8", "Dan D"), "message": "hi"})
+    assert fake.chat.completions.calls == 2  # never cached, so never served as "Dan you tell me more?"
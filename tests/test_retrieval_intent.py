@@ -0,0 +1,37 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+
+import time
+
+from core import metrics, retrieval_intent as ri
+
+
+def test_classifier_separates_literature_questions_from_chat():
+    ri.load_model()
+    for message in ["what does step one say?", "can you explain the third tradition", "read me the just for today"]:
+        assert ri.should_retrieve(message), message
+    for message in ["I stepped outside for some air", "my stepdad called", "hi there", "I did 10000 steps today"]:
+        assert not ri.should_retrieve(message), message
+
+
+def test_fits_the_sample_file_and_beats_the_trigger_list():
+    samples = ri.load_samples()
+    model = ri.train(samples)
+    fitted = ri.evaluate(model, samples)
+    legacy = ri._scores([(label, ri.legacy_decision(text)) for label, text in samples])
+    assert fitted["precision"] > 0.95 and fitted["recall"] > 0.95
+    assert fitted["f1"] > legacy["f1"]
+
+
+def test_decisions_are_fast_and_counted():
+    ri.load_model()
+    metrics.reset()
+    start = time.perf_counter()
+    for _ in range(200):
+        ri.should_retrieve("I stepped on my phone and cracked it")
+    assert (time.perf_counter() - start) / 200 < 0.001
+    counters = metrics.snapshot()["counters"]
+    assert counters["retrieval.intent.skip"] == 200
+    assert counters["retrieval.avoided"] == 200  # "step" was a trigger
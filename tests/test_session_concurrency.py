@@ -0,0 +1,90 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from core.auth_utils import hash_passphrase
+from core.redis_store import get_client
+from core.session_store import load_history, load_session, mutate_session, session_key
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+class SlowCompletions:
+    async def create(self, **kwargs):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def new_session() -> str:
+    return client.post("/v2/auth/verify-name", json={"number": "31", "name": "Fran F"}).json()["session_id"]
+
+
+def test_concurrent_sends_keep_all_history(monkeypatch):
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    monkeypatch.setattr(chat, "get_async_client", lambda: fake)
+    sid = new_session()
+    n = 10
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(
+                *[ac.post("/v2/chat/send", json={"session_id": sid, "message": f"m{i}"}) for i in range(n)]
+            )
+
+    resps = asyncio.run(run())
+    assert all(r.status_code == 200 for r in resps)
+    history = load_history(sid)
+    assert len(history) == 2 * n
+    assert sorted(m["content"] for m in history if m["role"] == "user") == sorted(f"m{i}" for i in range(n))
+    assert int(load_session(sid)["msg_count"]) == 2 * n
+
+
+def test_mutate_session_retries_on_conflict():
+    sid = new_session()
+    calls = []
+
+    def bump_tries(current):
+        calls.append(1)
+        if len(calls) == 1:
+            # Another writer lands between our read and our write.
+            get_client().hset(session_key(sid), mapping={"mode": "voice"})
+        state = current["state"]
+        state["tries"] = state.get("tries", 0) + 1
+        return {"state": state}, state["tries"]
+
+    assert mutate_session(sid, bump_tries) == 1
+    assert len(calls) == 2
+    session = load_session(sid)
+    assert session["mode"] == "voice"
+    assert session["state"] == {"tries": 1}
+
+
+def test_wrong_passphrase_attempts_are_counted():
+    r = get_client()
+    salt, phash = hash_passphrase("blue skies")
+    r.hset("user:known", mapping={"name": "Gail G", "pass_salt": salt, "pass_hash": phash})
+    r.set("name_to_user:GAIL G", "known")
+    sid = new_session()
+    assert client.post("/v2/chat/send", json={"session_id": sid, "message": "I'm Gail G"}).json()["reply"].startswith("What")
+    for _ in range(2):
+        client.post("/v2/chat/send", json={"session_id": sid, "message": "wrong"})
+    assert load_session(sid)["state"]["identity"]["tries"] == 2
+    reply = client.post("/v2/chat/send", json={"session_id": sid, "message": "Blue Skies"}).json()["reply"]
+    assert reply.startswith("Thanks, Gail G")
+    assert load_session(sid)["user_id"] == "known"
@@ -0,0 +1,53 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import json
+from fastapi.testclient import TestClient
+from main import app
+from core.redis_store import get_client
+from core.session_store import HISTORY_MAX, history_key, load_history, load_session, session_key
+import core.rate_limit as rl
+
+client = TestClient(app)
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def test_turns_append_to_list():
+    data = client.post("/v2/auth/verify-name", json={"number": "42", "name": "Cal C"}).json()
+    sid = data["session_id"]
+    for i in range(30):
+        client.post("/v2/chat/send", json={"session_id": sid, "message": f"msg {i}"})
+    r = get_client()
+    assert r.type(session_key(sid)) == "hash"
+    assert r.llen(history_key(sid)) == HISTORY_MAX
+    assert load_history(sid)[-2]["content"] == "msg 29"
+    assert r.ttl(history_key(sid)) > 0
+    hist = client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]
+    assert len(hist) == 25
+
+
+def test_legacy_blob_is_migrated():
+    r = get_client()
+    legacy = {
+        "user_id": "u1",
+        "mode": "text",
+        "created_at": "2025-01-01T00:00:00",
+        "state": {"history": [{"role": "user", "content": "old"}, {"role": "assistant", "content": "reply"}]},
+    }
+    r.set("session:legacy", json.dumps(legacy), ex=600)
+    session = load_session("legacy")
+    assert session["user_id"] == "u1"
+    assert session["state"] == {}
+    assert r.type(session_key("legacy")) == "hash"
+    assert 0 < r.ttl(session_key("legacy")) <= 600
+    assert [m["content"] for m in load_history("legacy")] == ["old", "reply"]
+    resp = client.post("/v2/chat/send", json={"session_id": "legacy", "message": "new"})
+    assert resp.status_code == 200
+    assert len(load_history("legacy")) == 4
@@ -0,0 +1,49 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+from fastapi.testclient import TestClient
+from main import app
+from core import metrics
+from core.redis_store import get_client
+from core.session_store import load_history, load_session
+import core.rate_limit as rl
+import core.summarizer as summarizer
+
+client = TestClient(app)
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    metrics.reset()
+
+
+def test_long_conversation_is_folded(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_TOKEN_BUDGET", 200)
+    monkeypatch.setattr(summarizer, "SUMMARY_KEEP_MESSAGES", 4)
+    sid = client.post("/v2/auth/verify-name", json={"number": "9", "name": "Dee D"}).json()["session_id"]
+    for i in range(12):
+        client.post("/v2/chat/send", json={"session_id": sid, "message": f"turn {i} " + "word " * 40})
+
+    session = load_session(sid)
+    assert session["summary"]
+    assert "turn 0" in session["summary"]
+    assert int(session["summary_upto"]) > 0
+    # Display history is unaffected by folding
+    assert len(load_history(sid)) == 24
+
+    session["history"] = load_history(sid)
+    verbatim, summary = summarizer.prompt_window(session)
+    assert summary == session["summary"]
+    assert summarizer.history_tokens(verbatim) <= 200 or len(verbatim) <= 4
+    assert metrics.snapshot()["counters"]["summary.prompt_tokens_saved"] > 0
+
+
+def test_short_conversation_untouched():
+    session = {"history": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]}
+    verbatim, summary = summarizer.prompt_window(session)
+    assert verbatim == session["history"]
+    assert summary == ""
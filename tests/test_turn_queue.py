@@ -0,0 +1,88 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from core import turn_queue
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def queue_mode(monkeypatch):
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+    monkeypatch.setattr(turn_queue, "CHAT_QUEUE_MODE", "on")
+    monkeypatch.setattr(chat, "get_async_client", lambda: None)
+    turn_queue.ensure_group()
+
+
+def _queue_turn(message="hello"):
+    sid = client.post("/v2/auth/verify-name", json={"number": "95", "name": "Lou L"}).json()["session_id"]
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": message})
+    assert resp.status_code == 202
+    return sid, resp.json()["job_id"]
+
+
+def _drain(consumer="worker-1"):
+    async def run():
+        for entry_id, fields in turn_queue.read_batch(consumer, 10, 0):
+            await turn_queue.process(entry_id, fields, chat.run_queued_turn)
+
+    asyncio.run(run())
+
+
+def _result(sid, job_id):
+    return client.get(f"/v2/chat/result/{job_id}", params={"session_id": sid, "wait": 0})
+
+
+def test_queued_turn_is_answered_by_worker():
+    sid, job_id = _queue_turn()
+    assert _result(sid, job_id).status_code == 202
+    assert _result("someone-else", job_id).status_code == 404
+
+    _drain()
+    resp = _result(sid, job_id)
+    assert resp.status_code == 200
+    assert resp.json()["reply"] == "This is a test reply."
+    assert len(client.get("/v2/chat/history", params={"session_id": sid}).json()["history"]) == 2
+    assert get_client().xpending(turn_queue.CHAT_QUEUE_STREAM, turn_queue.CHAT_QUEUE_GROUP)["pending"] == 0
+
+
+def test_turn_left_by_dead_worker_is_reclaimed(monkeypatch):
+    sid, job_id = _queue_turn()
+    # A worker reads the entry and dies before acknowledging it.
+    get_client().xreadgroup(turn_queue.CHAT_QUEUE_GROUP, "dead", {turn_queue.CHAT_QUEUE_STREAM: ">"}, count=1)
+    _drain("worker-2")
+    assert _result(sid, job_id).status_code == 202  # not idle long enough yet
+
+    monkeypatch.setattr(turn_queue, "CHAT_QUEUE_CLAIM_IDLE_MS", 0)
+    _drain("worker-2")
+    assert _result(sid, job_id).json()["reply"] == "This is a test reply."
+
+
+def test_repeatedly_failing_turn_is_marked_failed(monkeypatch):
+    sid, job_id = _queue_turn()
+    monkeypatch.setattr(turn_queue, "CHAT_QUEUE_CLAIM_IDLE_MS", 0)
+
+    async def broken(session_id, message):
+        raise RuntimeError("model down")
+
+    async def run():
+        for _ in range(turn_queue.CHAT_QUEUE_MAX_DELIVERIES + 1):
+            for entry_id, fields in turn_queue.read_batch("worker-3", 10, 0):
+                await turn_queue.process(entry_id, fields, broken)
+
+    asyncio.run(run())
+    body = _result(sid, job_id).json()
+    assert body["status"] == "failed"
+    assert body["error"]["code"] == "TURN_FAILED"
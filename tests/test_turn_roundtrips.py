@@ -0,0 +1,154 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import fakeredis
+from fastapi.testclient import TestClient
+from main import app
+import core.redis_store as redis_store
+import core.rate_limit as rl
+import core.write_behind as write_behind
+
+client = TestClient(app)
+
+
+class CountingClient:
+    """Wraps the Redis client and counts round trips (commands or pipeline executes).
+
+    Pass `tally` to add the count to another CountingClient's `round_trips`.
+    """
+
+    def __init__(self, inner, tally=None):
+        self.inner = inner
+        self.tally = tally or self
+        self.round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self.inner.pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted(*a, **k):
+            self.tally.round_trips += 1
+            return execute(*a, **k)
+
+        pipe.execute = counted
+        return pipe
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*a, **k):
+            self.tally.round_trips += 1
+            return attr(*a, **k)
+
+        return counted
+
+
+class CountingAsyncClients:
+    """Stands in for redis_store._async_clients: counting async clients on the fake server."""
+
+    def __init__(self, tally):
+        self.tally = tally
+        self.clients = {}
+
+    def get(self, loop):
+        if loop not in self.clients:
+            inner = fakeredis.FakeAsyncRedis(server=redis_store._fake_server, decode_responses=True)
+            self.clients[loop] = CountingClient(inner, self.tally)
+        return self.clients[loop]
+
+
+def count_round_trips(monkeypatch) -> CountingClient:
+    counting = CountingClient(redis_store.get_client())
+    monkeypatch.setattr(redis_store, "_client", counting)
+    monkeypatch.setattr(redis_store, "_async_clients", CountingAsyncClients(counting))
+    return counting
+
+
+def test_chat_turn_round_trips(monkeypatch):
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    redis_store.get_client().flushdb()
+    sid = client.post("/v2/auth/verify-name", json={"number": "5", "name": "Eve E"}).json()["session_id"]
+    client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"})  # opens the rate window
+
+    counting = count_round_trips(monkeypatch)
+    resp = client.post("/v2/chat/send", json={"session_id": sid, "message": "how are you"})
+    assert resp.status_code == 200
+    # session+history+rate, profile+memory, commit; then the write-behind
+    # flush of memory/last_seen runs after the response
+    assert counting.round_trips == 4
+
+    # The first hit of a fresh rate window sets its expiry in the same pipeline.
+    r = redis_store.get_client()
+    r.delete(*r.inner.keys("rate:*"))
+    counting.round_trips = 0
+    assert client.post("/v2/chat/send", json={"session_id": sid, "message": "new minute"}).status_code == 200
+    assert counting.round_trips == 4
+    assert all(0 < r.inner.ttl(key) <= 60 for key in r.inner.keys("rate:*"))
+
+    counting.round_trips = 0
+    resp = client.get("/v2/chat/history", params={"session_id": sid})
+    assert len(resp.json()["history"]) == 6
+    assert counting.round_trips == 1
+
+
+def test_interval_write_behind_batches_callers(monkeypatch):
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    redis_store.get_client().flushdb()
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_MODE", "interval")
+    sids = [
+        client.post("/v2/auth/verify-name", json={"number": f"6{i}", "name": f"Ivy {i}"}).json()["session_id"]
+        for i in range(3)
+    ]
+    for sid in sids:
+        client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"})
+
+    counting = count_round_trips(monkeypatch)
+    for sid in sids:
+        client.post("/v2/chat/send", json={"session_id": sid, "message": "still here"})
+    assert counting.round_trips == 3 * 3  # memory and last_seen stay buffered
+
+    counting.round_trips = 0
+    assert write_behind.flush() == 3
+    assert counting.round_trips == 1
+    uid = redis_store.get_client().hget(f"session:{sids[0]}", "user_id")
+    assert redis_store.get_json(f"memory:{uid}")["last_topics"] == "still here"
+
+
+def test_overflow_flush_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_MAX_PENDING", 1)
+    flushed = threading.Event()
+    threads = []
+
+    def fake_flush(user_id=None):
+        threads.append(threading.get_ident())
+        flushed.set()
+        return 0
+
+    monkeypatch.setattr(write_behind, "flush", fake_flush)
+
+    async def run():
+        write_behind.put_last_seen("u1", "now")
+        await asyncio.to_thread(flushed.wait, 5)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and threads[0] != loop_thread
+    write_behind._pending.clear()
+
+
+def test_shutdown_flush_error_is_logged_not_raised(monkeypatch):
+    import asyncio
+
+    def broken_flush(user_id=None):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(write_behind, "flush", broken_flush)
+    asyncio.run(write_behind.stop())
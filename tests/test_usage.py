@@ -0,0 +1,86 @@
+import os
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ["REDIS_URL"] = "fakeredis://"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "100"
+
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from main import app
+from core import usage
+from core.redis_store import get_client
+import core.rate_limit as rl
+import routes.admin as admin
+import routes.chat as chat
+
+client = TestClient(app)
+
+
+def setup_function() -> None:
+    rl.RATE_LIMIT_PER_MINUTE = 1000
+    get_client().flushdb()
+
+
+def _session() -> str:
+    return client.post("/v2/auth/verify-name", json={"number": "61", "name": "Gil G"}).json()["session_id"]
+
+
+def _usage(prompt, completion, cached=0):
+    return SimpleNamespace(
+        prompt_tokens=prompt, completion_tokens=completion, prompt_tokens_details=SimpleNamespace(cached_tokens=cached)
+    )
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return self._stream()
+        return SimpleNamespace(
+            model="gpt-test",
+            usage=_usage(120, 30, cached=100),
+            choices=[SimpleNamespace(message=SimpleNamespace(content="hello there"))],
+        )
+
+    async def _stream(self):
+        yield SimpleNamespace(model="gpt-test", usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="hi"))])
+        yield SimpleNamespace(model="gpt-test", usage=_usage(80, 5), choices=[])
+
+
+def test_send_and_stream_usage_is_counted_per_user_session_and_day(monkeypatch):
+    monkeypatch.setattr(
+        chat, "get_async_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    )
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    sid = _session()
+    uid = get_client().hget(f"session:{sid}", "user_id")
+    assert client.post("/v2/chat/send", json={"session_id": sid, "message": "hello"}).status_code == 200
+    with client.stream("POST", "/v2/chat/stream", json={"session_id": sid, "message": "again"}) as resp:
+        resp.read()
+
+    headers = {"Authorization": "Bearer secret"}
+    report = client.get("/v2/admin/usage", params={"user_id": uid, "session_id": sid}, headers=headers).json()
+    assert report["totals"]["chat"]["calls"] == 2
+    assert report["totals"]["chat"]["prompt_tokens"] == 200
+    assert report["totals"]["chat"]["completion_tokens"] == 35
+    assert report["session"]["route:fast"] == {"turns": 2, "default": 2}  # routing decisions, per turn
+    assert report["totals"]["chat"]["cached_tokens"] == 100
+    assert report["session"]["chat"]["calls"] == 2
+
+    daily = client.get("/v2/admin/usage", params={"days": 1}, headers=headers).json()
+    (day,) = daily["days"].values()
+    assert day["chat"]["calls"] == 2
+    assert day["model:gpt-test"]["prompt_tokens"] == 200
+
+    assert client.get("/v2/admin/usage", params={"days": 90}, headers=headers).status_code == 400
+
+
+def test_calls_outside_a_turn_count_per_day_only():
+    async def run():
+        await usage.arecord("embed", _usage(12, 0), "text-embedding-3-small", 40.0)
+
+    asyncio.run(run())
+    keys = sorted(get_client().keys("usage:*"))
+    assert len(keys) == 1 and keys[0].startswith("usage:day:")
+    assert usage.report(1)["totals"]["embed"] == {"calls": 1, "prompt_tokens": 12, "latency_ms": 40}
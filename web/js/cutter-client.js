@@ -23,8 +23,69 @@ export async function verifyName(number, name) {
   return api("/v2/auth/verify-name", { method: "POST", body: JSON.stringify({ number, name }) });
 }
 
-export async function sendMessage(session_id, message) {
-  return api("/v2/chat/send", { method: "POST", body: JSON.stringify({ session_id, message }) });
+// Pass the same `idempotencyKey` when retrying a send so the server replays
+// the first reply instead of running the turn twice.
+export async function sendMessage(session_id, message, idempotencyKey = crypto.randomUUID()) {
+  return api("/v2/chat/send", {
+    method: "POST",
+    headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
+    body: JSON.stringify({ session_id, message }),
+  });
+}
+
+// When the server queues turns (CHAT_QUEUE_MODE=on), sendMessage resolves with
+// { status: "queued", job_id, result_url }; this long-polls until the reply is ready.
+// Backs off for Retry-After on 429; any status other than 200/202 is an error.
+export async function awaitReply(queued) {
+  for (;;) {
+    const res = await fetch(API_BASE + queued.result_url + "&wait=20");
+    if (res.status === 200) return await res.json();
+    if (res.status === 202) continue;
+    if (res.status === 429) {
+      const seconds = Number(res.headers.get("Retry-After")) || 5;
+      await new Promise((resolve) => setTimeout(resolve, seconds * 1000));
+      continue;
+    }
+    if (res.status === 401) throw new Error("Session expired. Please start again.");
+    if (res.status === 404) throw new Error("Reply expired. Please send again.");
+    throw new Error(`Could not fetch the reply (HTTP ${res.status}). Please send again.`);
+  }
+}
+
+// Stream a reply over Server-Sent Events. `onDelta(text)` is called for each
+// token chunk as it arrives; resolves with the final { reply, memory_delta }.
+export async function streamMessage(session_id, message, onDelta) {
+  const res = await fetch(API_BASE + "/v2/chat/stream", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ session_id, message }),
+  });
+  if (res.status === 401) throw new Error("Session expired. Please start again.");
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let done = null;
+  for (;;) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, idx);
+      buffer = buffer.slice(idx + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === "delta" && onDelta) onDelta(payload.text);
+      else if (event === "done") done = payload;
+    }
+  }
+  return done;
 }
 
 export async function switchMode(session_id, mode) {
@@ -35,3 +96,23 @@ export async function guestSession(name) {
   return api("/v2/auth/guest", { method: "POST", body: JSON.stringify({ name }) });
 }
 
+
+// Open a persistent WebSocket chat. Returns { send(message), close() };
+// `handlers` may define onReady(history), onDelta(text), onDone({ reply, memory_delta })
+// and onError({ code, message }). Reconnect with the same session_id to resume.
+export function openChat(session_id, handlers = {}) {
+  const url = API_BASE.replace(/^http/, "ws") + "/v2/chat/ws?session_id=" + encodeURIComponent(session_id);
+  const ws = new WebSocket(url);
+  ws.onmessage = (ev) => {
+    const frame = JSON.parse(ev.data);
+    if (frame.type === "ready") handlers.onReady?.(frame.history);
+    else if (frame.type === "delta") handlers.onDelta?.(frame.text);
+    else if (frame.type === "done") handlers.onDone?.({ reply: frame.reply, memory_delta: frame.memory_delta });
+    else if (frame.type === "error") handlers.onError?.(frame);
+  };
+  ws.onclose = (ev) => handlers.onClose?.(ev.code);
+  return {
+    send: (message) => ws.send(JSON.stringify({ type: "message", message })),
+    close: () => ws.close(),
+  };
+}